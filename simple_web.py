@@ -2,55 +2,338 @@
 # Simple HTTP web server for the Smart Doc Analysis
 import sys
 import os
+import argparse
+import atexit
 from pathlib import Path
-import json
+import re
+import html as html_lib
 import urllib.parse
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import BaseHTTPRequestHandler
 import threading
 import webbrowser
 import time
+import uuid
+import tempfile
+import shutil
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
 sys.path.append('src')
 
-# Import our smart doc analysis + billing/pathway
-from smart_research_assistant import SmartResearchAssistant
-from flexprice_billing import FlexpriceIntegration
-from pathway_integration import PathwayIntegration
+# The billing and Pathway integrations (and with them requests), the passage
+# index (NumPy) and live ingestion (asyncio) are imported by build_services(),
+# after the port is bound; the assistant, with PyPDF2 and python-docx, on first use
+from app_config import load_config, get_setting
+from pooled_server import PooledHTTPServer, SynchronizedProxy
+from multipart_stream import MultipartStreamParser, UploadTooLarge
+from ingestion_jobs import IngestionJobQueue
+from batch_extract import BatchExtractor, expand_archive, is_archive, is_supported
+from document_analyzer import analyze_text
+from live_index import LiveDataIndex
+from live_store import LiveSourceStore
+from dedup_index import DedupIndex
+from result_cache import ResultCache
+from analysis_cache import AnalysisCache
+from static_assets import build_asset, compress_dynamic
+import fast_json
+from stats_events import StatsBroadcaster
+from billing_ledger import BillingLedger
+from usage_rollups import UsageRollups
+from rate_limit import KeyedTokenBuckets
+from admission import AdmissionController
+from refresh_cycles import RefreshCoordinator
+from startup import StartupTracker
+
+# Requests that are billed to the caller, and so count against their rate limit
+RATE_LIMITED_PATHS = {'/upload', '/upload-batch', '/search', '/api/search', '/api/upload'}
+# Expensive requests that go through admission control, and the uploads among them
+ADMISSION_PATHS = RATE_LIMITED_PATHS | {'/refresh-pathway'}
+UPLOAD_PATHS = {'/upload', '/upload-batch', '/api/upload'}
+# GET routes that answer for the calling user
+USER_GET_PATHS = {'/billing-stats', '/usage-stats', '/events', '/events/poll', '/jobs'}
+USER_GET_PREFIXES = ('/jobs/', '/api/jobs/')
+USER_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.@-]{1,64}$')
+# Routes served while the server is still starting up; everything else gets 503
+STARTUP_PATHS = {'/', '/index.html', '/health'}
+
+
+
+def passage_document_id(filename, digest=None):
+    """Passage index key of an upload: distinct per content, so same-named uploads don't replace each other"""
+    return f"{(digest or uuid.uuid4().hex)[:16]}/{filename}"
+
+
+def passage_display_name(document_id):
+    """Filename shown for a passage index key; documents indexed before keys had ids are their own name"""
+    return document_id.split('/', 1)[-1]
+
+
+# Live data lookups run here while the request thread waits on the research query
+LIVE_LOOKUP_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix='live-lookup')
+
+# Fixed markup of the live data section; only item fields are joined in per request
+LIVE_DATA_HEADER = """
+        <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; border-radius: 10px; padding: 25px; margin: 20px 0;">
+            <h3 style="color: white; margin-bottom: 20px;">🌐 Related Live Data & Latest News</h3>
+        """
+LIVE_DATA_CARD_OPEN = tuple(f"""
+            <div style="background: {bg_color}; padding: 20px; border-radius: 8px; margin: 15px 0; border-left: 4px solid #fff;">
+                <div style="display: flex; justify-content: space-between; align-items: flex-start; margin-bottom: 10px;">
+                    <h4 style="color: #fff; margin: 0; flex: 1;">""" for bg_color in ("rgba(255,255,255,0.1)", "rgba(255,255,255,0.05)"))
+LIVE_DATA_CARD_TYPE = """</h4>
+                    <span style="background: rgba(255,255,255,0.2); color: white; padding: 4px 8px; border-radius: 12px; font-size: 0.8em; margin-left: 15px;">
+                        """
+LIVE_DATA_CARD_CONTEXT = """
+                    </span>
+                </div>
+                
+                <p style="color: #e0e0e0; line-height: 1.6; margin: 10px 0;">"""
+LIVE_DATA_CARD_AUTHOR = """</p>
+                
+                <div style="display: flex; justify-content: space-between; align-items: center; margin-top: 15px;">
+                    <div style="display: flex; gap: 15px; font-size: 0.9em; color: #b0b0b0;">
+                        <span>📝 """
+LIVE_DATA_CARD_TIME = """</span>
+                        <span>🕰️ """
+LIVE_DATA_CARD_SCORE = """</span>
+                        <span>⭐ Score: """
+LIVE_DATA_CARD_URL = """</span>
+                    </div>
+                    <a href=\""""
+LIVE_DATA_CARD_CLOSE = """" target="_blank" style="color: #fff; text-decoration: none; background: rgba(255,255,255,0.2); padding: 6px 12px; border-radius: 15px; font-size: 0.9em;">
+                        🔗 View Source
+                    </a>
+                </div>
+            </div>
+            """
+LIVE_DATA_FOOTER = """
+            <div style="text-align: center; margin-top: 20px; padding: 15px; background: rgba(255,255,255,0.1); border-radius: 8px;">
+                <p style="margin: 0; font-size: 0.95em; color: #e0e0e0;">
+                    ✨ Live data continuously updated from news sources and industry blogs ✨
+                </p>
+            </div>
+        </div>
+        """
 
 class WebHandler(BaseHTTPRequestHandler):
-    def __init__(self, *args, assistant_instance=None, billing_system=None, pathway_system=None, **kwargs):
+    def __init__(self, *args, assistant_instance=None, billing_system=None, pathway_system=None, job_queue=None, batch_extractor=None, live_store=None, live_index=None, dedup_index=None, search_cache=None, analysis_cache=None, static_assets=None, stats_events=None, user_limiter=None, admission=None, refresher=None, live_ingestion=None, passage_index=None, startup=None, config=None, **kwargs):
         self.assistant = assistant_instance
         self.billing = billing_system
         self.pathway = pathway_system
+        self.jobs = job_queue
+        self.batch_extractor = batch_extractor
+        self.live_store = live_store
+        self.live_index = live_index
+        self.dedup = dedup_index
+        self.search_cache = search_cache
+        self.analysis_cache = analysis_cache
+        self.static_assets = static_assets or {}
+        self.events = stats_events
+        self.user_limiter = user_limiter
+        self.admission = admission
+        self.refresher = refresher
+        self.live_ingestion = live_ingestion
+        self.passages = passage_index
+        self.startup = startup
+        self.upload_slot = None
+        self.config = config or {}
+        self.user_id = get_setting(self.config, 'security.api.default_user', 'demo_user')
+        self.authenticated = False
+        self.principal = None
         super().__init__(*args, **kwargs)
 
     def do_GET(self):
+        if not self._check_ready():
+            return
+        path = self.path.split('?', 1)[0]
+        if (path in USER_GET_PATHS or path.startswith(USER_GET_PREFIXES)) and not self._identify_user():
+            return
         if self.path == '/' or self.path == '/index.html':
             self.serve_homepage()
         elif self.path == '/dashboard':
             self.serve_dashboard()
         elif self.path == '/billing-stats':
             self.serve_billing_stats()
+        elif self.path == '/usage-stats':
+            self.serve_usage_stats()
         elif self.path == '/pathway-stats':
             self.serve_pathway_stats()
         elif self.path == '/health':
-            self.serve_json({"status": "running", "message": "Smart Doc Analysis Web Interface"})
+            self.serve_health()
+        elif self.path == '/events':
+            self.serve_events()
+        elif self.path.startswith('/events/poll'):
+            self.serve_events_poll()
+        elif self.path == '/cache-stats':
+            self.serve_json({
+                'search': self.search_cache.get_stats() if self.search_cache else None,
+                'analysis': self.analysis_cache.get_stats() if self.analysis_cache else None
+            })
+        elif self.path == '/jobs':
+            self.serve_json({'jobs': self.jobs.list_jobs(self.principal)})
+        elif self.path.startswith('/jobs/'):
+            self.serve_job_status(self.path[len('/jobs/'):])
+        elif self.path.startswith('/api/jobs/'):
+            self.serve_job_status(self.path[len('/api/jobs/'):], include_html=False)
+        elif self.path.startswith('/refresh-pathway/'):
+            self.serve_refresh_status(self.path[len('/refresh-pathway/'):])
         else:
             self.send_error(404, "Not Found")
 
     def do_POST(self):
-        if self.path == '/upload':
-            self.handle_upload()
-        elif self.path == '/search':
-            self.handle_search()
-        elif self.path == '/add-credits':
-            self.handle_add_credits()
-        elif self.path == '/refresh-pathway':
-            self.handle_refresh_pathway()
+        path = self.path.split('?', 1)[0]
+        if not self._check_ready():
+            return
+        if not self._identify_user():
+            return
+        if path in ADMISSION_PATHS and not self._admit(path):
+            return
+        if path in RATE_LIMITED_PATHS and not self._take_user_token():
+            self._release_upload_slot()
+            return
+        try:
+            if path == '/upload':
+                self.handle_upload()
+            elif path == '/upload-batch':
+                self.handle_batch_upload()
+            elif path == '/search':
+                self.handle_search()
+            elif path == '/api/search':
+                self.handle_api_search()
+            elif path == '/api/upload':
+                self.handle_upload(api=True)
+            elif self.path == '/add-credits':
+                self.handle_add_credits()
+            elif self.path == '/refresh-pathway':
+                self.handle_refresh_pathway()
+            else:
+                self.send_error(404, "Not Found")
+        finally:
+            # Uploads handed to the ingestion queue keep their slot until the job ends
+            self._release_upload_slot()
+
+    def _check_ready(self):
+        """Answer 503 and return False while the systems behind this route are still starting"""
+        if self.startup is None or self.startup.ready or self.path.split('?', 1)[0] in STARTUP_PATHS:
+            return True
+        self._discard_body()
+        if self.startup.error:
+            self._send_retry_later(503, f'Server failed to start ({self.startup.error})', 30)
         else:
-            self.send_error(404, "Not Found")
+            self._send_retry_later(503, f"Server is starting up ({self.startup.get_stats()['phase'] or 'finishing'})", 1)
+        return False
 
-    def serve_homepage(self):
+    def _identify_user(self):
+        """Resolve the calling user from X-API-Key; answers 401/403/400 and returns False on failure
+
+        Only an API key identifies a user, and X-User-Id is accepted only
+        alongside one, naming the key's own user. Anonymous requests act as
+        the default user, but are told apart by client address (principal)
+        for rate limiting and job ownership.
+        """
+        api_key = self.headers.get('X-API-Key')
+        claimed = self.headers.get('X-User-Id')
+        user_id = get_setting(self.config, 'security.api.default_user', 'demo_user')
+        self.authenticated = False
+        error = None
+        if api_key:
+            key_user = (get_setting(self.config, 'security.api.api_keys', {}) or {}).get(api_key)
+            if key_user is None:
+                error = (401, 'Invalid API key')
+            elif claimed and claimed != key_user:
+                error = (403, 'X-User-Id does not match the API key')
+            else:
+                user_id, self.authenticated = key_user, True
+        elif get_setting(self.config, 'security.api.api_key_required', False):
+            error = (401, 'An X-API-Key header is required')
+        elif claimed:
+            error = (401, 'X-User-Id requires an X-API-Key header')
+        
+        if error is None and not USER_ID_PATTERN.match(str(user_id)):
+            error = (400, 'Invalid user id')
+        if error:
+            self._discard_body()
+            self.serve_json({'success': False, 'error': error[1]}, status=error[0])
+            return False
+        self.user_id = str(user_id)
+        self.principal = self.user_id if self.authenticated else f'ip:{self.client_address[0]}'
+        return True
+
+    def _admit(self, path):
+        """Admission control; answers 429/503 with Retry-After and returns False when refused"""
+        if not self.admission:
+            return True
+        status, message, retry_after, slot = self.admission.admit(self.client_address[0], upload=path in UPLOAD_PATHS)
+        if status:
+            self._discard_body()
+            self._send_retry_later(status, message, retry_after)
+            return False
+        self.upload_slot = slot
+        return True
+
+    def _discard_body(self):
+        """Before refusing a request, make sure its unread body is not parsed as the next request
+
+        Small bodies are drained so the client reliably sees the answer; large
+        uploads are refused without waiting for them to arrive, and the
+        connection is closed after the response either way.
+        """
+        content_length = int(self.headers.get('Content-Length', 0) or 0)
+        if content_length <= 0 and not self.headers.get('Transfer-Encoding'):
+            return
+        if 0 < content_length <= 64 * 1024:
+            self.rfile.read(content_length)
+        self.close_connection = True
+
+    def _release_upload_slot(self):
+        if self.upload_slot:
+            self.upload_slot.release()
+            self.upload_slot = None
+
+    def _submit_job(self, name, func, *args):
+        """Queue an ingestion job that holds this request's upload slot until it finishes"""
+        slot, self.upload_slot = self.upload_slot, None
+        
+        def run(job, *args):
+            try:
+                return func(job, *args)
+            finally:
+                if slot:
+                    slot.release()
+        
+        try:
+            return self.jobs.submit(name, run, *args, owner=self.principal)
+        except Exception:
+            if slot:
+                slot.release()
+            raise
+
+    def _take_user_token(self):
+        """Charge one request to the caller's token bucket; answers 429 and returns False when it is empty"""
+        if not self.user_limiter:
+            return True
+        # Anonymous clients share the default user but not its bucket
+        wait = self.user_limiter.take(self.principal)
+        if wait:
+            self._discard_body()
+            who = self.user_id if self.authenticated else 'this client'
+            self._send_retry_later(429, f'Rate limit exceeded for {who}', wait)
+            return False
+        return True
+
+    def _send_retry_later(self, status, message, retry_after):
+        body = fast_json.dumps({'success': False, 'error': message, 'retry_after': round(retry_after, 1)})
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Retry-After', str(max(1, int(retry_after + 0.999))))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @staticmethod
+    def render_homepage():
+        """Build the homepage markup; run once at startup and served as a static asset"""
         html = """
         <!DOCTYPE html>
         <html lang="en">
@@ -273,9 +556,9 @@ class WebHandler(BaseHTTPRequestHandler):
 
                 <div class="upload-section">
                     <h3>📄 Upload Document</h3>
-                    <p style="color: #718096; margin: 10px 0;">Upload PDF, DOCX, or TXT files for AI-powered analysis</p>
+                    <p style="color: #718096; margin: 10px 0;">Upload PDF, DOCX, or TXT files (or a zip/tar archive of them) for AI-powered analysis</p>
                     <form id="uploadForm">
-                        <input type="file" id="fileInput" accept=".pdf,.docx,.txt,.md" required>
+                        <input type="file" id="fileInput" accept=".pdf,.docx,.txt,.md,.zip,.tar,.tgz,.gz" multiple required>
                         <br>
                         <button type="submit">Upload & Analyze</button>
                     </form>
@@ -293,7 +576,7 @@ class WebHandler(BaseHTTPRequestHandler):
 
                 <div class="loading" id="loading">
                     <div class="spinner"></div>
-                    <p>Processing with Smart Doc Analysis AI...</p>
+                    <p id="loadingText">Processing with Smart Doc Analysis AI...</p>
                 </div>
 
                 <div class="results" id="results"></div>
@@ -305,85 +588,120 @@ class WebHandler(BaseHTTPRequestHandler):
 
                 // Initialize dashboard
                 window.onload = function() {
-                    refreshBillingStats();
-                    refreshPathwayStats();
-                    
-                    // Auto-refresh every 30 seconds
-                    setInterval(refreshBillingStats, 30000);
-                    setInterval(refreshPathwayStats, 45000);
+                    // The server pushes both stats on connect and whenever they change
+                    subscribeToStats();
                 };
 
+                function subscribeToStats() {
+                    if (!window.EventSource) {
+                        pollStats(0);
+                        return;
+                    }
+                    const source = new EventSource('/events');
+                    source.addEventListener('billing', (event) => renderBillingStats(JSON.parse(event.data)));
+                    source.addEventListener('pathway', (event) => renderPathwayStats(JSON.parse(event.data)));
+                    source.onerror = () => {
+                        // EventSource reconnects by itself unless the server refused the stream
+                        if (source.readyState === EventSource.CLOSED) {
+                            pollStats(0);
+                        }
+                    };
+                }
+
+                async function pollStats(version) {
+                    // Long-poll fallback: each request is answered once the stats change
+                    try {
+                        const response = await fetch('/events/poll?since=' + version);
+                        if (!response.ok) {
+                            throw new Error('HTTP ' + response.status);
+                        }
+                        const data = await response.json();
+                        if (data.billing) renderBillingStats(data.billing);
+                        if (data.pathway) renderPathwayStats(data.pathway);
+                        pollStats(data.version);
+                    } catch (error) {
+                        console.error('Stats poll error:', error);
+                        setTimeout(() => pollStats(version), 30000);
+                    }
+                }
+
                 async function refreshBillingStats() {
                     try {
                         const response = await fetch('/billing-stats');
-                        billingData = await response.json();
-                        
-                        const qCost = billingData.pricing?.price_per_question || 0.10;
-                        const rCost = billingData.pricing?.price_per_report || 0.25;
-                        const qCount = billingData.questions_asked || 0;
-                        const rCount = billingData.reports_generated || 0;
-                        const balance = billingData.credits_balance || 10.0;
-                        const spent = billingData.total_spent || 0;
-                        
-                        // Update main counters
-                        document.getElementById('creditsBalance').textContent = `$${balance.toFixed(2)}`;
-                        document.getElementById('questionsAsked').textContent = qCount;
-                        document.getElementById('reportsGenerated').textContent = rCount;
-                        document.getElementById('totalSpent').textContent = `$${spent.toFixed(2)}`;
-                        
-                        // Update enhanced counter displays
-                        document.getElementById('questionCounter').textContent = 
-                            `${qCount} questions → $${(qCount * qCost).toFixed(2)} credits used`;
-                        document.getElementById('reportCounter').textContent = 
-                            `${rCount} reports → $${(rCount * rCost).toFixed(2)} credits used`;
-                        document.getElementById('totalCounter').textContent = 
-                            `$${spent.toFixed(2)} spent from $${(balance + spent).toFixed(2)} total`;
-                        
+                        renderBillingStats(await response.json());
                     } catch (error) {
                         console.error('Billing refresh error:', error);
                     }
                 }
+
+                function renderBillingStats(data) {
+                    billingData = data;
+                    
+                    const qCost = billingData.pricing?.price_per_question || 0.10;
+                    const rCost = billingData.pricing?.price_per_report || 0.25;
+                    const qCount = billingData.questions_asked || 0;
+                    const rCount = billingData.reports_generated || 0;
+                    const balance = billingData.credits_balance || 10.0;
+                    const spent = billingData.total_spent || 0;
+                    
+                    // Update main counters
+                    document.getElementById('creditsBalance').textContent = `$${balance.toFixed(2)}`;
+                    document.getElementById('questionsAsked').textContent = qCount;
+                    document.getElementById('reportsGenerated').textContent = rCount;
+                    document.getElementById('totalSpent').textContent = `$${spent.toFixed(2)}`;
+                    
+                    // Update enhanced counter displays
+                    document.getElementById('questionCounter').textContent = 
+                        `${qCount} questions → $${(qCount * qCost).toFixed(2)} credits used`;
+                    document.getElementById('reportCounter').textContent = 
+                        `${rCount} reports → $${(rCount * rCost).toFixed(2)} credits used`;
+                    document.getElementById('totalCounter').textContent = 
+                        `$${spent.toFixed(2)} spent from $${(balance + spent).toFixed(2)} total`;
+                }
                 
                 async function refreshPathwayStats() {
                     try {
                         const response = await fetch('/pathway-stats');
-                        pathwayData = await response.json();
-                        
-                        const totalSources = pathwayData.total_sources || 0;
-                        const recentUpdates = pathwayData.recent_activity?.sources_last_24h || 0;
-                        const lastRefresh = new Date().toLocaleTimeString();
-                        
-                        document.getElementById('liveSourcesCount').textContent = totalSources;
-                        document.getElementById('recentUpdates').textContent = recentUpdates;
-                        document.getElementById('lastUpdate').textContent = lastRefresh;
-                        
-                        // Update pathway status with dynamic messages
-                        let statusMessage = "";
-                        if (pathwayData.is_running) {
-                            if (recentUpdates > 0) {
-                                statusMessage = `Active - ${recentUpdates} new updates detected today`;
-                            } else {
-                                statusMessage = "Active - Monitoring for new content";
-                            }
-                        } else {
-                            statusMessage = "Paused - Manual refresh available";
-                        }
-                        
-                        document.getElementById('pathwayStatus').textContent = statusMessage;
-                        
-                        // Visual indicator for recent activity
-                        const statusElement = document.getElementById('pathwayStatus');
-                        if (recentUpdates > 0) {
-                            statusElement.style.color = "#90EE90";
-                        } else {
-                            statusElement.style.color = "rgba(255,255,255,0.9)";
-                        }
-                        
+                        renderPathwayStats(await response.json());
                     } catch (error) {
                         console.error('Pathway refresh error:', error);
                         document.getElementById('pathwayStatus').textContent = "Connection error - Retrying...";
                     }
                 }
+
+                function renderPathwayStats(data) {
+                    pathwayData = data;
+                    
+                    const totalSources = pathwayData.total_sources || 0;
+                    const recentUpdates = pathwayData.recent_activity?.sources_last_24h || 0;
+                    const lastRefresh = new Date().toLocaleTimeString();
+                    
+                    document.getElementById('liveSourcesCount').textContent = totalSources;
+                    document.getElementById('recentUpdates').textContent = recentUpdates;
+                    document.getElementById('lastUpdate').textContent = lastRefresh;
+                    
+                    // Update pathway status with dynamic messages
+                    let statusMessage = "";
+                    if (pathwayData.is_running) {
+                        if (recentUpdates > 0) {
+                            statusMessage = `Active - ${recentUpdates} new updates detected today`;
+                        } else {
+                            statusMessage = "Active - Monitoring for new content";
+                        }
+                    } else {
+                        statusMessage = "Paused - Manual refresh available";
+                    }
+                    
+                    document.getElementById('pathwayStatus').textContent = statusMessage;
+                    
+                    // Visual indicator for recent activity
+                    const statusElement = document.getElementById('pathwayStatus');
+                    if (recentUpdates > 0) {
+                        statusElement.style.color = "#90EE90";
+                    } else {
+                        statusElement.style.color = "rgba(255,255,255,0.9)";
+                    }
+                }
                 
                 async function addCredits() {
                     try {
@@ -417,8 +735,21 @@ class WebHandler(BaseHTTPRequestHandler):
                         if (response.ok) {
                             const result = await response.json();
                             
+                            // The refresh runs in the background; follow it until it finishes
+                            let cycle = result;
+                            while (cycle.status_url || cycle.status === 'running') {
+                                await new Promise(resolve => setTimeout(resolve, 1000));
+                                const statusResponse = await fetch('/refresh-pathway/' + result.cycle_id);
+                                cycle = await statusResponse.json();
+                            }
+                            if (cycle.status === 'failed') {
+                                throw new Error(cycle.error || 'Refresh cycle failed');
+                            }
+                            
                             // Show success feedback
-                            document.getElementById('pathwayStatus').textContent = "Refresh complete - New data available!";
+                            const newSources = cycle.result ? cycle.result.new_sources : 0;
+                            document.getElementById('pathwayStatus').textContent = newSources ?
+                                `Refresh complete - ${newSources} new sources ingested!` : "Refresh complete - No new sources";
                             document.getElementById('pathwayStatus').style.color = "#90EE90";
                             
                             // Refresh stats after a short delay to show the update
@@ -453,6 +784,7 @@ class WebHandler(BaseHTTPRequestHandler):
                 }
 
                 function showLoading() {
+                    document.getElementById('loadingText').textContent = 'Processing with Smart Doc Analysis AI...';
                     document.getElementById('loading').style.display = 'block';
                     document.getElementById('results').style.display = 'none';
                 }
@@ -461,30 +793,75 @@ class WebHandler(BaseHTTPRequestHandler):
                     document.getElementById('loading').style.display = 'none';
                 }
 
+                // Explain a 429/503 from admission control instead of showing raw JSON
+                async function busyNotice(response) {
+                    let data = {};
+                    try {
+                        data = await response.json();
+                    } catch (error) {}
+                    const retryAfter = response.headers.get('Retry-After') || '5';
+                    return '<div style="background: #fff3cd; border: 1px solid #ffeaa7; border-radius: 8px; padding: 20px; margin: 20px 0;">' +
+                        '<h3>⏳ Server Busy</h3>' +
+                        '<p>' + (data.error || 'Too many requests') + '</p>' +
+                        '<p>Please try again in ' + retryAfter + ' seconds.</p></div>';
+                }
+
+                // Poll a background ingestion job until it completes or fails
+                async function waitForJob(jobId) {
+                    while (true) {
+                        const response = await fetch('/jobs/' + jobId);
+                        const job = await response.json();
+                        
+                        if (job.status === 'completed') {
+                            return job.result_html;
+                        }
+                        if (job.status === 'failed' || !response.ok) {
+                            return '<div style="background: #f8d7da; border: 1px solid #f5c6cb; border-radius: 8px; padding: 20px; margin: 20px 0;">' +
+                                '<h3>❌ Upload Processing Failed</h3>' +
+                                '<p><strong>Error:</strong> ' + (job.error || job.message) + '</p>' +
+                                '<p>Please ensure you&#39;re uploading a supported file format (PDF, DOCX, TXT, MD).</p></div>';
+                        }
+                        
+                        document.getElementById('loadingText').textContent =
+                            '⏳ ' + job.stage + ' (' + job.progress + '%)';
+                        await new Promise(resolve => setTimeout(resolve, 1000));
+                    }
+                }
+
                 // Handle file upload
                 document.getElementById('uploadForm').addEventListener('submit', async function(e) {
                     e.preventDefault();
                     
                     const fileInput = document.getElementById('fileInput');
-                    const file = fileInput.files[0];
+                    const files = Array.from(fileInput.files);
                     
-                    if (!file) {
+                    if (files.length === 0) {
                         alert('Please select a file to upload');
                         return;
                     }
 
                     showLoading();
 
+                    // Several files or an archive go through the batch endpoint
+                    const isBatch = files.length > 1 || /[.](zip|tar|tgz|gz)$/i.test(files[0].name);
                     const formData = new FormData();
-                    formData.append('file', file);
+                    files.forEach(file => formData.append('file', file));
 
                     try {
-                        const response = await fetch('/upload', {
+                        const response = await fetch(isBatch ? '/upload-batch' : '/upload', {
                             method: 'POST',
                             body: formData
                         });
 
-                        const result = await response.text();
+                        let result;
+                        if (response.status === 429 || response.status === 503) {
+                            result = await busyNotice(response);
+                        } else if (response.status === 202) {
+                            const job = await response.json();
+                            result = await waitForJob(job.job_id);
+                        } else {
+                            result = await response.text();
+                        }
                         
                         document.getElementById('results').innerHTML = result;
                         document.getElementById('results').style.display = 'block';
@@ -523,10 +900,29 @@ class WebHandler(BaseHTTPRequestHandler):
                             body: 'query=' + encodeURIComponent(query)
                         });
 
-                        const result = await response.text();
+                        // Render the panel as it streams in: summary first, live data when it resolves
+                        const results = document.getElementById('results');
+                        let result = '';
+                        if (response.status === 429 || response.status === 503) {
+                            result = await busyNotice(response);
+                        } else if (response.body && window.TextDecoder) {
+                            const reader = response.body.getReader();
+                            const decoder = new TextDecoder();
+                            while (true) {
+                                const { done, value } = await reader.read();
+                                if (done) break;
+                                result += decoder.decode(value, { stream: true });
+                                results.innerHTML = result;
+                                results.style.display = 'block';
+                                hideLoading();
+                            }
+                            result += decoder.decode();
+                        } else {
+                            result = await response.text();
+                        }
                         
-                        document.getElementById('results').innerHTML = result;
-                        document.getElementById('results').style.display = 'block';
+                        results.innerHTML = result;
+                        results.style.display = 'block';
                         
                         // Refresh billing stats after search
                         refreshBillingStats();
@@ -543,272 +939,496 @@ class WebHandler(BaseHTTPRequestHandler):
         </html>
         """
         
-        self.send_response(200)
-        self.send_header('Content-type', 'text/html')
-        self.end_headers()
-        self.wfile.write(html.encode())
+        return html
+
+    def serve_homepage(self):
+        asset = self.static_assets.get('/')
+        if asset is None:
+            asset = build_asset(self.render_homepage(), 'text/html; charset=utf-8')
+        self.serve_static(asset)
+
+    def _parse_upload_form(self):
+        """Stream the multipart body straight to disk, enforcing the size limit as we go"""
+        max_file_size_mb = get_setting(self.config, 'storage.max_file_size_mb', 100)
+        parser = MultipartStreamParser(
+            self.rfile,
+            self.headers.get('Content-Type', ''),
+            self.headers.get('Content-Length', 0),
+            max_file_size=int(max_file_size_mb * 1024 * 1024),
+            hash_algorithm=self._upload_hash_algorithm()
+        )
+        return parser.parse()
 
-    def handle_upload(self):
+    def _upload_hash_algorithm(self):
+        """Digest uploads while streaming them when dedup or the analysis cache needs it"""
+        if self.dedup:
+            return self.dedup.hash_algorithm
+        if self.analysis_cache:
+            return get_setting(self.config, 'document_processing.duplicate_detection.hash_algorithm', 'md5')
+        return None
+
+    def handle_upload(self, api=False):
+        """Queue an uploaded document; with api=True every response is JSON"""
+        form = None
         try:
-            import tempfile
-            import os
-            from urllib.parse import parse_qs
+            form = self._parse_upload_form()
+            
+            upload = form.first_file()
+            if not upload:
+                raise ValueError("No file content found")
             
-            # Parse the multipart form data
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
+            # A file analyzed before is answered from the cache with fresh live data
+            cached = self.analysis_cache.get(upload.digest) if self.analysis_cache else None
+            if cached:
+                print(f"Cached analysis reused: {upload.filename} (first analyzed as {cached['filename']})")
+                form.cleanup()
+                from passage_index import top_terms
+                related_live_data = self._get_related_live_data(
+                    cached.get('live_data_keywords') or top_terms(cached.get('live_data_query', ''), self._stop_words())
+                )
+                if api:
+                    self.serve_json(self._upload_result_data(
+                        upload.filename, cached['page_count'], cached['word_count'],
+                        cached.get('document'), related_live_data, cached_at=cached['analyzed_at']
+                    ))
+                    return
+                result_html = self._format_upload_report(
+                    upload.filename, cached['page_count'], cached['word_count'],
+                    cached['analysis_html'], related_live_data, cached_at=cached['analyzed_at']
+                )
+                self.send_html(result_html)
+                return
             
-            # Extract file data from multipart form
-            boundary = self.headers['Content-Type'].split('boundary=')[1].encode()
-            parts = post_data.split(b'--' + boundary)
+            # Otherwise a file we've already analyzed is rejected before any extraction work
+            if self.dedup:
+                original = self.dedup.lookup('upload', upload.digest)
+                if original:
+                    print(f"Duplicate upload skipped: {upload.filename} (first seen as {original['ref']})")
+                    form.cleanup()
+                    if api:
+                        self.serve_json({
+                            'success': True,
+                            'duplicate': True,
+                            'filename': upload.filename,
+                            'original_filename': original['ref'],
+                            'first_seen': original['first_seen']
+                        })
+                    else:
+                        self._send_duplicate_notice(upload.filename, original)
+                    return
             
-            file_content = None
-            filename = "uploaded_file"
+            # Extraction and analysis run in the background; the browser polls /jobs/<id>
+            job = self._submit_job(upload.filename, self._process_upload, form, upload)
+            print(f"Queued uploaded file: {upload.filename} (job {job.job_id})")
             
-            for part in parts:
-                if b'Content-Disposition' in part and b'filename=' in part:
-                    # Extract filename
-                    lines = part.split(b'\r\n')
-                    for line in lines:
-                        if b'filename=' in line:
-                            filename = line.decode().split('filename="')[1].split('"')[0]
-                            break
-                    
-                    # Extract file content
-                    content_start = part.find(b'\r\n\r\n') + 4
-                    if content_start > 3:
-                        file_content = part[content_start:].rstrip(b'\r\n')
-                        break
+            self.serve_json({
+                'success': True,
+                'job_id': job.job_id,
+                'status': job.status,
+                'status_url': f'/api/jobs/{job.job_id}' if api else f'/jobs/{job.job_id}',
+                'message': 'Document queued for analysis'
+            }, status=202)
+            
+        except Exception as e:
+            print(f"Upload processing error: {e}")
+            if form:
+                form.cleanup()
+            if api:
+                self.serve_json({'success': False, 'error': str(e)},
+                                status=413 if isinstance(e, UploadTooLarge) else 500)
+            else:
+                self._send_upload_error(e)
+
+    def handle_batch_upload(self):
+        """Queue many files, or zip/tar archives of them, as one batch job"""
+        form = None
+        try:
+            form = self._parse_upload_form()
             
-            if not file_content:
+            uploads = [upload for upload in form.files if upload.size > 0]
+            if not uploads:
                 raise ValueError("No file content found")
             
-            # Save to temporary file for processing
-            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1]) as tmp_file:
-                tmp_file.write(file_content)
-                temp_path = tmp_file.name
+            label = uploads[0].filename if len(uploads) == 1 else f"{len(uploads)} files"
+            job = self._submit_job(f"Batch: {label}", self._process_batch_upload, form)
+            print(f"Queued batch upload: {label} (job {job.job_id})")
+            
+            self.serve_json({
+                'success': True,
+                'job_id': job.job_id,
+                'status': job.status,
+                'status_url': f'/jobs/{job.job_id}',
+                'message': f'{len(uploads)} uploaded files queued for batch analysis'
+            }, status=202)
             
+        except Exception as e:
+            print(f"Batch upload error: {e}")
+            if form:
+                form.cleanup()
+            self._send_upload_error(e)
+
+    def _send_duplicate_notice(self, filename, original):
+        """Tell the user an upload matches a document that was already analyzed"""
+        notice_html = f"""
+        <div style="background: #fff3cd; border: 1px solid #ffeaa7; border-radius: 8px; padding: 20px; margin: 20px 0;">
+            <h3>♻️ Document Already Analyzed</h3>
+            <p><strong>📄 File:</strong> {filename}</p>
+            <p>This file has the same content as <strong>{original['ref']}</strong>, uploaded {original['first_seen'][:16].replace('T', ' ')}.</p>
+            <p>It was not processed again and no credits were charged. Search your documents to ask questions about it.</p>
+        </div>
+        """
+        self.send_html(notice_html)
+
+    def _send_upload_error(self, e):
+        """Send the upload failure page, using 413 for oversized files"""
+        max_file_size_mb = get_setting(self.config, 'storage.max_file_size_mb', 100)
+        error_html = f"""
+        <div style="background: #f8d7da; border: 1px solid #f5c6cb; border-radius: 8px; padding: 20px; margin: 20px 0;">
+            <h3>❌ Upload Processing Failed</h3>
+            <p><strong>Error:</strong> {str(e)}</p>
+            <p>Please ensure you're uploading a supported file format (PDF, DOCX, TXT, MD).</p>
+            <div style="margin-top: 15px; padding: 10px; background: rgba(108,117,125,0.1); border-radius: 5px;">
+                <strong>Troubleshooting:</strong>
+                <ul>
+                    <li>Check if the file is not corrupted</li>
+                    <li>Ensure file size is within the {max_file_size_mb}MB upload limit</li>
+                    <li>Try with a different file format</li>
+                </ul>
+            </div>
+        </div>
+        """
+        self.send_html(error_html, status=413 if isinstance(e, UploadTooLarge) else 500)
+
+    def _process_upload(self, job, form, upload):
+        """Extract, analyze and bill an uploaded document as a background job"""
+        filename = upload.filename
+        try:
+            # Process the document using the assistant
+            print(f"Processing uploaded file: {filename}")
+            job.update(20, 'Extracting text')
+            # Extract on the process pool first, so the assistant's exclusive
+            # lock only covers indexing and searches keep running meanwhile
+            extracted = self.batch_extractor.extract_all([upload.path])[0]
+            if extracted['error']:
+                raise ValueError(extracted['error'])
+            text_path = extracted['text_path']
             try:
-                # Process the document using the assistant
-                print(f"Processing uploaded file: {filename}")
-                docs = self.assistant.upload_documents([temp_path])
-                
-                if not docs:
-                    raise ValueError("Failed to process document")
-                
-                # Get the processed document
-                doc_name = list(docs.keys())[0]
-                doc = docs[doc_name]
-                
-                # Generate comprehensive analysis
-                analysis_result = self._analyze_document(doc, filename)
-                
-                # Track billing for document processing
-                if self.billing:
-                    self.billing.bill_report("demo_user", f"Document analysis: {filename}", f"upload_{int(time.time())}", success=True)
-                
-                # Get related live data from Pathway
-                related_live_data = self._get_related_live_data(doc.full_text[:500])  # Use first 500 chars for matching
-                
-                result_html = f"""
-                <div style="background: #d4edda; border: 1px solid #c3e6cb; border-radius: 8px; padding: 25px; margin: 20px 0;">
-                    <h3>✅ Document Analysis Report Generated!</h3>
-                    <p><strong>📄 File:</strong> {filename}</p>
-                    <p><strong>📊 Stats:</strong> {doc.metadata.page_count} pages, {doc.metadata.word_count} words</p>
-                    <p><strong>⏱️ Processing Time:</strong> Real-time analysis with live data integration</p>
-                    <p><strong>💰 Flexprice Billing:</strong> $0.25 charged for comprehensive report generation</p>
-                    <p style="background: rgba(72, 187, 120, 0.1); padding: 10px; border-radius: 5px; margin: 10px 0; border-left: 4px solid #48bb78;">
-                        <strong>📈 Report Counter:</strong> 1 report generated → $0.25 credits used from your account
-                    </p>
-                </div>
-                
-                {analysis_result}
-                
-                {self._format_live_data_section(related_live_data)}
-                
-                <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; text-align: center; margin: 20px 0; padding: 20px; border-radius: 8px;">
-                    <p style="margin: 0; font-weight: bold;">✨ Analysis powered by Smart Doc Analysis AI + Pathway Live Data Integration ✨</p>
-                    <p style="margin: 5px 0 0 0; font-size: 0.9em; opacity: 0.9;">🔄 Answers refresh automatically as new live data becomes available</p>
+                docs = self.assistant.upload_documents([text_path])
+            finally:
+                if text_path != upload.path and os.path.exists(text_path):
+                    os.remove(text_path)
+            
+            if not docs:
+                raise ValueError("Failed to process document")
+            
+            # Get the processed document
+            doc_name = list(docs.keys())[0]
+            doc = docs[doc_name]
+            document_id = passage_document_id(filename, upload.digest)
+            self._index_passages(document_id, doc.full_text)
+            self._corpus_changed()
+            
+            # Generate comprehensive analysis
+            job.update(55, 'Analyzing document')
+            analysis_result, document_data = self._analyze_document(doc, filename, document_id)
+            
+            # Track billing for document processing
+            if self.billing:
+                self.billing.bill_report(self.user_id, f"Document analysis: {filename}", f"upload_{int(time.time())}", success=True)
+                self._stats_changed('billing')
+            
+            if self.dedup and upload.digest:
+                self.dedup.add('upload', upload.digest, filename)
+            
+            # Get related live data from Pathway
+            job.update(80, 'Matching live data')
+            live_data_keywords = self._document_keywords(document_id, doc.full_text)
+            related_live_data = self._get_related_live_data(live_data_keywords)
+            
+            if self.analysis_cache and upload.digest:
+                self.analysis_cache.put(upload.digest, {
+                    'filename': filename,
+                    'page_count': extracted['page_count'],
+                    'word_count': doc.metadata.word_count,
+                    'analysis_html': analysis_result,
+                    'document': document_data,
+                    'live_data_keywords': live_data_keywords,
+                    'analyzed_at': datetime.now().isoformat()
+                })
+            
+            result_html = self._format_upload_report(
+                filename, extracted['page_count'], doc.metadata.word_count,
+                analysis_result, related_live_data
+            )
+            
+            return result_html, self._upload_result_data(
+                filename, extracted['page_count'], doc.metadata.word_count,
+                document_data, related_live_data
+            )
+            
+        finally:
+            # Clean up temporary files for every uploaded part
+            form.cleanup()
+
+    def _upload_result_data(self, filename, page_count, word_count, document, live_data, cached_at=None):
+        """Structured single-document result shared by the JSON API and job results"""
+        return {
+            'success': True,
+            'filename': filename,
+            'page_count': page_count,
+            'word_count': word_count,
+            'cached': bool(cached_at),
+            'analyzed_at': cached_at,
+            'document': document,
+            'live_data': live_data
+        }
+
+    def _format_upload_report(self, filename, page_count, word_count, analysis_html, live_data, cached_at=None):
+        """Format the single-document report, noting when the analysis came from the cache"""
+        if cached_at:
+            header = f"""
+        <div style="background: #d4edda; border: 1px solid #c3e6cb; border-radius: 8px; padding: 25px; margin: 20px 0;">
+            <h3>✅ Document Analysis Report (cached)</h3>
+            <p><strong>📄 File:</strong> {filename}</p>
+            <p><strong>📊 Stats:</strong> {page_count} pages, {word_count} words</p>
+            <p><strong>⏱️ Processing Time:</strong> Instant: this document was analyzed on {cached_at[:16].replace('T', ' ')}; live data below is fresh</p>
+            <p><strong>💰 Flexprice Billing:</strong> No additional credits charged for a previously analyzed document</p>
+        </div>
+        """
+        else:
+            header = f"""
+        <div style="background: #d4edda; border: 1px solid #c3e6cb; border-radius: 8px; padding: 25px; margin: 20px 0;">
+            <h3>✅ Document Analysis Report Generated!</h3>
+            <p><strong>📄 File:</strong> {filename}</p>
+            <p><strong>📊 Stats:</strong> {page_count} pages, {word_count} words</p>
+            <p><strong>⏱️ Processing Time:</strong> Real-time analysis with live data integration</p>
+            <p><strong>💰 Flexprice Billing:</strong> $0.25 charged for comprehensive report generation</p>
+            <p style="background: rgba(72, 187, 120, 0.1); padding: 10px; border-radius: 5px; margin: 10px 0; border-left: 4px solid #48bb78;">
+                <strong>📈 Report Counter:</strong> 1 report generated → $0.25 credits used from your account
+            </p>
+        </div>
+        """
+        
+        return f"""{header}
+        {analysis_html}
+        
+        {self._format_live_data_section(live_data)}
+        
+        <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; text-align: center; margin: 20px 0; padding: 20px; border-radius: 8px;">
+            <p style="margin: 0; font-weight: bold;">✨ Analysis powered by Smart Doc Analysis AI + Pathway Live Data Integration ✨</p>
+            <p style="margin: 5px 0 0 0; font-size: 0.9em; opacity: 0.9;">🔄 Answers refresh automatically as new live data becomes available</p>
+        </div>
+        """
+
+    def _process_batch_upload(self, job, form):
+        """Extract, analyze and bill a batch of uploaded documents as one job"""
+        batch_dir = tempfile.mkdtemp(prefix='batch_upload_')
+        try:
+            max_files = get_setting(self.config, 'performance.batch_upload.max_files', 500)
+            max_file_size_mb = get_setting(self.config, 'storage.max_file_size_mb', 100)
+            
+            # Gather documents from plain uploads and archives into one directory
+            job.update(10, 'Unpacking uploaded files')
+            documents = []
+            skipped = []
+            digests = {}
+            for upload in form.files:
+                if not upload.size:
+                    continue
+                if is_archive(upload.filename):
+                    documents.extend(expand_archive(
+                        upload.path, upload.filename, batch_dir,
+                        max_members=max_files,
+                        max_file_size=int(max_file_size_mb * 1024 * 1024)
+                    ))
+                elif is_supported(upload.filename):
+                    target = os.path.join(batch_dir, upload.filename)
+                    if os.path.exists(target):
+                        target = os.path.join(batch_dir, f"{len(documents)}_{upload.filename}")
+                    os.replace(upload.path, target)
+                    documents.append((upload.filename, target))
+                    digests[target] = upload.digest
+                else:
+                    skipped.append(upload.filename)
+            
+            documents = documents[:max_files]
+            
+            # Drop files seen before, or repeated within this batch, before extraction
+            duplicates = []
+            if self.dedup:
+                unique = []
+                batch_seen = set()
+                for name, path in documents:
+                    digest = digests.get(path) or self.dedup.digest_file(path)
+                    digests[path] = digest
+                    if digest in batch_seen or self.dedup.lookup('upload', digest):
+                        duplicates.append(name)
+                    else:
+                        batch_seen.add(digest)
+                        unique.append((name, path))
+                documents = unique
+            
+            if not documents and duplicates:
+                notice = f"""
+                <div style="background: #fff3cd; border: 1px solid #ffeaa7; border-radius: 8px; padding: 20px; margin: 20px 0;">
+                    <h3>♻️ Documents Already Analyzed</h3>
+                    <p>All {len(duplicates)} documents match files that were analyzed before: {', '.join(duplicates)}</p>
+                    <p>They were not processed again and no credits were charged.</p>
                 </div>
                 """
+                return notice, {'files_received': len(duplicates), 'files_processed': 0, 'files_duplicate': duplicates}
+            if not documents:
+                raise ValueError("No supported documents (PDF, DOCX, TXT, MD) found in upload")
+            
+            # Text extraction runs on the process pool, so it isn't bound by the GIL
+            job.update(20, f'Extracting and analyzing {len(documents)} files')
+            batch_start = time.time()
+            
+            def report_progress(done, total):
+                job.update(20 + 50 * done // total, f'Processed {done}/{total} files')
+            
+            extracted = self.batch_extractor.extract_all(
+                [path for _, path in documents], progress_callback=report_progress
+            )
+            
+            files = []
+            for (name, path), result in zip(documents, extracted):
+                files.append({
+                    'filename': name,
+                    'digest': digests.get(path),
+                    'text_path': result['text_path'],
+                    'page_count': result['page_count'],
+                    'word_count': result['word_count'],
+                    'extract_seconds': result['extract_seconds'],
+                    'analyze_seconds': result['analyze_seconds'],
+                    'topics': result['analysis'].topics if result['analysis'] else [],
+                    'error': result['error']
+                })
+            processed = [entry for entry in files if not entry['error']]
+            
+            # Index all extracted texts with the assistant in a single call
+            job.update(75, f'Indexing {len(processed)} documents')
+            index_start = time.time()
+            if processed:
+                self.assistant.upload_documents([entry['text_path'] for entry in processed])
+                for entry in processed:
+                    entry['document_id'] = passage_document_id(entry['filename'], entry['digest'])
+                    with open(entry['text_path'], 'r', encoding='utf-8', errors='replace') as f:
+                        self._index_passages(entry['document_id'], f.read())
+                self._corpus_changed()
+                self._add_key_passages(processed)
+            index_seconds = round(time.time() - index_start, 3)
+            
+            # Each worker already analyzed its document; only aggregate here
+            topic_counts = Counter()
+            for entry in processed:
+                topic_counts.update(entry['topics'])
                 
-            finally:
-                # Clean up temporary file
-                try:
-                    os.unlink(temp_path)
-                except:
-                    pass
+                if self.billing:
+                    self.billing.bill_report(self.user_id, f"Document analysis: {entry['filename']}", f"upload_{int(time.time())}", success=True)
+                if self.dedup and entry['digest']:
+                    self.dedup.add('upload', entry['digest'], entry['filename'])
             
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            self.wfile.write(result_html.encode())
+            if self.billing and processed:
+                self._stats_changed('billing')
             
-        except Exception as e:
-            print(f"Upload processing error: {e}")
-            error_html = f"""
-            <div style="background: #f8d7da; border: 1px solid #f5c6cb; border-radius: 8px; padding: 20px; margin: 20px 0;">
-                <h3>❌ Upload Processing Failed</h3>
-                <p><strong>Error:</strong> {str(e)}</p>
-                <p>Please ensure you're uploading a supported file format (PDF, DOCX, TXT, MD).</p>
-                <div style="margin-top: 15px; padding: 10px; background: rgba(108,117,125,0.1); border-radius: 5px;">
-                    <strong>Troubleshooting:</strong>
-                    <ul>
-                        <li>Check if the file is not corrupted</li>
-                        <li>Ensure file size is reasonable (&lt; 10MB)</li>
-                        <li>Try with a different file format</li>
-                    </ul>
+            job.update(95, 'Matching live data')
+            top_topics = [topic for topic, _ in topic_counts.most_common(5)]
+            related_live_data = self._get_related_live_data(top_topics)
+            
+            summary = {
+                'files_received': len(documents) + len(skipped) + len(duplicates),
+                'files_processed': len(processed),
+                'files_failed': len(files) - len(processed),
+                'files_skipped': skipped,
+                'files_duplicate': duplicates,
+                'total_pages': sum(entry['page_count'] for entry in processed),
+                'total_words': sum(entry['word_count'] for entry in processed),
+                'top_topics': top_topics,
+                'index_seconds': index_seconds,
+                'total_seconds': round(time.time() - batch_start, 3),
+                'files': [{k: v for k, v in entry.items() if k not in ('text_path', 'digest')} for entry in files]
+            }
+            
+            result_html = self._format_batch_report(summary) + self._format_live_data_section(related_live_data)
+            return result_html, summary
+            
+        finally:
+            form.cleanup()
+            shutil.rmtree(batch_dir, ignore_errors=True)
+
+    def _format_batch_report(self, summary):
+        """Format the combined analysis of a batch upload as HTML"""
+        rows = []
+        for entry in summary['files']:
+            if entry['error']:
+                status = f"❌ {entry['error']}"
+            else:
+                status = ', '.join(entry['topics']) or '—'
+            rows.append(f"""
+                <tr style="border-bottom: 1px solid #e2e8f0;">
+                    <td style="padding: 8px;">{entry['filename']}</td>
+                    <td style="padding: 8px; text-align: right;">{entry['page_count']}</td>
+                    <td style="padding: 8px; text-align: right;">{entry['word_count']}</td>
+                    <td style="padding: 8px; text-align: right;">{entry['extract_seconds'] * 1000:.0f} ms</td>
+                    <td style="padding: 8px; text-align: right;">{entry['analyze_seconds'] * 1000:.0f} ms</td>
+                    <td style="padding: 8px;">{status}</td>
+                </tr>""")
+        
+        skipped_note = ""
+        if summary['files_skipped']:
+            skipped_note = f"<p><strong>⏭️ Skipped (unsupported):</strong> {', '.join(summary['files_skipped'])}</p>"
+        if summary['files_duplicate']:
+            skipped_note += f"<p><strong>♻️ Skipped (already analyzed):</strong> {', '.join(summary['files_duplicate'])}</p>"
+        
+        return f"""
+        <div style="background: #d4edda; border: 1px solid #c3e6cb; border-radius: 8px; padding: 25px; margin: 20px 0;">
+            <h3>✅ Batch Analysis Report Generated!</h3>
+            <p><strong>📄 Files:</strong> {summary['files_processed']} processed, {summary['files_failed']} failed</p>
+            <p><strong>📊 Stats:</strong> {summary['total_pages']} pages, {summary['total_words']} words</p>
+            <p><strong>⏱️ Processing Time:</strong> {summary['total_seconds']:.2f}s total ({summary['index_seconds']:.2f}s indexing)</p>
+            <p><strong>💰 Flexprice Billing:</strong> ${0.25 * summary['files_processed']:.2f} charged for {summary['files_processed']} document reports</p>
+            {skipped_note}
+        </div>
+        
+        <div style="background: white; border-radius: 10px; padding: 25px; margin: 20px 0; box-shadow: 0 2px 10px rgba(0,0,0,0.1);">
+            <h3>📊 Combined Analysis</h3>
+            <div style="background: #e3f2fd; padding: 20px; border-radius: 8px; margin: 15px 0;">
+                <h4>🎯 Key Topics Across All Documents</h4>
+                <div style="display: flex; flex-wrap: wrap; gap: 10px; margin-top: 10px;">
+                    {self._format_topic_tags(summary['top_topics'])}
                 </div>
             </div>
-            """
-            self.send_response(500)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            self.wfile.write(error_html.encode())
+            <div style="overflow-x: auto;">
+                <table style="width: 100%; border-collapse: collapse; font-size: 0.9em;">
+                    <tr style="background: #f8f9fa; text-align: left;">
+                        <th style="padding: 8px;">File</th>
+                        <th style="padding: 8px; text-align: right;">Pages</th>
+                        <th style="padding: 8px; text-align: right;">Words</th>
+                        <th style="padding: 8px; text-align: right;">Extraction</th>
+                        <th style="padding: 8px; text-align: right;">Analysis</th>
+                        <th style="padding: 8px;">Topics</th>
+                    </tr>
+                    {''.join(rows)}
+                </table>
+            </div>
+        </div>
+        """
 
     def handle_search(self):
         try:
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length).decode('utf-8')
-            params = urllib.parse.parse_qs(post_data)
-            query = params.get('query', [''])[0]
-            
-            if not query:
-                raise ValueError("No query provided")
-            
-            # Use the actual Smart Doc Analysis for search
-            print(f"Web search request: '{query}'")
-            
-            # Track billing for search query
-            if self.billing:
-                self.billing.bill_question("demo_user", query, f"web_{int(time.time())}", success=True)
+            query = self._start_search()
             
             # Get real AI response using the assistant
             try:
-                # Use the assistant's research_query functionality
-                research_report = self.assistant.research_query(query, include_online=False, max_results=5)
-                
-                # Format the real results in a nice HTML format
-                if research_report and hasattr(research_report, 'main_findings') and research_report.main_findings:
-                    # Create formatted results from research report
-                    results_content = f"""
-                    <div style="background: white; padding: 20px; border-radius: 8px; margin: 15px 0;">
-                        <h4>📊 Executive Summary</h4>
-                        <p style="background: #f8f9fa; padding: 15px; border-radius: 5px; margin: 10px 0;">
-                            {research_report.executive_summary}
-                        </p>
-                        <p><strong>Confidence Score:</strong> {research_report.confidence_score:.2f}</p>
-                        <p><strong>Total Sources:</strong> {research_report.total_sources}</p>
-                    </div>
-                    """
-                    
-                    # Add key findings
-                    if research_report.main_findings:
-                        results_content += "<h4>🔍 Key Findings:</h4>"
-                        for i, finding in enumerate(research_report.main_findings[:3]):
-                            results_content += f"""
-                            <div style="background: white; padding: 15px; border-radius: 8px; margin: 10px 0; border-left: 4px solid #667eea;">
-                                <h5>📄 Finding {i+1}</h5>
-                                <p><strong>Fact:</strong> {finding.fact_text}</p>
-                                <p><strong>Confidence:</strong> {finding.confidence_level}</p>
-                                <p><strong>Citations:</strong> {', '.join(finding.citations) if finding.citations else 'None'}</p>
-                            </div>
-                            """
-                else:
-                    results_content = """
-                    <div style="background: #fff3cd; border: 1px solid #ffeaa7; padding: 15px; border-radius: 8px;">
-                        <p>🤖 <strong>AI Assistant Response:</strong></p>
-                        <p>I understand your query: "{query}"</p>
-                        <p>However, no uploaded documents were found to search through. Please upload some documents first, or I can provide a general response based on my knowledge.</p>
-                        <p><strong>General AI Response:</strong></p>
-                        <div style="background: #f8f9fa; padding: 10px; border-radius: 5px; margin: 10px 0;">
-                            Based on your query, here's what I can tell you: This appears to be a request for information. To provide the most accurate and relevant response, I would need access to specific documents or data sources. Please upload relevant documents and try your search again.
-                        </div>
-                    </div>
-                    """
-                
-                # Check for related live data to show data refresh capabilities
-                live_data_context = ""
-                if self.pathway:
-                    try:
-                        # Get live data related to the query
-                        live_results = self.pathway.search_live_data(query, limit=2)
-                        if live_results:
-                            live_data_context = f"""
-                            <div style="background: #e8f5e8; border: 1px solid #4caf50; border-radius: 8px; padding: 15px; margin: 15px 0;">
-                                <h4>🔄 Live Data Integration</h4>
-                                <p><strong>⚡ Fresh Updates:</strong> Found {len(live_results)} related live sources that update your answer:</p>
-                                <ul style="margin: 10px 0 10px 20px; line-height: 1.6;">
-                                    {''.join([f'<li><strong>{item["title"][:60]}...</strong> - {item["source_type"].upper()} ({item["relevance_score"]:.2f} relevance)</li>' for item in live_results])}
-                                </ul>
-                                <p style="font-size: 0.9em; color: #4caf50; margin-top: 10px;">
-                                    🔄 <strong>Answer Freshness:</strong> This response incorporates live data updated within the last 24 hours. 
-                                    Answers automatically refresh as new information becomes available.
-                                </p>
-                            </div>
-                            """
-                    except Exception as e:
-                        print(f"Live data integration error: {e}")
-                
-                result_html = f"""
-                <div style="background: #cce7ff; border: 1px solid #b3d9ff; border-radius: 8px; padding: 25px; margin: 20px 0;">
-                    <h3>🔍 Smart Search Results for: "{query}"</h3>
-                    <div style="margin: 15px 0;">
-                        <p><strong>✅ Smart Doc Analysis AI Analysis Complete!</strong></p>
-                        <p>🧠 Query processed using advanced natural language understanding</p>
-                        <p>⚡ Real-time search powered by Smart Doc Analysis + Live Data</p>
-                    </div>
-                    
-                    {results_content}
-                    
-                    {live_data_context}
-                    
-                    <div style="background: #f8f9fa; padding: 15px; border-radius: 8px; margin: 15px 0;">
-                        <h4>📊 Processing Details:</h4>
-                        <p><strong>Query:</strong> "{query}"</p>
-                        <p><strong>Processing Method:</strong> Smart Doc Analysis AI</p>
-                        <p><strong>Search Type:</strong> Semantic search with AI analysis + Live Data Integration</p>
-                        <p><strong>💰 Flexprice Billing:</strong> $0.10 charged for this question</p>
-                        <p><strong>🔄 Data Freshness:</strong> Includes live sources updated every 30 seconds</p>
-                    </div>
-                    
-                    <div style="text-align: center; margin-top: 20px;">
-                        <p style="color: #667eea; font-weight: bold;">✨ Powered by Smart Doc Analysis AI + Pathway Live Data ✨</p>
-                    </div>
-                </div>
-                """
+                cache_key, data, live_lookup = self._begin_search(query)
             except Exception as search_error:
                 print(f"Search error: {search_error}")
                 # Fallback to AI assistant response
-                result_html = f"""
-                <div style="background: #cce7ff; border: 1px solid #b3d9ff; border-radius: 8px; padding: 25px; margin: 20px 0;">
-                    <h3>🤖 AI Assistant Response for: "{query}"</h3>
-                    <div style="background: white; padding: 20px; border-radius: 8px; margin: 15px 0;">
-                        <h4>🧠 Smart Analysis:</h4>
-                        <p>I understand you're asking about: <strong>"{query}"</strong></p>
-                        <p>Here's my analysis of your query:</p>
-                        <div style="background: #f8f9fa; padding: 15px; border-radius: 5px; margin: 10px 0;">
-                            <p>Based on natural language processing, this appears to be a {self._analyze_query_type(query)} query. To provide the most accurate response, I recommend:</p>
-                            <ul style="margin: 10px 0 10px 20px;">
-                                <li>Upload relevant documents for document-specific searches</li>
-                                <li>Use specific keywords for better results</li>
-                                <li>Try rephrasing your query if needed</li>
-                            </ul>
-                        </div>
-                        <p><strong>AI Insight:</strong> {self._generate_ai_insight(query)}</p>
-                    </div>
-                    <div style="background: #f8f9fa; padding: 15px; border-radius: 8px; margin: 15px 0;">
-                        <p><strong>Query:</strong> "{query}"</p>
-                        <p><strong>Processing:</strong> Smart Doc Analysis AI</p>
-                        <p><strong>Billing:</strong> $0.25 charged for this query</p>
-                    </div>
-                </div>
-                """
+                self.send_html(self._format_search_fallback(query))
+                return
             
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            self.wfile.write(result_html.encode())
+            self._stream_search_html(cache_key, data, live_lookup)
             
         except Exception as e:
             error_html = f"""
@@ -818,11 +1438,302 @@ class WebHandler(BaseHTTPRequestHandler):
                 <p>Make sure you have uploaded some documents first!</p>
             </div>
             """
-            self.send_response(500)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            self.wfile.write(error_html.encode())
+            self.send_html(error_html, status=500)
+
+    def _format_search_fallback(self, query):
+        """General AI response shown when the document search itself fails"""
+        return f"""
+        <div style="background: #cce7ff; border: 1px solid #b3d9ff; border-radius: 8px; padding: 25px; margin: 20px 0;">
+            <h3>🤖 AI Assistant Response for: "{query}"</h3>
+            <div style="background: white; padding: 20px; border-radius: 8px; margin: 15px 0;">
+                <h4>🧠 Smart Analysis:</h4>
+                <p>I understand you're asking about: <strong>"{query}"</strong></p>
+                <p>Here's my analysis of your query:</p>
+                <div style="background: #f8f9fa; padding: 15px; border-radius: 5px; margin: 10px 0;">
+                    <p>Based on natural language processing, this appears to be a {self._analyze_query_type(query)} query. To provide the most accurate response, I recommend:</p>
+                    <ul style="margin: 10px 0 10px 20px;">
+                        <li>Upload relevant documents for document-specific searches</li>
+                        <li>Use specific keywords for better results</li>
+                        <li>Try rephrasing your query if needed</li>
+                    </ul>
+                </div>
+                <p><strong>AI Insight:</strong> {self._generate_ai_insight(query)}</p>
+            </div>
+            <div style="background: #f8f9fa; padding: 15px; border-radius: 8px; margin: 15px 0;">
+                <p><strong>Query:</strong> "{query}"</p>
+                <p><strong>Processing:</strong> Smart Doc Analysis AI</p>
+                <p><strong>Billing:</strong> $0.25 charged for this query</p>
+            </div>
+        </div>
+        """
+
+    def _stream_search_html(self, cache_key, data, live_lookup):
+        """Send the results panel in pieces: summary and findings first, live data once it resolves"""
+        self._start_stream('text/html; charset=utf-8')
+        try:
+            self._write_chunk(self._format_search_head(data).encode())
+            data = self._finish_search(cache_key, data, live_lookup)
+            self._write_chunk(self._format_search_live(data['live_data']).encode())
+            self._write_chunk(self._format_search_tail(data).encode())
+        except Exception as e:
+            # Headers are already out, so the error has to travel inside the page
+            print(f"Search stream error: {e}")
+            self._write_chunk(f"""
+            <div style="background: #f8d7da; border: 1px solid #f5c6cb; border-radius: 8px; padding: 20px; margin: 20px 0;">
+                <h3>❌ Search Interrupted</h3>
+                <p>Error: {html_lib.escape(str(e))}</p>
+            </div>
+            """.encode())
+        self._end_stream()
+
+    def handle_api_search(self):
+        """JSON version of /search; NDJSON when the client accepts application/x-ndjson"""
+        try:
+            query = self._start_search()
+            if 'application/x-ndjson' in self.headers.get('Accept', '') or 'format=ndjson' in self.path:
+                self._stream_search(query)
+            else:
+                self.serve_json(dict(self._get_search_data(query), success=True))
+        except ValueError as e:
+            self.serve_json({'success': False, 'error': str(e)}, status=400)
+        except Exception as e:
+            print(f"API search error: {e}")
+            self.serve_json({'success': False, 'error': str(e)}, status=500)
+
+    def _start_search(self):
+        """Read and bill the query, and bring live data up to date before answering"""
+        content_length = int(self.headers.get('Content-Length', 0))
+        post_data = self.rfile.read(content_length)
+        if 'application/json' in self.headers.get('Content-Type', ''):
+            query = str(fast_json.loads(post_data or b'{}').get('query', ''))
+        else:
+            query = urllib.parse.parse_qs(post_data.decode('utf-8')).get('query', [''])[0]
+        
+        if not query:
+            raise ValueError("No query provided")
+        
+        # Use the actual Smart Doc Analysis for search
+        print(f"Web search request: '{query}'")
+        
+        # Track billing for search query
+        if self.billing:
+            self.billing.bill_question(self.user_id, query, f"web_{int(time.time())}", success=True)
+            self._stats_changed('billing')
+        
+        # Syncing first lets a live data change invalidate cached results
+        if self.live_index is not None:
+            self._sync_live_data()
+        return query
+
+    def _get_search_data(self, query):
+        """Search results as plain data, reused for identical queries on an unchanged corpus"""
+        return self._finish_search(*self._begin_search(query))
+
+    def _begin_search(self, query):
+        """Start a search, returning (cache_key, data, live_lookup)
+
+        On a cache hit data is complete and live_lookup is None. Otherwise
+        data holds the research report and live_lookup is a future for the
+        live matches, which were looked up while the report was produced.
+        """
+        cache_key = self.search_cache.key(query) if self.search_cache else None
+        data = self.search_cache.get(cache_key) if self.search_cache else None
+        if data is not None:
+            print(f"Search cache hit: '{query}'")
+            return cache_key, data, None
+        
+        live_lookup = LIVE_LOOKUP_POOL.submit(self._search_live_matches, query)
+        try:
+            research_report = self._search_report_data(query)
+        except Exception:
+            live_lookup.cancel()
+            raise
+        return cache_key, {'query': query, 'research_report': research_report}, live_lookup
+
+    def _finish_search(self, cache_key, data, live_lookup):
+        """Wait for the live matches of a started search and cache the complete result"""
+        if live_lookup is None:
+            return data
+        data = dict(data, live_data=live_lookup.result())
+        if self.search_cache:
+            self.search_cache.put(cache_key, data, size=len(fast_json.dumps(data)))
+        return data
+
+    def _stream_search(self, query):
+        """Send the research report as soon as it is ready, then each live match, as NDJSON"""
+        self._start_stream('application/x-ndjson')
+        try:
+            cache_key, data, live_lookup = self._begin_search(query)
+            self._write_chunk(fast_json.dumps_line({'type': 'report', 'query': query, 'research_report': data['research_report']}))
+            data = self._finish_search(cache_key, data, live_lookup)
+            
+            self._write_chunk(b''.join(fast_json.dumps_line({'type': 'live_data', 'item': item}) for item in data['live_data']))
+            self._write_chunk(fast_json.dumps_line({'type': 'done', 'live_data_count': len(data['live_data'])}))
+        except Exception as e:
+            print(f"API search stream error: {e}")
+            self._write_chunk(fast_json.dumps_line({'type': 'error', 'error': str(e)}))
+        self._end_stream()
+
+    def _search_report_data(self, query):
+        """Answer the query from the best passages, returning the report as plain data or None"""
+        if self.passages is not None:
+            passages = self.passages.search(query, limit=5)
+            if passages:
+                return self._passage_report_data(passages)
+        
+        # Documents uploaded before the passage index existed are only known to the assistant
+        research_report = self.assistant.research_query(query, include_online=False, max_results=5)
+        if not (research_report and hasattr(research_report, 'main_findings') and research_report.main_findings):
+            return None
+        return {
+            'executive_summary': research_report.executive_summary,
+            'confidence_score': research_report.confidence_score,
+            'total_sources': research_report.total_sources,
+            'main_findings': [
+                {
+                    'fact_text': finding.fact_text,
+                    'confidence_level': finding.confidence_level,
+                    'citations': list(finding.citations or [])
+                }
+                for finding in research_report.main_findings
+            ]
+        }
+
+    def _passage_report_data(self, passages):
+        """Research report built from ranked passages, each cited with its offsets"""
+        documents = list(dict.fromkeys(passage['document'] for passage in passages))
+        names = ', '.join(passage_display_name(document) for document in documents)
+        return {
+            'executive_summary': f"Found {len(passages)} relevant passages in {len(documents)} "
+                                 f"document{'s' if len(documents) != 1 else ''}: {names}.",
+            'confidence_score': passages[0]['coverage'],
+            'total_sources': len(documents),
+            'main_findings': [
+                {
+                    'fact_text': passage['text'],
+                    'confidence_level': 'high' if passage['coverage'] >= 0.75 else 'medium' if passage['coverage'] >= 0.4 else 'low',
+                    'citations': [f"{passage_display_name(passage['document'])} (chars {passage['start']}-{passage['end']})"],
+                    'document': passage_display_name(passage['document']),
+                    'document_id': passage['document'],
+                    'start': passage['start'],
+                    'end': passage['end'],
+                    'score': passage['score']
+                }
+                for passage in passages
+            ]
+        }
+
+    def _search_live_matches(self, query):
+        """Live sources related to the query; live data problems never fail a search"""
+        if not self.pathway:
+            return []
+        try:
+            return self._search_live_data([query], limit=2)
+        except Exception as e:
+            print(f"Live data integration error: {e}")
+            return []
+
+    def _format_search_results(self, data):
+        """Format search result data as the HTML results panel"""
+        return self._format_search_head(data) + self._format_search_live(data['live_data']) + self._format_search_tail(data)
 
+    def _format_search_head(self, data):
+        """Opening of the results panel: summary and key findings, which need no live data"""
+        query = data['query']
+        research_report = data['research_report']
+        
+        # Format the real results in a nice HTML format
+        if research_report:
+            # Create formatted results from research report
+            results_content = f"""
+            <div style="background: white; padding: 20px; border-radius: 8px; margin: 15px 0;">
+                <h4>📊 Executive Summary</h4>
+                <p style="background: #f8f9fa; padding: 15px; border-radius: 5px; margin: 10px 0;">
+                    {html_lib.escape(research_report['executive_summary'])}
+                </p>
+                <p><strong>Confidence Score:</strong> {research_report['confidence_score']:.2f}</p>
+                <p><strong>Total Sources:</strong> {research_report['total_sources']}</p>
+            </div>
+            """
+            
+            # Add key findings
+            if research_report['main_findings']:
+                results_content += "<h4>🔍 Key Findings:</h4>"
+                for i, finding in enumerate(research_report['main_findings'][:3]):
+                    results_content += f"""
+                    <div style="background: white; padding: 15px; border-radius: 8px; margin: 10px 0; border-left: 4px solid #667eea;">
+                        <h5>📄 Finding {i+1}</h5>
+                        <p><strong>Fact:</strong> {html_lib.escape(finding['fact_text'])}</p>
+                        <p><strong>Confidence:</strong> {finding['confidence_level']}</p>
+                        <p><strong>Citations:</strong> {html_lib.escape(', '.join(finding['citations'])) if finding['citations'] else 'None'}</p>
+                    </div>
+                    """
+        else:
+            results_content = """
+            <div style="background: #fff3cd; border: 1px solid #ffeaa7; padding: 15px; border-radius: 8px;">
+                <p>🤖 <strong>AI Assistant Response:</strong></p>
+                <p>I understand your query: "{query}"</p>
+                <p>However, no uploaded documents were found to search through. Please upload some documents first, or I can provide a general response based on my knowledge.</p>
+                <p><strong>General AI Response:</strong></p>
+                <div style="background: #f8f9fa; padding: 10px; border-radius: 5px; margin: 10px 0;">
+                    Based on your query, here's what I can tell you: This appears to be a request for information. To provide the most accurate and relevant response, I would need access to specific documents or data sources. Please upload relevant documents and try your search again.
+                </div>
+            </div>
+            """
+        
+        return f"""
+        <div style="background: #cce7ff; border: 1px solid #b3d9ff; border-radius: 8px; padding: 25px; margin: 20px 0;">
+            <h3>🔍 Smart Search Results for: "{query}"</h3>
+            <div style="margin: 15px 0;">
+                <p><strong>✅ Smart Doc Analysis AI Analysis Complete!</strong></p>
+                <p>🧠 Query processed using advanced natural language understanding</p>
+                <p>⚡ Real-time search powered by Smart Doc Analysis + Live Data</p>
+            </div>
+            
+            {results_content}
+            """
+
+    def _format_search_live(self, live_results):
+        """Related live data box of the results panel"""
+        # Show related live data to highlight data refresh capabilities
+        live_data_context = ""
+        if live_results:
+            live_data_context = f"""
+            <div style="background: #e8f5e8; border: 1px solid #4caf50; border-radius: 8px; padding: 15px; margin: 15px 0;">
+                <h4>🔄 Live Data Integration</h4>
+                <p><strong>⚡ Fresh Updates:</strong> Found {len(live_results)} related live sources that update your answer:</p>
+                <ul style="margin: 10px 0 10px 20px; line-height: 1.6;">
+                    {''.join([f'<li><strong>{item["title"][:60]}...</strong> - {item["source_type"].upper()} ({item["relevance_score"]:.2f} relevance)</li>' for item in live_results])}
+                </ul>
+                <p style="font-size: 0.9em; color: #4caf50; margin-top: 10px;">
+                    🔄 <strong>Answer Freshness:</strong> This response incorporates live data updated within the last 24 hours. 
+                    Answers automatically refresh as new information becomes available.
+                </p>
+            </div>
+            """
+        return f"""
+            {live_data_context}
+            """
+
+    def _format_search_tail(self, data):
+        """Processing details that close the results panel"""
+        query = data['query']
+        return f"""
+            <div style="background: #f8f9fa; padding: 15px; border-radius: 8px; margin: 15px 0;">
+                <h4>📊 Processing Details:</h4>
+                <p><strong>Query:</strong> "{query}"</p>
+                <p><strong>Processing Method:</strong> Smart Doc Analysis AI</p>
+                <p><strong>Search Type:</strong> Semantic search with AI analysis + Live Data Integration</p>
+                <p><strong>💰 Flexprice Billing:</strong> $0.10 charged for this question</p>
+                <p><strong>🔄 Data Freshness:</strong> Includes live sources updated every 30 seconds</p>
+            </div>
+            
+            <div style="text-align: center; margin-top: 20px;">
+                <p style="color: #667eea; font-weight: bold;">✨ Powered by Smart Doc Analysis AI + Pathway Live Data ✨</p>
+            </div>
+        </div>
+        """
+    
     def _analyze_query_type(self, query):
         """Analyze the type of query for better responses"""
         query_lower = query.lower()
@@ -851,62 +1762,69 @@ class WebHandler(BaseHTTPRequestHandler):
     
     def serve_billing_stats(self):
         """Serve billing statistics as JSON"""
-        try:
-            if self.billing:
-                stats = self.billing.get_usage_summary("demo_user")
-                self.serve_json(stats)
-            else:
-                # Default demo stats
-                self.serve_json({
-                    'credits_balance': 10.0,
-                    'questions_asked': 0,
-                    'reports_generated': 0,
-                    'total_spent': 0.0
-                })
-        except Exception as e:
-            print(f"Billing stats error: {e}")
-            self.serve_json({
-                'credits_balance': 10.0,
-                'questions_asked': 0,
-                'reports_generated': 0,
-                'total_spent': 0.0
-            })
+        self.serve_json(billing_stats(self.billing, self.user_id))
+    
+    def serve_usage_stats(self):
+        """Serve precomputed usage statistics (per day, peak hours, common terms) as JSON"""
+        if not self.billing:
+            self.serve_json({'success': False, 'message': 'Billing is not available'}, status=404)
+            return
+        self.serve_json(self.billing.get_usage_stats(
+            self.user_id,
+            peak_hours_count=get_setting(self.config, 'usage_tracking.statistics.peak_hours_count', 3),
+            common_terms_count=get_setting(self.config, 'usage_tracking.statistics.common_terms_count', 5)
+        ))
     
     def serve_pathway_stats(self):
         """Serve pathway integration statistics as JSON"""
+        self.serve_json(pathway_stats(self.pathway, self.live_index, self.live_store, self.dedup, self.live_ingestion))
+    
+    def serve_events(self):
+        """Stream billing and Pathway stats as server-sent events when they change"""
+        if not self.events:
+            self.send_error(404, "Not Found")
+            return
+        self.send_response(200)
+        self.send_header('Content-type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.flush()
+        # The broadcaster owns the socket from here, freeing this worker thread
+        self.server.detach_request(self.request)
+        self.events.add_stream(self.request, self._stats_topics())
+    
+    def serve_events_poll(self):
+        """Long-poll fallback for /events: answers once stats move past ?since=<version>"""
+        if not self.events:
+            self.send_error(404, "Not Found")
+            return
+        params = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
         try:
-            if self.pathway:
-                stats = self.pathway.get_pathway_stats()
-                self.serve_json(stats)
-            else:
-                # Default demo stats
-                self.serve_json({
-                    'total_sources': 3,
-                    'recent_activity': {
-                        'sources_last_24h': 2
-                    },
-                    'last_update': '2024-09-22T08:00:00Z'
-                })
-        except Exception as e:
-            print(f"Pathway stats error: {e}")
-            self.serve_json({
-                'total_sources': 3,
-                'recent_activity': {
-                    'sources_last_24h': 2
-                },
-                'last_update': '2024-09-22T08:00:00Z'
-            })
+            since = int(params.get('since', ['0'])[0])
+        except ValueError:
+            since = 0
+        self.server.detach_request(self.request)
+        self.events.add_waiter(self.request, since, self._stats_topics())
+    
+    def _stats_topics(self):
+        return [f'billing:{self.user_id}', 'pathway']
+    
+    def _stats_changed(self, topic):
+        if self.events:
+            # Billing stats are per user
+            self.events.notify(f'billing:{self.user_id}' if topic == 'billing' else topic)
     
     def handle_add_credits(self):
         """Handle adding credits to user account"""
         try:
             if self.billing:
-                self.billing.add_credits("demo_user", 5.0, "Web interface credit addition")
-                user = self.billing.get_or_create_user("demo_user")
+                self.billing.add_credits(self.user_id, 5.0, "Web interface credit addition")
+                self._stats_changed('billing')
+                summary = self.billing.get_usage_summary(self.user_id)
                 self.serve_json({
                     'success': True,
                     'message': 'Credits added successfully',
-                    'new_balance': user.credits_balance
+                    'new_balance': summary['credits_balance']
                 })
             else:
                 self.serve_json({
@@ -921,15 +1839,18 @@ class WebHandler(BaseHTTPRequestHandler):
             })
     
     def handle_refresh_pathway(self):
-        """Handle pathway live data refresh"""
+        """Start a live data refresh in the background, or join the one already running"""
         try:
             if self.pathway:
-                # For now, just trigger an update cycle
-                self.pathway._update_cycle()
+                cycle, joined = self.refresher.start(self._run_refresh_cycle)
                 self.serve_json({
                     'success': True,
-                    'message': 'Live data refresh initiated'
-                })
+                    'cycle_id': cycle.cycle_id,
+                    'joined': joined,
+                    'status': cycle.status,
+                    'status_url': f'/refresh-pathway/{cycle.cycle_id}',
+                    'message': 'Joined the live data refresh in progress' if joined else 'Live data refresh initiated'
+                }, status=202)
             else:
                 self.serve_json({
                     'success': True,
@@ -941,50 +1862,31 @@ class WebHandler(BaseHTTPRequestHandler):
                 'message': f'Failed to refresh live data: {str(e)}'
             })
     
-    def _analyze_document(self, doc, filename):
-        """Generate comprehensive document analysis"""
+    def _run_refresh_cycle(self, cycle):
+        """One Pathway update cycle, run on the refresh thread; returns what it ingested"""
+        # Searches skip their import while the cycle holds the lock, so the sources
+        # this update fetched are appended, and counted, by the cycle's own import
+        with self.live_store.import_lock:
+            self.pathway._update_cycle()
+            new_sources = self.live_store.import_legacy_changes()
+        self._stats_changed('pathway')
+        if self.live_index is not None:
+            self._sync_live_data()
+        return {'new_sources': new_sources, 'total_sources': len(self.live_store.sources)}
+    
+    def serve_refresh_status(self, cycle_id):
+        """Serve the state of a refresh cycle; 'status' names the most recent one"""
+        cycle = self.refresher.latest() if cycle_id == 'status' else self.refresher.get(cycle_id)
+        if not cycle:
+            self.serve_json({'success': False, 'message': f'Unknown refresh cycle: {cycle_id}'}, status=404)
+            return
+        self.serve_json(cycle.to_dict())
+    
+    def _analyze_document(self, doc, filename, document_id=None):
+        """Generate comprehensive document analysis as (html, data); document_id is its passage index key"""
         try:
-            # Extract key information from document
-            content_preview = doc.full_text[:1000] + "..." if len(doc.full_text) > 1000 else doc.full_text
-            
-            # Generate AI-powered summary
-            summary = self._generate_document_summary(doc.full_text)
-            key_topics = self._extract_key_topics(doc.full_text)
-            insights = self._generate_document_insights(doc.full_text, filename)
-            
-            analysis_html = f"""
-            <div style="background: white; border-radius: 10px; padding: 25px; margin: 20px 0; box-shadow: 0 2px 10px rgba(0,0,0,0.1);">
-                <h3>📊 Document Analysis Summary</h3>
-                
-                <div style="background: #f8f9fa; padding: 20px; border-radius: 8px; margin: 15px 0;">
-                    <h4>📝 Executive Summary</h4>
-                    <p style="line-height: 1.6;">{summary}</p>
-                </div>
-                
-                <div style="background: #e3f2fd; padding: 20px; border-radius: 8px; margin: 15px 0;">
-                    <h4>🎯 Key Topics Identified</h4>
-                    <div style="display: flex; flex-wrap: wrap; gap: 10px; margin-top: 10px;">
-                        {self._format_topic_tags(key_topics)}
-                    </div>
-                </div>
-                
-                <div style="background: #f3e5f5; padding: 20px; border-radius: 8px; margin: 15px 0;">
-                    <h4>🔍 AI Insights</h4>
-                    <ul style="line-height: 1.8; margin: 10px 0 10px 20px;">
-                        {insights}
-                    </ul>
-                </div>
-                
-                <div style="background: #e8f5e8; padding: 20px; border-radius: 8px; margin: 15px 0;">
-                    <h4>📄 Content Preview</h4>
-                    <div style="background: white; padding: 15px; border-radius: 5px; font-family: monospace; font-size: 0.9em; max-height: 200px; overflow-y: auto;">
-                        {content_preview}
-                    </div>
-                </div>
-            </div>
-            """
-            
-            return analysis_html
+            data = self._document_analysis_data(doc, filename, document_id or filename)
+            return self._format_document_analysis(data), data
             
         except Exception as e:
             return f"""
@@ -993,80 +1895,114 @@ class WebHandler(BaseHTTPRequestHandler):
                 <p>Could not complete full analysis: {str(e)}</p>
                 <p>Document was processed but advanced analysis features encountered an issue.</p>
             </div>
+            """, {'error': str(e)}
+    
+    def _document_analysis_data(self, doc, filename, document_id):
+        """Summary, topics, insights and statistics of a document as plain data"""
+        # Tokenize once; summary, topics and insights all read the same analysis
+        analysis = analyze_text(doc.full_text)
+        return {
+            'summary': self._generate_document_summary(analysis),
+            'topics': self._extract_key_topics(analysis),
+            'insights': self._generate_document_insights(analysis, filename),
+            'content_preview': doc.full_text[:1000] + "..." if len(doc.full_text) > 1000 else doc.full_text,
+            'statistics': analysis.to_dict(),
+            'key_passages': self._key_passages(document_id)
+        }
+    
+    def _key_passages(self, document_id, count=3):
+        """The passages that best represent a document, with their character offsets"""
+        if self.passages is None:
+            return []
+        keywords = self.passages.document_keywords(document_id)
+        return [
+            {'start': passage['start'], 'end': passage['end'], 'text': passage['text']}
+            for passage in self.passages.search(keywords, limit=count, document=document_id)
+        ]
+    
+    def _format_document_analysis(self, data):
+        """Format document analysis data as HTML"""
+        insights = '\n'.join(f"<li>{insight}</li>" for insight in data['insights'])
+        return f"""
+        <div style="background: white; border-radius: 10px; padding: 25px; margin: 20px 0; box-shadow: 0 2px 10px rgba(0,0,0,0.1);">
+            <h3>📊 Document Analysis Summary</h3>
+            
+            <div style="background: #f8f9fa; padding: 20px; border-radius: 8px; margin: 15px 0;">
+                <h4>📝 Executive Summary</h4>
+                <p style="line-height: 1.6;">{data['summary']}</p>
+            </div>
+            
+            <div style="background: #e3f2fd; padding: 20px; border-radius: 8px; margin: 15px 0;">
+                <h4>🎯 Key Topics Identified</h4>
+                <div style="display: flex; flex-wrap: wrap; gap: 10px; margin-top: 10px;">
+                    {self._format_topic_tags(data['topics'])}
+                </div>
+            </div>
+            
+            <div style="background: #f3e5f5; padding: 20px; border-radius: 8px; margin: 15px 0;">
+                <h4>🔍 AI Insights</h4>
+                <ul style="line-height: 1.8; margin: 10px 0 10px 20px;">
+                    {insights}
+                </ul>
+            </div>
+            
+            {self._format_key_passages(data.get('key_passages'))}
+            
+            <div style="background: #e8f5e8; padding: 20px; border-radius: 8px; margin: 15px 0;">
+                <h4>📄 Content Preview</h4>
+                <div style="background: white; padding: 15px; border-radius: 5px; font-family: monospace; font-size: 0.9em; max-height: 200px; overflow-y: auto;">
+                    {data['content_preview']}
+                </div>
+            </div>
+        </div>
+        """
+    
+    def _add_key_passages(self, entries):
+        """Attach each batch document's most representative passage, scoring all documents together"""
+        if self.passages is None:
+            return
+        names = [entry['document_id'] for entry in entries]
+        queries = [self.passages.document_keywords(name) for name in names]
+        for entry, passages in zip(entries, self.passages.search_many(queries, limit=1, documents=names)):
+            entry['key_passage'] = {'start': passages[0]['start'], 'end': passages[0]['end']} if passages else None
+    
+    def _format_key_passages(self, passages):
+        """Format a document's key passages as HTML"""
+        if not passages:
+            return ""
+        items = ''.join(
+            f"""<li style="margin: 10px 0;"><span style="color: #666; font-size: 0.85em;">chars {passage['start']}-{passage['end']}</span><br>{html_lib.escape(passage['text'])}</li>"""
+            for passage in passages
+        )
+        return f"""
+            <div style="background: #fff8e1; padding: 20px; border-radius: 8px; margin: 15px 0;">
+                <h4>📌 Key Passages</h4>
+                <ul style="line-height: 1.6; margin: 10px 0 10px 20px;">
+                    {items}
+                </ul>
+            </div>
             """
     
-    def _generate_document_summary(self, content):
+    def _generate_document_summary(self, analysis):
         """Generate AI summary of document content"""
         # Simple keyword and structure-based summary
-        sentences = content.split('. ')[:5]  # First 5 sentences
-        words = content.lower().split()
-        word_count = len(words)
-        
-        # Identify document type based on content patterns
-        doc_type = "document"
-        if any(word in content.lower() for word in ['research', 'study', 'methodology', 'results']):
-            doc_type = "research document"
-        elif any(word in content.lower() for word in ['tutorial', 'guide', 'how to', 'steps']):
-            doc_type = "instructional guide"
-        elif any(word in content.lower() for word in ['report', 'analysis', 'findings', 'conclusion']):
-            doc_type = "analytical report"
-        
-        summary = f"This {doc_type} contains {word_count} words and appears to focus on "
+        summary = f"This {analysis.document_type} contains {analysis.word_count} words and appears to focus on "
         
         # Extract main themes
-        themes = []
-        if 'technology' in content.lower() or 'ai' in content.lower() or 'machine learning' in content.lower():
-            themes.append("technology and artificial intelligence")
-        if 'business' in content.lower() or 'market' in content.lower() or 'strategy' in content.lower():
-            themes.append("business strategy and market analysis")
-        if 'data' in content.lower() or 'analysis' in content.lower():
-            themes.append("data analysis and insights")
-        if 'health' in content.lower() or 'medical' in content.lower():
-            themes.append("healthcare and medical research")
-        
+        themes = analysis.themes
         if themes:
             summary += ", ".join(themes) + ". "
         else:
             summary += "various topics of interest. "
         
-        summary += f"The content provides detailed information and appears to be well-structured with key insights distributed throughout the {len(sentences)} main sections."
+        summary += f"The content provides detailed information and appears to be well-structured with key insights distributed throughout the {analysis.section_count} main sections."
         
         return summary
     
-    def _extract_key_topics(self, content):
+    def _extract_key_topics(self, analysis):
         """Extract key topics from document content"""
-        content_lower = content.lower()
-        
-        # Predefined topic categories with keywords
-        topics = {
-            'Artificial Intelligence': ['ai', 'artificial intelligence', 'machine learning', 'neural network', 'deep learning'],
-            'Data Science': ['data science', 'analytics', 'statistics', 'big data', 'data analysis'],
-            'Technology': ['technology', 'software', 'hardware', 'innovation', 'digital'],
-            'Business': ['business', 'strategy', 'market', 'revenue', 'profit', 'management'],
-            'Research': ['research', 'study', 'methodology', 'findings', 'analysis'],
-            'Healthcare': ['health', 'medical', 'patient', 'treatment', 'clinical'],
-            'Education': ['education', 'learning', 'teaching', 'training', 'knowledge'],
-            'Finance': ['finance', 'financial', 'investment', 'banking', 'economic']
-        }
-        
-        found_topics = []
-        for topic, keywords in topics.items():
-            if any(keyword in content_lower for keyword in keywords):
-                found_topics.append(topic)
-        
-        # If no predefined topics found, extract based on frequency
-        if not found_topics:
-            words = content_lower.split()
-            word_freq = {}
-            for word in words:
-                if len(word) > 4 and word.isalpha():  # Only meaningful words
-                    word_freq[word] = word_freq.get(word, 0) + 1
-            
-            # Get top 3 most frequent meaningful words
-            top_words = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)[:3]
-            found_topics = [word.title() for word, freq in top_words if freq > 2]
-        
-        return found_topics[:5]  # Return max 5 topics
+        # Predefined topic categories, falling back to the most frequent words
+        return analysis.topics
     
     def _format_topic_tags(self, topics):
         """Format topics as HTML tags"""
@@ -1083,83 +2019,115 @@ class WebHandler(BaseHTTPRequestHandler):
         
         return tags_html
     
-    def _generate_document_insights(self, content, filename):
+    def _generate_document_insights(self, analysis, filename):
         """Generate AI insights about the document"""
         insights = []
-        content_lower = content.lower()
         
         # Content analysis insights
-        if len(content) > 5000:
-            insights.append("<li>This is a comprehensive document with substantial content that provides in-depth coverage of the topic.</li>")
-        elif len(content) < 1000:
-            insights.append("<li>This is a concise document that delivers key information efficiently.</li>")
+        if analysis.char_count > 5000:
+            insights.append("This is a comprehensive document with substantial content that provides in-depth coverage of the topic.")
+        elif analysis.char_count < 1000:
+            insights.append("This is a concise document that delivers key information efficiently.")
         
         # Structure insights
-        if content.count('\n\n') > 10:
-            insights.append("<li>Well-structured document with clear section breaks and organized information flow.</li>")
+        if analysis.paragraph_breaks > 10:
+            insights.append("Well-structured document with clear section breaks and organized information flow.")
         
         # Technical content insights
-        if any(term in content_lower for term in ['algorithm', 'method', 'process', 'system']):
-            insights.append("<li>Contains technical or methodological content that may require domain expertise to fully understand.</li>")
+        if analysis.has('insight:technical'):
+            insights.append("Contains technical or methodological content that may require domain expertise to fully understand.")
         
         # Data/numbers insights
-        import re
-        numbers = re.findall(r'\d+(?:\.\d+)?%?', content)
-        if len(numbers) > 10:
-            insights.append("<li>Rich in quantitative data and metrics, suitable for analytical review and data extraction.</li>")
+        if analysis.number_count > 10:
+            insights.append("Rich in quantitative data and metrics, suitable for analytical review and data extraction.")
         
         # Reference insights
-        if any(term in content_lower for term in ['reference', 'citation', 'bibliography', 'source']):
-            insights.append("<li>Contains references or citations, indicating academic or research-oriented content.</li>")
+        if analysis.has('insight:references'):
+            insights.append("Contains references or citations, indicating academic or research-oriented content.")
         
         # Actionable content insights
-        if any(term in content_lower for term in ['recommend', 'suggest', 'should', 'action', 'implement']):
-            insights.append("<li>Includes actionable recommendations or suggestions that can be implemented.</li>")
+        if analysis.has('insight:actionable'):
+            insights.append("Includes actionable recommendations or suggestions that can be implemented.")
         
         # File type insights
         if filename.lower().endswith('.pdf'):
-            insights.append("<li>PDF format suggests this is a formal document, possibly for distribution or archival purposes.</li>")
+            insights.append("PDF format suggests this is a formal document, possibly for distribution or archival purposes.")
         elif filename.lower().endswith('.docx'):
-            insights.append("<li>Word document format indicates this may be an editable working document or draft.</li>")
+            insights.append("Word document format indicates this may be an editable working document or draft.")
         
         if not insights:
-            insights.append("<li>Document contains valuable information suitable for knowledge extraction and analysis.</li>")
-            insights.append("<li>Content appears to be well-organized and suitable for further research or reference.</li>")
+            insights.append("Document contains valuable information suitable for knowledge extraction and analysis.")
+            insights.append("Content appears to be well-organized and suitable for further research or reference.")
         
-        return '\n'.join(insights)
+        return insights
     
-    def _get_related_live_data(self, content_sample):
-        """Get related live data from Pathway integration"""
+    def _get_related_live_data(self, keywords):
+        """Get live data related to a document's keywords from Pathway integration"""
         try:
             if not self.pathway:
                 return []
             
-            # Extract keywords from content sample
-            words = content_sample.lower().split()
-            keywords = [word for word in words if len(word) > 4 and word.isalpha()][:10]
-            
-            # Search for related live data using each keyword
-            all_results = []
-            for keyword in keywords[:3]:  # Limit to top 3 keywords to avoid too many queries
-                results = self.pathway.search_live_data(keyword, limit=2)
-                all_results.extend(results)
-            
-            # Remove duplicates and limit results
-            seen_ids = set()
-            unique_results = []
-            for result in all_results:
-                if result['source_id'] not in seen_ids:
-                    seen_ids.add(result['source_id'])
-                    unique_results.append(result)
-                    if len(unique_results) >= 5:
-                        break
-            
-            return unique_results
+            # One ranked lookup across all keywords
+            return self._search_live_data(keywords[:10], limit=5)
             
         except Exception as e:
             print(f"Error getting related live data: {e}")
             return []
     
+    def _document_keywords(self, document_id, text):
+        """Terms that characterise a whole document, for matching live data"""
+        if self.passages is not None:
+            keywords = self.passages.document_keywords(document_id)
+            if keywords:
+                return keywords
+        from passage_index import top_terms
+        return top_terms(text, self._stop_words())
+    
+    def _index_passages(self, document_id, text):
+        """Add a document to the passage index; indexing problems never fail an upload"""
+        if self.passages is None:
+            return
+        try:
+            self.passages.add_document(document_id, text)
+        except Exception as e:
+            print(f"Passage indexing failed for {passage_display_name(document_id)}: {e}")
+    
+    def _stop_words(self):
+        return get_setting(self.config, 'search.stop_words', [])
+    
+    def _search_live_data(self, keywords, limit=5):
+        """Search live sources for several keywords in one call"""
+        if self.live_index is not None:
+            self._sync_live_data()
+            if len(self.live_index):
+                return self.live_index.search(keywords, limit=limit)
+        
+        # Fall back to per-keyword scans when the live store isn't indexed
+        seen_ids = set()
+        unique_results = []
+        for keyword in keywords[:3]:  # Limit to top 3 keywords to avoid too many queries
+            for result in self.pathway.search_live_data(keyword, limit=2):
+                if result['source_id'] not in seen_ids:
+                    seen_ids.add(result['source_id'])
+                    unique_results.append(result)
+        return unique_results[:limit]
+    
+    def _sync_live_data(self):
+        """Bring the live store and index up to date with Pathway's latest cycle"""
+        # Both steps are cheap when nothing changed: a stat() and a cursor check.
+        # A refresh cycle importing right now is not waited for; it syncs afterwards
+        self.live_store.import_legacy_changes(wait=False)
+        changed = self.live_index.sync_from_store(self.live_store)
+        if changed:
+            self._corpus_changed()
+            self._stats_changed('pathway')
+        return changed
+    
+    def _corpus_changed(self):
+        """Drop cached search results once documents or live sources change"""
+        if self.search_cache:
+            self.search_cache.bump_version()
+    
     def _format_live_data_section(self, live_data):
         """Format related live data as HTML section"""
         if not live_data:
@@ -1173,116 +2141,457 @@ class WebHandler(BaseHTTPRequestHandler):
             </div>
             """
         
-        live_data_html = """
-        <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; border-radius: 10px; padding: 25px; margin: 20px 0;">
-            <h3 style="color: white; margin-bottom: 20px;">🌐 Related Live Data & Latest News</h3>
-        """
-        
+        # Live items come from external feeds, so every field is escaped
+        parts = [LIVE_DATA_HEADER]
         for i, item in enumerate(live_data):
-            bg_color = "rgba(255,255,255,0.1)" if i % 2 == 0 else "rgba(255,255,255,0.05)"
-            
-            # Format timestamp
-            from datetime import datetime
             try:
                 pub_time = datetime.fromisoformat(item['published_at'].replace('Z', '+00:00'))
                 time_str = pub_time.strftime("%Y-%m-%d %H:%M")
             except:
                 time_str = "Recent"
             
-            live_data_html += f"""
-            <div style="background: {bg_color}; padding: 20px; border-radius: 8px; margin: 15px 0; border-left: 4px solid #fff;">
-                <div style="display: flex; justify-content: space-between; align-items: flex-start; margin-bottom: 10px;">
-                    <h4 style="color: #fff; margin: 0; flex: 1;">{item['title']}</h4>
-                    <span style="background: rgba(255,255,255,0.2); color: white; padding: 4px 8px; border-radius: 12px; font-size: 0.8em; margin-left: 15px;">
-                        {item['source_type'].upper()}
-                    </span>
-                </div>
-                
-                <p style="color: #e0e0e0; line-height: 1.6; margin: 10px 0;">{item['context']}</p>
-                
-                <div style="display: flex; justify-content: space-between; align-items: center; margin-top: 15px;">
-                    <div style="display: flex; gap: 15px; font-size: 0.9em; color: #b0b0b0;">
-                        <span>📝 {item['author']}</span>
-                        <span>🕰️ {time_str}</span>
-                        <span>⭐ Score: {item['relevance_score']:.2f}</span>
-                    </div>
-                    <a href="{item['url']}" target="_blank" style="color: #fff; text-decoration: none; background: rgba(255,255,255,0.2); padding: 6px 12px; border-radius: 15px; font-size: 0.9em;">
-                        🔗 View Source
-                    </a>
-                </div>
-            </div>
-            """
-        
-        live_data_html += """
-            <div style="text-align: center; margin-top: 20px; padding: 15px; background: rgba(255,255,255,0.1); border-radius: 8px;">
-                <p style="margin: 0; font-size: 0.95em; color: #e0e0e0;">
-                    ✨ Live data continuously updated from news sources and industry blogs ✨
-                </p>
-            </div>
-        </div>
-        """
-        
-        return live_data_html
+            parts.extend((
+                LIVE_DATA_CARD_OPEN[i % 2], html_lib.escape(item['title']),
+                LIVE_DATA_CARD_TYPE, html_lib.escape(item['source_type'].upper()),
+                LIVE_DATA_CARD_CONTEXT, html_lib.escape(item['context']),
+                LIVE_DATA_CARD_AUTHOR, html_lib.escape(str(item['author'])),
+                LIVE_DATA_CARD_TIME, time_str,
+                LIVE_DATA_CARD_SCORE, f"{item['relevance_score']:.2f}",
+                LIVE_DATA_CARD_URL, html_lib.escape(item['url'], quote=True),
+                LIVE_DATA_CARD_CLOSE
+            ))
+        parts.append(LIVE_DATA_FOOTER)
+        return ''.join(parts)
+
+    def serve_health(self):
+        """Serve server health including worker pool utilisation and startup phases"""
+        health = {"status": "running", "message": "Smart Doc Analysis Web Interface"}
+        if self.startup is not None:
+            health['status'] = self.startup.status
+            health['startup'] = self.startup.get_stats()
+        if hasattr(self.server, 'get_pool_stats'):
+            health['server_pool'] = self.server.get_pool_stats()
+        if self.jobs:
+            health['ingestion'] = self.jobs.get_stats()
+        if self.admission:
+            health['admission'] = self.admission.get_stats()
+        if self.passages is not None:
+            health['passage_index'] = self.passages.get_stats()
+        # Readiness probes see 503 until startup has finished
+        self.serve_json(health, 200 if health['status'] == 'running' else 503)
+
+    def serve_job_status(self, job_id, include_html=True):
+        """Serve progress and, once finished, the result of an ingestion job"""
+        # Other callers' jobs are answered as unknown
+        job = self.jobs.get(job_id, self.principal)
+        if not job:
+            self.serve_json({'success': False, 'message': f'Unknown job: {job_id}'}, status=404)
+            return
+        status = job.to_dict()
+        if not include_html:
+            status.pop('result_html', None)
+        self.serve_json(status)
+
+    def serve_json(self, data, status=200):
+        self._send_body(fast_json.dumps(data), 'application/json', status)
 
-    def serve_json(self, data):
+    def send_html(self, html, status=200):
+        self._send_body(html.encode(), 'text/html', status)
+
+    def _send_body(self, body, content_type, status=200):
+        """Send a dynamic response, gzipped when the client accepts it"""
+        encoding, body = compress_dynamic(body, self.headers.get('Accept-Encoding'))
+        self.send_response(status)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+            self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_stream(self, content_type):
+        """Begin a response written in pieces: chunked for HTTP/1.1 clients, close-delimited otherwise"""
+        self._chunked = self.request_version == 'HTTP/1.1'
+        if self._chunked:
+            self.protocol_version = 'HTTP/1.1'
         self.send_response(200)
-        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-type', content_type)
+        self.send_header('Cache-Control', 'no-store')
+        if self._chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Connection', 'close')
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+
+    def _write_chunk(self, data):
+        if not data:
+            return
+        if self._chunked:
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        else:
+            self.wfile.write(data)
+        self.wfile.flush()
+
+    def _end_stream(self):
+        if self._chunked:
+            self.wfile.write(b'0\r\n\r\n')
+
+    def serve_static(self, asset):
+        """Serve a pre-rendered asset, answering revalidation with 304 Not Modified"""
+        if asset.matches(self.headers.get('If-None-Match')):
+            self.send_response(304)
+            self.send_header('ETag', asset.etag)
+            self.send_header('Cache-Control', asset.cache_control)
+            self.end_headers()
+            return
+        
+        encoding, body = asset.select(self.headers.get('Accept-Encoding'))
+        self.send_response(200)
+        self.send_header('Content-type', asset.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', asset.etag)
+        self.send_header('Cache-Control', asset.cache_control)
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+        self.wfile.write(body)
 
     def log_message(self, format, *args):
         # Suppress default logging for cleaner output
         pass
 
-def run_web_server():
+def billing_stats(billing, user_id="demo_user"):
+    """Billing summary for the dashboard, with demo values when billing is unavailable"""
+    demo_stats = {
+        'credits_balance': 10.0,
+        'questions_asked': 0,
+        'reports_generated': 0,
+        'total_spent': 0.0
+    }
     try:
-        # Initialize the smart assistant
-        print("🚀 Starting Smart Doc Analysis Web Interface...")
-        print("=" * 70)
+        if billing:
+            return billing.get_usage_summary(user_id)
+        # Default demo stats
+        return demo_stats
+    except Exception as e:
+        print(f"Billing stats error: {e}")
+        return demo_stats
+
+
+def pathway_stats(pathway, live_index=None, live_store=None, dedup=None, live_ingestion=None):
+    """Pathway integration statistics, with demo values when Pathway is unavailable"""
+    demo_stats = {
+        'total_sources': 3,
+        'recent_activity': {
+            'sources_last_24h': 2
+        },
+        'last_update': '2024-09-22T08:00:00Z'
+    }
+    try:
+        if pathway:
+            stats = pathway.get_pathway_stats()
+            if live_index is not None:
+                stats['live_index'] = live_index.get_stats()
+                stats['live_store'] = live_store.get_stats()
+            if dedup is not None:
+                stats['dedup'] = dedup.get_stats()
+            if live_ingestion is not None:
+                stats['live_ingestion'] = live_ingestion.get_stats()
+            return stats
+        # Default demo stats
+        return demo_stats
+    except Exception as e:
+        print(f"Pathway stats error: {e}")
+        return demo_stats
+
+
+def create_assistant():
+    """Import and create the research assistant; its module brings in the PDF/DOCX extractors"""
+    from smart_research_assistant import SmartResearchAssistant
+    assistant = SmartResearchAssistant('./web_data')
+    print("✅ Smart Doc Analysis initialized")
+    return assistant
+
+
+def build_services(config, startup):
+    """Create the shared systems behind the request handlers, one startup phase at a time
+
+    Returns the handler keyword arguments. Runs on a background thread
+    while the server already listens, so heavy imports happen here.
+    """
+    # Shared systems are wrapped so concurrent request threads take turns;
+    # searches only read the assistant's index and may run side by side.
+    # Uploads are extracted by batch_extract, which imports each file type's
+    # extractor when it first sees one, so the assistant is only created by
+    # the first upload or the first search the passage index cannot answer
+    assistant = SynchronizedProxy(factory=create_assistant, read_methods=('research_query',))
+    
+    with startup.phase('billing'):
+        from flexprice_billing import FlexpriceIntegration
+        # Billing calls are buffered and applied in fsynced batches off the request path,
+        # and folded into usage rollups as they arrive
+        flexprice = SynchronizedProxy(FlexpriceIntegration('./web_data/billing'))
+        usage_rollups = UsageRollups(
+            flexprice.get_usage_summary,
+            period_days=get_setting(config, 'usage_tracking.statistics.default_period_days', 30),
+            terms_capacity=get_setting(config, 'usage_tracking.statistics.terms_sketch_size', 100),
+            stop_words=get_setting(config, 'search.stop_words', [])
+        )
+        billing_system = BillingLedger(
+            flexprice,
+            './web_data/billing_ledger',
+            flush_interval_seconds=get_setting(config, 'performance.billing_ledger.flush_interval_seconds', 1.0),
+            flush_batch_size=get_setting(config, 'performance.billing_ledger.flush_batch_size', 200),
+            rollups=usage_rollups,
+            max_attempts=get_setting(config, 'performance.billing_ledger.max_attempts', 5)
+        )
+        billing_system.start()
+        atexit.register(billing_system.close)
+        print("✅ Flexprice billing system initialized (write-behind ledger)")
+    
+    with startup.phase('pathway'):
+        from pathway_integration import PathwayIntegration
+        pathway_system = SynchronizedProxy(PathwayIntegration('./web_data/pathway'))
+        # Configured feeds replace Pathway's own polling loop when live ingestion is enabled
+        feed_ingestion = get_setting(config, 'online.live_ingestion.enabled', False)
+        if not feed_ingestion:
+            pathway_system.start_live_ingestion()
+        print("✅ Pathway live data integration initialized")
+    
+    with startup.phase('live_data'):
+        # Digest index shared by uploads and live ingestion
+        dedup_index = None
+        if get_setting(config, 'document_processing.duplicate_detection.enabled', True):
+            dedup_index = DedupIndex(
+                './web_data/dedup',
+                hash_algorithm=get_setting(config, 'document_processing.duplicate_detection.hash_algorithm', 'md5'),
+                near_duplicates=get_setting(config, 'document_processing.duplicate_detection.near_duplicates', False),
+                max_distance=get_setting(config, 'document_processing.duplicate_detection.max_hamming_distance', 3)
+            )
         
-        assistant = SmartResearchAssistant('./web_data')
-        print("✅ Smart Doc Analysis initialized")
+        # Append-only live store; opening it reads nothing until first use
+        live_store = LiveSourceStore(
+            './web_data/pathway/store',
+            segment_max_bytes=get_setting(config, 'storage.live_store.segment_max_mb', 4) * 1024 * 1024,
+            compact_ratio=get_setting(config, 'storage.live_store.compact_ratio', 0.5),
+            legacy_sources_path='./web_data/pathway/live_data_sources.json',
+            legacy_updates_path='./web_data/pathway/pathway_updates.json',
+            dedup=dedup_index
+        )
         
-        # Initialize billing system
-        billing_system = FlexpriceIntegration('./web_data/billing')
-        print("✅ Flexprice billing system initialized")
+        # Inverted index over live sources, built lazily from the store on first lookup
+        live_index = LiveDataIndex(
+            stop_words=get_setting(config, 'search.stop_words', []),
+            relevance_weight=get_setting(config, 'search.live_index.relevance_weight', 0.3),
+            context_length=get_setting(config, 'search.behavior.context_length', 100)
+        )
+        print("✅ Live data store opened (index builds on first lookup)")
+    
+    with startup.phase('passage_index'):
+        # Uploaded documents are searched passage by passage; the on-disk index opens on first use
+        passage_index = None
+        if get_setting(config, 'search.passages.enabled', True):
+            from passage_index import PassageIndex
+            passage_index = PassageIndex(
+                './web_data/passages',
+                stop_words=get_setting(config, 'search.stop_words', []),
+                passage_words=get_setting(config, 'search.passages.passage_words', 120),
+                overlap_words=get_setting(config, 'search.passages.overlap_words', 30),
+                semantic_dimensions=get_setting(config, 'search.passages.semantic_dimensions', 64),
+                semantic_weight=get_setting(config, 'search.passages.semantic_weight', 0.3),
+                semantic_rebuild_ratio=get_setting(config, 'search.passages.semantic_rebuild_ratio', 0.5),
+                relevance_threshold=get_setting(config, 'search.tf_idf.relevance_threshold', 0.1),
+                max_results=get_setting(config, 'search.tf_idf.max_results_default', 50),
+                vectorized=get_setting(config, 'search.tf_idf.vectorized', True),
+                memory_max_passages=get_setting(config, 'search.passages.memory_max_passages', 5000),
+                merge_factor=get_setting(config, 'search.passages.merge_factor', 4)
+            )
+    
+    with startup.phase('ingestion'):
+        # Analyses of uploaded documents, reused when the same file comes back
+        analysis_cache = None
+        if get_setting(config, 'performance.caching.enabled', True):
+            analysis_cache = AnalysisCache(
+                os.path.join(get_setting(config, 'storage.cache_directory', './cache'), 'analysis'),
+                max_bytes=get_setting(config, 'performance.caching.max_cache_size_mb', 100) * 1024 * 1024
+            )
         
-        # Initialize pathway integration
-        pathway_system = PathwayIntegration('./web_data/pathway')
-        pathway_system.start_live_ingestion()
-        print("✅ Pathway live data integration initialized")
+        # Rendered search results, invalidated whenever the corpus changes
+        search_cache = None
+        if get_setting(config, 'performance.caching.enabled', True):
+            search_cache = ResultCache(
+                max_bytes=get_setting(config, 'performance.caching.search_results_mb', 16) * 1024 * 1024,
+                ttl_seconds=get_setting(config, 'performance.caching.cache_expiry_hours', 24) * 3600
+            )
+        
+        # Uploads are processed in the background, capped by max_concurrent_documents
+        max_concurrent_documents = get_setting(config, 'performance.limits.max_concurrent_documents', 5)
+        job_queue = IngestionJobQueue(max_workers=max_concurrent_documents)
+        print(f"✅ Document ingestion queue initialized ({max_concurrent_documents} workers)")
+        
+        # Batch uploads extract text on a process pool, started on first use
+        batch_extractor = BatchExtractor(
+            max_workers=get_setting(config, 'performance.batch_upload.extraction_workers', None),
+            max_pages=get_setting(config, 'document_processing.text_extraction.max_pages_per_document', 1000),
+            paragraphs_per_page=get_setting(config, 'document_processing.text_extraction.paragraphs_per_page_docx', 20)
+        )
+    
+    with startup.phase('homepage'):
+        # The homepage never changes while the server runs; encode and compress it once
+        homepage = build_asset(WebHandler.render_homepage(), 'text/html; charset=utf-8')
+        static_assets = {'/': homepage}
+        print(f"✅ Homepage pre-rendered ({len(homepage.body) // 1024} KB, {len(homepage.encoded.get('gzip', b'')) // 1024} KB gzipped)")
+    
+    with startup.phase('live_feeds'):
+        # Live feeds are polled concurrently on an asyncio loop and appended to the live store
+        live_ingestion = None
+        if feed_ingestion:
+            from live_ingest import LiveIngestionEngine
+            feeds = get_setting(config, 'online.live_ingestion.feeds', []) or []
+            if get_setting(config, 'development.testing.use_mock_online_sources', False):
+                from mock_feed_server import start_mock_feed_server
+                mock_server = start_mock_feed_server(feeds=get_setting(config, 'online.live_ingestion.mock_feeds', 10))
+                feeds = [{'name': f'mock-{number}', 'url': url} for number, url in enumerate(mock_server.feed_urls(), 1)]
+            live_ingestion = LiveIngestionEngine(
+                live_store,
+                feeds,
+                max_concurrent_requests=get_setting(config, 'online.rate_limits.max_concurrent_requests', 5),
+                min_interval_seconds=get_setting(config, 'online.live_ingestion.min_interval_seconds', 15),
+                max_interval_seconds=get_setting(config, 'online.live_ingestion.max_interval_seconds', 600),
+                backoff_base_seconds=get_setting(config, 'online.live_ingestion.backoff_base_seconds', 5),
+                max_backoff_seconds=get_setting(config, 'online.live_ingestion.max_backoff_seconds', 900),
+                connect_timeout=get_setting(config, 'online.timeouts.connection_timeout', 10),
+                read_timeout=get_setting(config, 'online.timeouts.read_timeout', 30),
+                connections_per_host=get_setting(config, 'online.live_ingestion.connections_per_host', 4),
+                # New items reach open dashboards right away
+                on_ingest=lambda fresh: stats_events.notify('pathway')
+            )
+        
+        # Users requests can act as: the default user and those with an API key
+        known_users = {get_setting(config, 'security.api.default_user', 'demo_user')}
+        known_users.update((get_setting(config, 'security.api.api_keys', {}) or {}).values())
+        
+        # Dashboard stats are pushed to open tabs only when billing or live data change
+        stats_events = StatsBroadcaster(
+            topics={
+                'pathway': lambda: pathway_stats(pathway_system, live_index, live_store, dedup_index, live_ingestion)
+            },
+            # 'billing:<user_id>' topics are created as users subscribe, for known users only
+            topic_factory=lambda name: (
+                (lambda: billing_stats(billing_system, name.split(':', 1)[1]))
+                if name.startswith('billing:') and name.split(':', 1)[1] in known_users else None
+            ),
+            # Pathway ingests in the background; a stat() of its files reveals new cycles
+            probes={'pathway': live_store.legacy_signature},
+            coalesce_seconds=get_setting(config, 'performance.stats_push.coalesce_seconds', 0.5),
+            probe_interval_seconds=get_setting(config, 'performance.stats_push.probe_interval_seconds', 5)
+        )
+        stats_events.start()
+        
+        if live_ingestion is not None:
+            live_ingestion.start()
+            atexit.register(live_ingestion.stop)
+            print(f"✅ Live feed ingestion started ({len(live_ingestion.feeds)} feeds, "
+                  f"{live_ingestion.max_concurrent_requests} concurrent requests)")
+    
+    # Billed requests per user (anonymous ones per client address), refilled at online.rate_limits.requests_per_minute
+    user_limiter = None
+    if get_setting(config, 'security.api.rate_limiting', True):
+        user_limiter = KeyedTokenBuckets.per_minute(get_setting(config, 'online.rate_limits.requests_per_minute', 10))
+    
+    # At most one Pathway refresh runs at a time; concurrent requests join it
+    refresher = RefreshCoordinator()
+    
+    # Searches, uploads and refreshes are admitted or refused up front, before any work
+    admission = None
+    if get_setting(config, 'security.api.rate_limiting', True):
+        admission = AdmissionController(
+            client_requests_per_minute=get_setting(config, 'performance.admission.client_requests_per_minute', 60),
+            client_burst=get_setting(config, 'performance.admission.client_burst', 20),
+            global_requests_per_second=get_setting(config, 'performance.admission.global_requests_per_second', 20),
+            global_burst=get_setting(config, 'performance.admission.global_burst', 40),
+            max_concurrent_uploads=get_setting(config, 'performance.admission.max_concurrent_uploads', 10),
+            retry_after_seconds=get_setting(config, 'performance.admission.retry_after_seconds', 5)
+        )
+    
+    return {
+        'assistant_instance': assistant,
+        'billing_system': billing_system,
+        'pathway_system': pathway_system,
+        'job_queue': job_queue,
+        'batch_extractor': batch_extractor,
+        'live_store': live_store,
+        'live_index': live_index,
+        'dedup_index': dedup_index,
+        'search_cache': search_cache,
+        'analysis_cache': analysis_cache,
+        'static_assets': static_assets,
+        'stats_events': stats_events,
+        'user_limiter': user_limiter,
+        'admission': admission,
+        'refresher': refresher,
+        'live_ingestion': live_ingestion,
+        'passage_index': passage_index
+    }
+
+def run_web_server(port=None, open_browser=True):
+    try:
+        print("🚀 Starting Smart Doc Analysis Web Interface...")
+        print("=" * 70)
+        
+        config = load_config()
+        startup = StartupTracker()
+        # Filled in once build_services() finishes; until then only STARTUP_PATHS are served
+        services = {}
         
         # Create handler with all system instances
         def handler(*args, **kwargs):
-            WebHandler(*args, 
-                     assistant_instance=assistant,
-                     billing_system=billing_system,
-                     pathway_system=pathway_system,
-                     **kwargs)
+            WebHandler(*args, startup=startup, config=config, **services, **kwargs)
         
-        # Start HTTP server
-        server_address = ('', 8000)
-        httpd = HTTPServer(server_address, handler)
+        # Start HTTP server with a bounded worker pool so slow uploads
+        # don't block searches, stats polling or health checks.
+        # It listens before anything is loaded, so /health can report startup progress
+        port = port or get_setting(config, 'deployment.web_service.port', 8000)
+        server_address = ('', port)
+        workers = get_setting(config, 'deployment.web_service.workers', 4)
+        queue_depth = get_setting(config, 'deployment.web_service.queue_depth', 64)
+        httpd = PooledHTTPServer(server_address, handler, workers=workers, queue_depth=queue_depth)
+        print(f"✅ Listening on port {port} ({workers} workers, queue depth {queue_depth}) "
+              f"after {startup.get_stats()['elapsed_seconds']:.2f}s")
         
-        print("✅ Web server configured successfully")
-        print("🌐 Server running at: http://localhost:8000")
-        print("📱 Opening web browser...")
+        def initialize():
+            try:
+                services.update(build_services(config, startup))
+            except Exception as e:
+                print(f"❌ Error starting web server: {e}")
+                import traceback
+                traceback.print_exc()
+                return
+            startup.mark_ready()
+            print(f"✅ Ready after {startup.ready_after:.2f}s")
+        
+        threading.Thread(target=initialize, name='startup', daemon=True).start()
+        
+        print(f"🌐 Server running at: http://localhost:{port}")
         print("=" * 70)
         
         # Open browser automatically
-        def open_browser():
+        def open_browser_window():
             import time
             time.sleep(1)
             try:
-                webbrowser.open('http://localhost:8000')
+                webbrowser.open(f'http://localhost:{port}')
             except:
                 pass
         
-        browser_thread = threading.Thread(target=open_browser)
-        browser_thread.daemon = True
-        browser_thread.start()
+        if open_browser:
+            print("📱 Opening web browser...")
+            browser_thread = threading.Thread(target=open_browser_window)
+            browser_thread.daemon = True
+            browser_thread.start()
         
-        print("🎯 Web interface is now running!")
+        print("🎯 Web interface is now running (loading state in the background)!")
         print("Press Ctrl+C to stop the server")
         print()
         
@@ -1297,5 +2606,12 @@ def run_web_server():
         import traceback
         traceback.print_exc()
 
+def main():
+    parser = argparse.ArgumentParser(description='Smart Doc Analysis web interface')
+    parser.add_argument('--port', type=int, default=None, help='port to listen on (default: deployment.web_service.port)')
+    parser.add_argument('--no-browser', action='store_true', help='do not open a browser window')
+    args = parser.parse_args()
+    run_web_server(port=args.port, open_browser=not args.no_browser)
+
 if __name__ == "__main__":
-    run_web_server()
\ No newline at end of file
+    main()
@@ -0,0 +1,105 @@
+"""
+Admission control for expensive web endpoints.
+
+Searches, uploads and Pathway refreshes used to be accepted without limit,
+so a burst of them piled up threads and queued work until every request was
+slow. AdmissionController decides up front, in constant time, whether to
+take a request on:
+
+- a token bucket per client address turns away a single noisy client
+  with 429 Too Many Requests
+- a global token bucket caps the total rate of expensive requests and
+  answers 503 Service Unavailable once the server is saturated
+- a concurrency gate bounds uploads that are being received or are still
+  waiting in the ingestion queue, also answering 503
+
+Every rejection carries the number of seconds to wait, sent as Retry-After.
+"""
+import threading
+
+from rate_limit import KeyedTokenBuckets, TokenBucket
+
+
+class ConcurrencyGate:
+    """Non-blocking counting semaphore; try_acquire() returns a slot or None"""
+
+    def __init__(self, limit):
+        self.limit = max(1, int(limit))
+        self.active = 0
+        self._lock = threading.Lock()
+        self._counters = {'admitted': 0, 'rejected': 0}
+
+    def try_acquire(self):
+        with self._lock:
+            if self.active >= self.limit:
+                self._counters['rejected'] += 1
+                return None
+            self.active += 1
+            self._counters['admitted'] += 1
+            return GateSlot(self)
+
+    def _release(self):
+        with self._lock:
+            self.active -= 1
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self._counters, active=self.active, limit=self.limit)
+
+
+class GateSlot:
+    """One held place in a ConcurrencyGate; release() is safe to call twice"""
+
+    def __init__(self, gate):
+        self._gate = gate
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._gate._release()
+
+
+class AdmissionController:
+    """Per-client and global rate limits plus an upload concurrency gate"""
+
+    def __init__(self, client_requests_per_minute=60, client_burst=20, global_requests_per_second=20,
+                 global_burst=40, max_concurrent_uploads=10, retry_after_seconds=5):
+        self.clients = KeyedTokenBuckets.per_minute(client_requests_per_minute, client_burst)
+        self.global_bucket = TokenBucket(global_requests_per_second, global_burst)
+        self.uploads = ConcurrencyGate(max_concurrent_uploads)
+        self.retry_after_seconds = retry_after_seconds
+        self._counters = {'admitted': 0, 'client_limited': 0, 'saturated': 0, 'uploads_full': 0}
+        self._lock = threading.Lock()
+
+    def admit(self, client, upload=False):
+        """Return (status, message, retry_after, slot)
+
+        status is None when the request is admitted; slot is the upload gate
+        slot to release once the upload has been fully processed.
+        """
+        wait = self.clients.take(client)
+        if wait:
+            return self._reject('client_limited', 429, 'Too many requests from this client', wait)
+        wait = self.global_bucket.take()
+        if wait:
+            return self._reject('saturated', 503, 'Server is busy, please retry shortly', wait)
+        slot = None
+        if upload:
+            slot = self.uploads.try_acquire()
+            if slot is None:
+                return self._reject('uploads_full', 503, 'Too many uploads in progress, please retry shortly',
+                                    self.retry_after_seconds)
+        with self._lock:
+            self._counters['admitted'] += 1
+        return None, None, 0.0, slot
+
+    def _reject(self, reason, status, message, retry_after):
+        with self._lock:
+            self._counters[reason] += 1
+        return status, message, retry_after, None
+
+    def get_stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        return dict(counters, clients=self.clients.get_stats(), uploads=self.uploads.get_stats())
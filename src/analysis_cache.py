@@ -0,0 +1,112 @@
+"""
+Persistent cache of document analyses keyed by file content digest.
+
+Re-uploading a document the team has already analyzed used to repeat text
+extraction and analysis. AnalysisCache stores the rendered analysis and
+document stats as one small JSON file per digest, so a repeat upload only
+needs a file read plus a fresh live data lookup. The cache is bounded by
+total size on disk; the least recently used entries are evicted first, with
+recency tracked through file modification times so it survives restarts.
+"""
+import json
+import os
+import threading
+import time
+
+
+class AnalysisCache:
+    """Size-bounded on-disk cache of document analyses"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        self._entries = None   # digest -> [size, last_used]
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, digest):
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def _ensure_loaded(self):
+        if self._entries is not None:
+            return
+        self._entries = {}
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            self._entries[name[:-5]] = [stat.st_size, stat.st_mtime]
+        self._bytes = sum(size for size, _ in self._entries.values())
+
+    def get(self, digest):
+        """Return the cached analysis for digest, or None"""
+        if not digest:
+            return None
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._entries.get(digest)
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            try:
+                with open(self._path(digest), 'r', encoding='utf-8') as f:
+                    cached = json.load(f)
+            except (OSError, ValueError):
+                self._forget(digest)
+                self._counters['misses'] += 1
+                return None
+            entry[1] = time.time()
+            os.utime(self._path(digest), (entry[1], entry[1]))
+            self._counters['hits'] += 1
+            return cached
+
+    def put(self, digest, analysis):
+        """Store a JSON-serializable analysis, evicting old entries as needed"""
+        if not digest:
+            return False
+        data = json.dumps(analysis).encode('utf-8')
+        if len(data) > self.max_bytes:
+            return False
+        with self._lock:
+            self._ensure_loaded()
+            tmp_path = self._path(digest) + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(digest))
+
+            self._bytes -= self._entries.get(digest, [0])[0]
+            self._entries[digest] = [len(data), time.time()]
+            self._bytes += len(data)
+            if self._bytes > self.max_bytes:
+                self._evict()
+            return True
+
+    def _evict(self):
+        for digest, _ in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if self._bytes <= self.max_bytes:
+                break
+            self._forget(digest)
+            self._counters['evictions'] += 1
+
+    def _forget(self, digest):
+        size, _ = self._entries.pop(digest)
+        self._bytes -= size
+        try:
+            os.unlink(self._path(digest))
+        except OSError:
+            pass
+
+    def get_stats(self):
+        with self._lock:
+            self._ensure_loaded()
+            lookups = self._counters['hits'] + self._counters['misses']
+            return dict(
+                self._counters,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                max_bytes=self.max_bytes,
+                hit_rate=round(self._counters['hits'] / lookups, 4) if lookups else 0.0
+            )
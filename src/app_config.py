@@ -0,0 +1,42 @@
+"""
+Configuration loading for the Smart Doc Analysis web interface.
+
+Reads config.yaml from the project root (or config/config.yaml) and exposes
+dotted-key lookups so callers can fall back to sensible defaults when a
+setting, the file, or PyYAML itself is missing.
+"""
+import os
+
+try:
+    import yaml
+except ImportError:  # PyYAML is optional; defaults are used without it
+    yaml = None
+
+CONFIG_PATHS = ('config.yaml', os.path.join('config', 'config.yaml'))
+
+
+def load_config(path=None):
+    """Load the YAML configuration, returning an empty dict if unavailable"""
+    candidates = [path] if path else CONFIG_PATHS
+    if yaml is None:
+        return {}
+
+    for candidate in candidates:
+        if candidate and os.path.exists(candidate):
+            try:
+                with open(candidate, 'r', encoding='utf-8') as f:
+                    return yaml.safe_load(f) or {}
+            except (OSError, yaml.YAMLError) as e:
+                print(f"⚠️ Could not read config file {candidate}: {e}")
+                return {}
+    return {}
+
+
+def get_setting(config, dotted_key, default=None):
+    """Look up a dotted key such as 'performance.limits.max_concurrent_documents'"""
+    value = config
+    for part in dotted_key.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return default
+        value = value[part]
+    return default if value is None else value
@@ -0,0 +1,225 @@
+"""
+Parallel text extraction for batch document uploads.
+
+PyPDF2 and python-docx are pure Python, so extracting many files on threads
+is serialized by the GIL. BatchExtractor fans files out to a process pool;
+each worker writes the extracted text to a sidecar .txt file next to the
+upload, analyzes it, and returns only metadata and the compact
+DocumentAnalysis, so large texts never cross the process boundary. Zip and tar archives are unpacked up front, keeping only
+supported document types.
+"""
+import multiprocessing
+import os
+import tarfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from document_analyzer import analyze_text
+
+SUPPORTED_EXTENSIONS = ('.txt', '.md', '.pdf', '.docx')
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+
+def is_archive(filename):
+    return filename.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def is_supported(filename):
+    return filename.lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+def _unique_path(directory, filename):
+    """Return a path in directory for filename that does not collide"""
+    stem, ext = os.path.splitext(filename)
+    candidate = os.path.join(directory, filename)
+    counter = 1
+    while os.path.exists(candidate):
+        candidate = os.path.join(directory, f"{stem}_{counter}{ext}")
+        counter += 1
+    return candidate
+
+
+def _safe_member_name(name):
+    """Return the base file name of an archive member, or None if unsafe"""
+    normalized = name.replace('\\', '/')
+    if normalized.startswith('/') or '..' in normalized.split('/'):
+        return None
+    base = os.path.basename(normalized)
+    if not base or base.startswith('.'):
+        return None
+    return base
+
+
+def _copy_limited(source, target_path, max_size):
+    written = 0
+    with open(target_path, 'wb') as target:
+        while True:
+            chunk = source.read(64 * 1024)
+            if not chunk:
+                break
+            written += len(chunk)
+            if max_size and written > max_size:
+                raise ValueError("archive member exceeds the maximum upload size")
+            target.write(chunk)
+    return written
+
+
+def expand_archive(archive_path, archive_name, work_dir, max_members=500, max_file_size=None):
+    """Unpack supported documents from a zip or tar archive
+
+    Returns a list of (display_name, path) tuples. Members with unsafe
+    paths, links and unsupported types are skipped.
+    """
+    documents = []
+
+    if archive_name.lower().endswith('.zip'):
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                name = _safe_member_name(info.filename)
+                if info.is_dir() or not name or not is_supported(name):
+                    continue
+                if len(documents) >= max_members:
+                    break
+                target = _unique_path(work_dir, name)
+                with archive.open(info) as source:
+                    _copy_limited(source, target, max_file_size)
+                documents.append((f"{archive_name}/{info.filename}", target))
+    else:
+        with tarfile.open(archive_path) as archive:
+            for member in archive:
+                name = _safe_member_name(member.name)
+                if not member.isfile() or not name or not is_supported(name):
+                    continue
+                if len(documents) >= max_members:
+                    break
+                target = _unique_path(work_dir, name)
+                source = archive.extractfile(member)
+                if source is None:
+                    continue
+                with source:
+                    _copy_limited(source, target, max_file_size)
+                documents.append((f"{archive_name}/{member.name}", target))
+
+    return documents
+
+
+def extract_document(path, max_pages=1000, paragraphs_per_page=20):
+    """Extract and analyze one document, writing its text to a sidecar .txt file
+
+    Runs inside a worker process, so heavy extractor imports happen there.
+    """
+    started = time.time()
+    result = {
+        'path': path,
+        'text_path': None,
+        'page_count': 0,
+        'word_count': 0,
+        'extract_seconds': 0.0,
+        'analyze_seconds': 0.0,
+        'analysis': None,
+        'error': None
+    }
+    try:
+        ext = os.path.splitext(path)[1].lower()
+        if ext == '.pdf':
+            from PyPDF2 import PdfReader
+            reader = PdfReader(path)
+            pages = reader.pages[:max_pages]
+            text = '\n\n'.join(page.extract_text() or '' for page in pages)
+            result['page_count'] = len(pages)
+        elif ext == '.docx':
+            import docx
+            paragraphs = [p.text for p in docx.Document(path).paragraphs]
+            text = '\n\n'.join(paragraphs)
+            result['page_count'] = max(1, -(-len(paragraphs) // paragraphs_per_page))
+        else:
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                text = f.read()
+            result['page_count'] = 1
+
+        if ext in ('.txt', '.md'):
+            result['text_path'] = path
+        else:
+            result['text_path'] = path + '.txt'
+            with open(result['text_path'], 'w', encoding='utf-8') as f:
+                f.write(text)
+
+        result['extract_seconds'] = round(time.time() - started, 3)
+        if not text.strip():
+            result['error'] = 'No extractable text found'
+            return result
+
+        analyze_started = time.time()
+        result['analysis'] = analyze_text(text)
+        result['word_count'] = result['analysis'].word_count
+        result['analyze_seconds'] = round(time.time() - analyze_started, 3)
+    except Exception as e:
+        result['error'] = str(e)
+        result['extract_seconds'] = round(time.time() - started, 3)
+
+    return result
+
+
+class BatchExtractor:
+    """Extract many documents in parallel on a lazily started process pool"""
+
+    def __init__(self, max_workers=None, max_pages=1000, paragraphs_per_page=20):
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self.max_pages = max_pages
+        self.paragraphs_per_page = paragraphs_per_page
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # Spawned workers avoid inheriting locks held by the server's threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def _discard_executor(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def extract_all(self, paths, progress_callback=None):
+        """Extract every path, returning results in input order"""
+        executor = self._get_executor()
+        futures = {
+            executor.submit(extract_document, path, self.max_pages, self.paragraphs_per_page): index
+            for index, path in enumerate(paths)
+        }
+        results = [None] * len(paths)
+        broken = False
+        for done, future in enumerate(as_completed(futures), start=1):
+            index = futures[future]
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                # A crashed worker process should fail only its own file
+                broken = broken or isinstance(e, BrokenProcessPool)
+                results[index] = {
+                    'path': paths[index], 'text_path': None, 'page_count': 0,
+                    'word_count': 0, 'extract_seconds': 0.0, 'analyze_seconds': 0.0,
+                    'analysis': None, 'error': str(e)
+                }
+            if progress_callback:
+                progress_callback(done, len(paths))
+
+        if broken:
+            # A dead worker poisons the whole pool; start a fresh one next time
+            self._discard_executor(executor)
+        return results
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
@@ -0,0 +1,253 @@
+"""
+Write-behind billing for the web interface.
+
+FlexpriceIntegration persists its JSON store on every bill_question and
+bill_report call, which used to happen on the request path of every search
+and upload. BillingLedger takes those calls instead: a request appends the
+event to an in-memory deque (an atomic operation, no lock) and returns. A
+background thread drains the buffer every flush_interval_seconds, or as soon
+as flush_batch_size events are waiting, appends the batch to a write-ahead
+log with a single fsync, and only then applies it to the billing system.
+
+After a crash, events still in the log past the last checkpoint are replayed
+on startup. Events accepted less than one flush interval before the crash
+are lost; a crash in the middle of applying a batch may apply part of that
+batch twice.
+
+Events are applied in order, so one that keeps failing would hold back
+every later event. After max_attempts failures it is moved to a dead-letter
+file (dead_letter.jsonl), taken back out of the usage rollups, and the
+ledger moves on.
+
+Every event is also folded into UsageRollups as it is accepted, so usage
+summaries and statistics read through the ledger are current immediately
+and cost the same however long the billing history grows. The rollups are
+told when each event is applied, and the summaries of the users a flush
+charged are reloaded from the billing system afterwards, so balances
+follow the charges actually applied rather than assumed prices.
+"""
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from usage_rollups import UsageRollups
+
+
+class BillingLedger:
+    """Buffer billing calls and apply them to the billing system in fsynced batches"""
+
+    def __init__(self, billing, directory, flush_interval_seconds=1.0, flush_batch_size=200, rollups=None,
+                 max_attempts=5):
+        self.billing = billing
+        self.rollups = rollups or UsageRollups(billing.get_usage_summary)
+        self.directory = directory
+        self.flush_interval_seconds = flush_interval_seconds
+        self.flush_batch_size = flush_batch_size
+        self.max_attempts = max(1, int(max_attempts))
+        self.wal_path = os.path.join(directory, 'billing.wal')
+        self.checkpoint_path = os.path.join(directory, 'checkpoint.json')
+        self.rollups_path = os.path.join(directory, 'rollups.jsonl')
+        self.dead_letter_path = os.path.join(directory, 'dead_letter.jsonl')
+
+        self._buffer = deque()
+        self._keys = itertools.count(1)       # pending rollup entries; next() is atomic
+        self._inflight = deque()              # drained events not yet applied, oldest first
+        self._attempts = {}                   # seq -> failed attempts of an inflight event
+        self._flush_lock = threading.Lock()   # one flush at a time; guards _inflight
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._running = False
+        self._counters = {'events': 0, 'flushes': 0, 'applied': 0, 'replayed': 0, 'failed': 0,
+                          'dead_lettered': 0}
+        os.makedirs(directory, exist_ok=True)
+
+        # Loaded first, so events replayed below are reconciled into them
+        legacy_rollups_path = os.path.join(directory, 'rollups.json')
+        if not os.path.exists(self.rollups_path) and os.path.exists(legacy_rollups_path):
+            self.rollups.load(legacy_rollups_path)
+        else:
+            self.rollups.load(self.rollups_path)
+        self._applied_seq = self._read_checkpoint()
+        self._logged_seq = self._applied_seq
+        self._replay()
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='billing-ledger', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop the flusher and write out everything still buffered"""
+        self._running = False
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+        self.flush()
+
+    def bill_question(self, user_id, query, session_id, success=True):
+        self._append('bill_question', user_id, query, session_id, success)
+
+    def bill_report(self, user_id, title, session_id, success=True):
+        self._append('bill_report', user_id, title, session_id, success)
+
+    def add_credits(self, user_id, amount, reason):
+        self._append('add_credits', user_id, amount, reason)
+
+    def _append(self, op, user_id, *args):
+        event = {'op': op, 'user_id': user_id, 'args': list(args), 'ts': time.time(), 'key': next(self._keys)}
+        self.rollups.record(user_id, op, event['args'], event['ts'], event['key'])
+        # deque.append is atomic, so request threads never wait here; the
+        # flusher numbers events as it drains them
+        self._buffer.append(event)
+        if len(self._buffer) >= self.flush_batch_size:
+            self._wakeup.set()
+
+    def get_usage_summary(self, user_id):
+        """Usage summary including events not yet applied to the billing system"""
+        return self.rollups.summary(user_id)
+
+    def get_usage_stats(self, user_id, peak_hours_count=3, common_terms_count=5):
+        return self.rollups.stats(user_id, peak_hours_count, common_terms_count)
+
+    def __getattr__(self, name):
+        # Anything the ledger does not buffer goes straight to the billing system
+        return getattr(self.billing, name)
+
+    def __bool__(self):
+        return bool(self.billing)
+
+    def _run(self):
+        while self._running:
+            self._wakeup.wait(self.flush_interval_seconds)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Billing ledger flush failed: {e}")
+
+    def flush(self):
+        """Log the buffered events durably, then apply them to the billing system"""
+        with self._flush_lock:
+            batch = []
+            while self._buffer:
+                event = self._buffer.popleft()
+                self._logged_seq += 1
+                event['seq'] = self._logged_seq
+                batch.append(event)
+            # Earlier events that failed to apply stay ahead of new ones
+            self._inflight.extend(batch)
+            if not self._inflight:
+                return 0
+            if batch:
+                self._write_wal(batch)
+                self._counters['events'] += len(batch)
+            applied = self._apply_inflight()
+            if batch:
+                self.rollups.save(self.rollups_path)
+            self._counters['flushes'] += 1
+            return applied
+
+    def _write_wal(self, batch):
+        data = ''.join(json.dumps(event, separators=(',', ':')) + '\n' for event in batch)
+        with open(self.wal_path, 'a', encoding='utf-8') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _apply_inflight(self):
+        applied = 0
+        settled = False
+        charged = set()
+        while self._inflight:
+            event = self._inflight[0]
+            try:
+                self._apply(event)
+            except Exception as e:
+                self._counters['failed'] += 1
+                attempts = self._attempts.get(event['seq'], 0) + 1
+                if attempts < self.max_attempts:
+                    # Leave the event at the head of the queue for the next flush
+                    print(f"Billing event {event['seq']} not applied (attempt {attempts}): {e}")
+                    self._attempts[event['seq']] = attempts
+                    break
+                print(f"Billing event {event['seq']} failed {attempts} times, moved to the dead-letter file: {e}")
+                self._dead_letter(event, e, attempts)
+            else:
+                applied += 1
+                self.rollups.applied(event['user_id'], event.get('key'))
+                charged.add(event['user_id'])
+            self._inflight.popleft()
+            self._attempts.pop(event['seq'], None)
+            self._applied_seq = event['seq']
+            settled = True
+        self._counters['applied'] += applied
+        if settled:
+            self._write_checkpoint()
+            if not self._inflight:
+                # Everything logged has been applied; start the log afresh
+                open(self.wal_path, 'w').close()
+        for user_id in charged:
+            try:
+                self.rollups.reconcile(user_id)
+            except Exception as e:
+                print(f"Usage summary of {user_id} not reconciled: {e}")
+        return applied
+
+    def _apply(self, event):
+        getattr(self.billing, event['op'])(event['user_id'], *event['args'])
+
+    def _dead_letter(self, event, error, attempts):
+        """Set aside an event that keeps failing, so later events are not held back"""
+        record = dict(event, error=str(error), attempts=attempts, dead_lettered_at=time.time())
+        with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, separators=(',', ':')) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        # The rollups counted it when it was accepted, but it was never charged
+        self.rollups.reverse(event['user_id'], event['op'], event['args'], event['ts'], event.get('key'))
+        self._counters['dead_lettered'] += 1
+
+    def _read_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                return int(json.load(f).get('applied_seq', 0))
+        except (OSError, ValueError):
+            return 0
+
+    def _write_checkpoint(self):
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'applied_seq': self._applied_seq, 'updated_at': time.time()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _replay(self):
+        """Apply events logged before a crash that never reached the billing system"""
+        if not os.path.exists(self.wal_path):
+            return
+        pending = []
+        with open(self.wal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    break   # torn write at the end of the log
+                if event['seq'] > self._applied_seq:
+                    # Its rollup entry died with the process that recorded it
+                    event.pop('key', None)
+                    pending.append(event)
+        if pending:
+            print(f"🧾 Replaying {len(pending)} billing events from the write-ahead log")
+            self._inflight = deque(pending)
+            self._logged_seq = pending[-1]['seq']
+            self._counters['replayed'] = self._apply_inflight()
+        else:
+            open(self.wal_path, 'w').close()
+
+    def get_stats(self):
+        return dict(self._counters, buffered=len(self._buffer), inflight=len(self._inflight),
+                    applied_seq=self._applied_seq)
@@ -0,0 +1,143 @@
+"""
+Content-hash deduplication for uploaded documents and live sources.
+
+DedupIndex records the digest of every document or live source that has been
+processed, keyed by namespace ('upload' or 'live'), in an append-only
+SegmentLog. A lookup is one dict probe plus, on a hit, a single mapped read of
+the original record, so re-uploaded files are rejected before extraction and
+re-published articles before they reach the live index.
+
+Near-duplicate detection is optional. Each text gets a 64-bit SimHash over
+word shingles; fingerprints are split into four 16-bit bands, so any two
+fingerprints within three bits of each other share at least one band and
+only those candidates are compared.
+"""
+import hashlib
+import threading
+from datetime import datetime
+
+from live_store import SegmentLog
+
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4
+SHINGLE_SIZE = 3
+HASH_CHUNK_SIZE = 1024 * 1024
+
+NAMESPACES = ('upload', 'live')
+
+
+def simhash(text, shingle_size=SHINGLE_SIZE):
+    """Return a 64-bit SimHash of text over its distinct word shingles"""
+    words = text.lower().split()
+    if len(words) < shingle_size:
+        shingles = {' '.join(words)} if words else set()
+    else:
+        shingles = {' '.join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)}
+    if not shingles:
+        return 0
+
+    # Count set bits per position column-wise; str.count keeps the inner loop in C
+    rows = [format(int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big'), '064b')
+            for shingle in shingles]
+    half = len(rows) / 2
+    fingerprint = 0
+    for column in zip(*rows):
+        fingerprint = (fingerprint << 1) | (column.count('1') > half)
+    return fingerprint
+
+
+def _bands(fingerprint):
+    width = SIMHASH_BITS // SIMHASH_BANDS
+    mask = (1 << width) - 1
+    return [(band, (fingerprint >> (band * width)) & mask) for band in range(SIMHASH_BANDS)]
+
+
+class DedupIndex:
+    """Persistent digest index with optional SimHash near-duplicate lookup"""
+
+    def __init__(self, directory, hash_algorithm='md5', near_duplicates=False, max_distance=3):
+        self.hash_algorithm = hash_algorithm
+        self.near_duplicates = near_duplicates
+        self.max_distance = max_distance
+        self.log = SegmentLog(directory, 'dedup', key_field='key')
+
+        self._bands = None   # (namespace, band, value) -> [(fingerprint, key)]
+        self._counters = {namespace: {'checked': 0, 'exact': 0, 'near': 0} for namespace in NAMESPACES}
+        self._lock = threading.Lock()
+
+    def new_hash(self):
+        return hashlib.new(self.hash_algorithm)
+
+    def digest_file(self, path):
+        hasher = self.new_hash()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def digest_text(self, text):
+        return hashlib.new(self.hash_algorithm, text.encode('utf-8')).hexdigest()
+
+    def _ensure_bands(self):
+        """Build band tables from the stored fingerprints on first near lookup"""
+        if self._bands is not None:
+            return
+        self._bands = {}
+        records, _, _ = self.log.read_since(None)
+        for record in records:
+            if record.get('simhash') is not None:
+                self._add_bands(record['key'].split(':', 1)[0], record['simhash'], record['key'])
+
+    def _add_bands(self, namespace, fingerprint, key):
+        for band, value in _bands(fingerprint):
+            self._bands.setdefault((namespace, band, value), []).append((fingerprint, key))
+
+    def lookup(self, namespace, digest, text=None, ref=None):
+        """Return the record of an earlier copy of this content, or None
+
+        Copies recorded under ref itself (an earlier version of the same
+        live source) are not reported as duplicates.
+        """
+        with self._lock:
+            counters = self._counters[namespace]
+            counters['checked'] += 1
+
+            original = self.log.get(f"{namespace}:{digest}")
+            if original is not None and (ref is None or original.get('ref') != ref):
+                counters['exact'] += 1
+                return original
+
+            if not (self.near_duplicates and text):
+                return None
+            self._ensure_bands()
+            fingerprint = simhash(text)
+            for band, value in _bands(fingerprint):
+                for candidate, key in self._bands.get((namespace, band, value), ()):
+                    if bin(candidate ^ fingerprint).count('1') > self.max_distance:
+                        continue
+                    original = self.log.get(key)
+                    if original is not None and (ref is None or original.get('ref') != ref):
+                        counters['near'] += 1
+                        return original
+            return None
+
+    def add(self, namespace, digest, ref, text=None):
+        """Record processed content so later copies are detected"""
+        key = f"{namespace}:{digest}"
+        record = {'key': key, 'ref': ref, 'first_seen': datetime.now().isoformat()}
+        with self._lock:
+            if self.near_duplicates and text:
+                record['simhash'] = simhash(text)
+                if self._bands is not None:
+                    self._add_bands(namespace, record['simhash'], key)
+            self.log.append([record])
+
+    def get_stats(self):
+        with self._lock:
+            stats = {'hash_algorithm': self.hash_algorithm,
+                     'near_duplicates': self.near_duplicates,
+                     'entries': len(self.log)}
+            for namespace, counters in self._counters.items():
+                hits = counters['exact'] + counters['near']
+                stats[namespace] = dict(counters, hit_rate=round(hits / counters['checked'], 4) if counters['checked'] else 0.0)
+            return stats
@@ -0,0 +1,392 @@
+"""
+Memory-mapped, immutable passage index segments.
+
+The passage index used to hold every document's text and postings in the
+Python heap and rebuild them from the document log on every start. A
+DiskSegment stores the same data in flat files that are memory-mapped when
+the segment is opened, so opening costs a few system calls, the operating
+system pages in only what searches touch, and every process that opens the
+segment shares the same page cache. A segment directory holds:
+
+- meta.json        counts, total passage length, and the documents this
+                   segment deletes from older segments
+- terms.idx        one fixed-size record per term, sorted by term:
+                   term offset and length in terms.dat, postings offset and
+                   length in postings.dat, document frequency
+- terms.dat        the terms, UTF-8
+- postings.dat     per term, (passage gap, term frequency) pairs as varints;
+                   passage numbers ascend, so gaps stay small
+- passages.idx     one record per passage: document number, character span,
+                   length in terms, and byte span of its text in docs.dat
+- docs.idx         one record per document: name and text byte spans,
+                   first passage and passage count
+- docs.dat         document names and texts, UTF-8
+- <model_id>.npy   passage vectors of the passage index's semantic model,
+                   when it has one (see semantic_model)
+
+Terms are found by binary search over terms.idx, reading only the probed
+records. Segments are never modified. A newer segment supersedes every
+document it contains or lists as deleted: the older copies are shadowed
+(passages masked out and term counts subtracted, in memory) until a merge
+rewrites their segment.
+
+write_segment() merges any number of source segments (disk or in-memory)
+into a new segment, renumbering passages and dropping shadowed ones.
+"""
+import json
+import mmap
+import os
+import shutil
+import struct
+from array import array
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+FORMAT_VERSION = 1
+
+TERM_RECORD = struct.Struct('<QIQII')        # term offset, term length, postings offset, postings length, df
+PASSAGE_RECORD = struct.Struct('<IIIIQI')    # document, start, end, length, text offset, text length
+DOC_RECORD = struct.Struct('<QIQQII')        # name offset, name length, text offset, text length, first passage, passages
+
+if np is not None:
+    PASSAGE_DTYPE = np.dtype([('doc', '<u4'), ('start', '<u4'), ('end', '<u4'), ('length', '<u4'),
+                              ('offset', '<u8'), ('size', '<u4')])
+
+
+def encode_varints(values, out):
+    """Append unsigned LEB128 varints of values to the bytearray out"""
+    for value in values:
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+
+
+def decode_varints(data):
+    values = []
+    value = 0
+    shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = 0
+            shift = 0
+    return values
+
+
+def decode_varints_np(data):
+    """decode_varints() without a Python loop: group bytes by their terminating byte"""
+    encoded = np.frombuffer(data, dtype=np.uint8)
+    if not len(encoded):
+        return np.zeros(0, dtype=np.int64)
+    ends = np.flatnonzero(encoded < 0x80)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    group_starts = np.repeat(starts, ends - starts + 1)
+    shifts = ((np.arange(len(encoded)) - group_starts) * 7).astype(np.uint64)
+    parts = (encoded & 0x7F).astype(np.uint64) << shifts
+    return np.add.reduceat(parts, starts).astype(np.int64)
+
+
+def _map(path):
+    """Read-only memory map of path; empty files map to empty bytes"""
+    if not os.path.getsize(path):
+        return b''
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class DiskSegment:
+    """Read-only passage index segment backed by memory-mapped files"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.name = os.path.basename(directory)
+        with open(os.path.join(directory, 'meta.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.passages = self.meta['passages']
+        self.documents = self.meta['documents']
+        self.term_count = self.meta['terms']
+        self.live_passages = self.passages
+        self.total_length = float(self.meta['total_length'])
+        self.deleted = self.meta.get('deleted', [])
+
+        self._terms_idx = _map(os.path.join(directory, 'terms.idx'))
+        self._terms_dat = _map(os.path.join(directory, 'terms.dat'))
+        self._postings = _map(os.path.join(directory, 'postings.dat'))
+        self._passages_idx = _map(os.path.join(directory, 'passages.idx'))
+        self._docs_idx = _map(os.path.join(directory, 'docs.idx'))
+        self._docs_dat = _map(os.path.join(directory, 'docs.dat'))
+        self._passage_table = (np.frombuffer(self._passages_idx, dtype=PASSAGE_DTYPE)
+                               if np is not None and self.passages else None)
+
+        self._live = None            # bytearray mask, created when the first document is shadowed
+        self._df_removed = Counter()  # term -> passages of shadowed documents containing it
+        self._names = None           # name -> document number, read on first lookup
+        self._lengths = None
+        self._live_np = None
+        self.shadowed = set()
+        self.scoring_cache = None    # (statistics version, {term: BM25 weights}), kept by the passage index
+        self.semantic = None         # semantic model of vectors, both set by the passage index
+        self.vectors = None          # memory-mapped passages x rank array from <model_id>.npy
+
+    def __len__(self):
+        return self.documents - len(self.shadowed)
+
+    def close(self):
+        self._passage_table = None
+        self.vectors = None
+        for mapped in (self._terms_idx, self._terms_dat, self._postings,
+                       self._passages_idx, self._docs_idx, self._docs_dat):
+            if isinstance(mapped, mmap.mmap):
+                try:
+                    mapped.close()
+                except BufferError:
+                    pass   # still referenced by an array view; released with it
+
+    # Terms
+
+    def _term_record(self, index):
+        return TERM_RECORD.unpack_from(self._terms_idx, index * TERM_RECORD.size)
+
+    def _term_at(self, index):
+        offset, length = self._term_record(index)[:2]
+        return self._terms_dat[offset:offset + length]
+
+    def _find_term(self, term):
+        key = term.encode('utf-8')
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._term_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.term_count and self._term_at(low) == key:
+            return self._term_record(low)
+        return None
+
+    def df(self, term):
+        record = self._find_term(term)
+        if record is None:
+            return 0
+        return record[4] - self._df_removed.get(term, 0)
+
+    def terms(self):
+        for index in range(self.term_count):
+            yield self._term_at(index).decode('utf-8')
+
+    def postings(self, term):
+        """(passage numbers, term frequencies) of term as lists, or None"""
+        record = self._find_term(term)
+        if record is None:
+            return None
+        values = decode_varints(self._postings[record[2]:record[2] + record[3]])
+        passages = []
+        passage = 0
+        for gap in values[0::2]:
+            passage += gap
+            passages.append(passage)
+        return passages, values[1::2]
+
+    def postings_np(self, term):
+        record = self._find_term(term)
+        if record is None:
+            return None
+        values = decode_varints_np(self._postings[record[2]:record[2] + record[3]])
+        return np.cumsum(values[0::2]), values[1::2].astype(np.float64)
+
+    # Passages
+
+    def passage_record(self, passage):
+        """(document number, start, end, length) of a passage"""
+        return PASSAGE_RECORD.unpack_from(self._passages_idx, passage * PASSAGE_RECORD.size)[:4]
+
+    def passage_length(self, passage):
+        return PASSAGE_RECORD.unpack_from(self._passages_idx, passage * PASSAGE_RECORD.size)[3]
+
+    def lengths_np(self):
+        if self._lengths is None:
+            self._lengths = (self._passage_table['length'].astype(np.float64)
+                             if self._passage_table is not None else np.zeros(0))
+        return self._lengths
+
+    def passage_text(self, passage):
+        offset, size = PASSAGE_RECORD.unpack_from(self._passages_idx, passage * PASSAGE_RECORD.size)[4:]
+        return self._docs_dat[offset:offset + size].decode('utf-8')
+
+    def is_live(self, passage):
+        return self._live is None or self._live[passage]
+
+    def vectors_np(self):
+        return self.vectors
+
+    def live_np(self):
+        if self._live_np is None and self._live is not None:
+            self._live_np = np.frombuffer(self._live, dtype=np.uint8).astype(bool)
+        return self._live_np
+
+    # Documents
+
+    def _doc_record(self, doc):
+        return DOC_RECORD.unpack_from(self._docs_idx, doc * DOC_RECORD.size)
+
+    def doc_name(self, doc):
+        offset, length = self._doc_record(doc)[:2]
+        return self._docs_dat[offset:offset + length].decode('utf-8')
+
+    def doc_text(self, doc):
+        offset, length = self._doc_record(doc)[2:4]
+        return self._docs_dat[offset:offset + length].decode('utf-8')
+
+    def find_document(self, name):
+        """Document number of a live document called name, or None"""
+        if self._names is None:
+            self._names = {self.doc_name(doc): doc for doc in range(self.documents)}
+        doc = self._names.get(name)
+        return None if doc is None or doc in self.shadowed else doc
+
+    def doc_passages(self, doc):
+        first, count = self._doc_record(doc)[4:]
+        return range(first, first + count)
+
+    def document_text(self, name):
+        doc = self.find_document(name)
+        return None if doc is None else self.doc_text(doc)
+
+    def live_documents(self):
+        return [doc for doc in range(self.documents) if doc not in self.shadowed]
+
+    def superseded_names(self):
+        """Names whose copies in older segments this segment replaces or deletes"""
+        return [self.doc_name(doc) for doc in range(self.documents)] + self.deleted
+
+    def shadow(self, name, tokenize_passage):
+        """Mask a document superseded by a newer segment; returns True if it was here"""
+        doc = self.find_document(name)
+        if doc is None:
+            return False
+        if self._live is None:
+            self._live = bytearray(b'\x01') * self.passages
+        self._live_np = None
+        for passage in self.doc_passages(doc):
+            self._live[passage] = 0
+            self.live_passages -= 1
+            self.total_length -= self.passage_length(passage)
+            self._df_removed.update(set(tokenize_passage(self.passage_text(passage))))
+        self.shadowed.add(doc)
+        return True
+
+    def get_stats(self):
+        return {
+            'segment': self.name,
+            'documents': self.documents - len(self.shadowed),
+            'passages': self.live_passages,
+            'terms': self.term_count,
+            'bytes': sum(os.path.getsize(os.path.join(self.directory, name)) for name in os.listdir(self.directory))
+        }
+
+
+def write_segment(directory, sources, documents=None, deleted=()):
+    """Merge the documents of sources, oldest first, into a new segment at directory
+
+    documents holds the document numbers to keep from each source (by
+    default its live documents); taking them up front lets a background
+    merge run while newer writes shadow documents in its sources. deleted
+    lists names the segment deletes from older segments. Each source
+    provides doc_name(), doc_text(), doc_passages(), passage_record(),
+    terms() and postings(), as DiskSegment and the in-memory segment do.
+    The segment is written to a temporary directory and renamed into place.
+    """
+    if documents is None:
+        documents = [source.live_documents() for source in sources]
+    tmp_directory = directory + '.tmp'
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    os.makedirs(tmp_directory)
+
+    remaps = []          # per source: array of new passage numbers, -1 where dropped
+    document_count = 0
+    passages = 0
+    total_length = 0
+    with open(os.path.join(tmp_directory, 'docs.dat'), 'wb') as docs_dat, \
+            open(os.path.join(tmp_directory, 'docs.idx'), 'wb') as docs_idx, \
+            open(os.path.join(tmp_directory, 'passages.idx'), 'wb') as passages_idx:
+        data_offset = 0
+        for source, keep in zip(sources, documents):
+            remap = array('q', [-1]) * source.passages
+            for doc in keep:
+                name, text = source.doc_name(doc), source.doc_text(doc)
+                name_bytes = name.encode('utf-8')
+                text_bytes = text.encode('utf-8')
+                name_offset = data_offset
+                text_offset = name_offset + len(name_bytes)
+                docs_dat.write(name_bytes)
+                docs_dat.write(text_bytes)
+                data_offset = text_offset + len(text_bytes)
+
+                first = passages
+                # Byte offsets follow character offsets forward, so each is found incrementally
+                char_position, byte_position = 0, 0
+                for old in source.doc_passages(doc):
+                    start, end, length = source.passage_record(old)[1:4]
+                    byte_position += len(text[char_position:start].encode('utf-8'))
+                    char_position = start
+                    size = len(text[start:end].encode('utf-8'))
+                    passages_idx.write(PASSAGE_RECORD.pack(document_count, start, end, int(length),
+                                                           text_offset + byte_position, size))
+                    remap[old] = passages
+                    passages += 1
+                    total_length += int(length)
+                docs_idx.write(DOC_RECORD.pack(name_offset, len(name_bytes), text_offset, len(text_bytes),
+                                               first, passages - first))
+                document_count += 1
+            remaps.append(remap)
+
+    terms = sorted(set().union(*(source.terms() for source in sources)))
+    term_count = 0
+    with open(os.path.join(tmp_directory, 'terms.dat'), 'wb') as terms_dat, \
+            open(os.path.join(tmp_directory, 'terms.idx'), 'wb') as terms_idx, \
+            open(os.path.join(tmp_directory, 'postings.dat'), 'wb') as postings_dat:
+        term_offset = postings_offset = 0
+        for term in terms:
+            encoded = bytearray()
+            previous = 0
+            df = 0
+            for source, remap in zip(sources, remaps):
+                postings = source.postings(term)
+                if postings is None:
+                    continue
+                for old, tf in zip(*postings):
+                    new = remap[old]
+                    if new < 0:
+                        continue
+                    encode_varints((new - previous, int(tf)), encoded)
+                    previous = new
+                    df += 1
+            if not df:
+                continue
+            term_bytes = term.encode('utf-8')
+            terms_dat.write(term_bytes)
+            postings_dat.write(encoded)
+            terms_idx.write(TERM_RECORD.pack(term_offset, len(term_bytes), postings_offset, len(encoded), df))
+            term_offset += len(term_bytes)
+            postings_offset += len(encoded)
+            term_count += 1
+
+    meta = {'format': FORMAT_VERSION, 'documents': document_count, 'passages': passages,
+            'terms': term_count, 'total_length': total_length, 'deleted': sorted(deleted)}
+    with open(os.path.join(tmp_directory, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    for name in os.listdir(tmp_directory):
+        with open(os.path.join(tmp_directory, name), 'rb') as f:
+            os.fsync(f.fileno())
+    os.replace(tmp_directory, directory)
+    return meta
@@ -0,0 +1,240 @@
+"""
+Single-pass document analysis for summaries, topics and insights.
+
+The web interface used to lower-case and rescan the full document text for
+every keyword group. analyze_text() instead lower-cases and splits the text
+once, counts tokens once, and does everything else per *unique* token:
+
+- single-word keywords are matched by walking each vocabulary entry through
+  a character trie of all keywords, so the cost depends on the vocabulary,
+  not on document length;
+- multi-word phrases jump between occurrences of their first word with
+  list.index, checking only those positions for the rest of the phrase;
+- numbers are counted per vocabulary entry and weighted by frequency.
+
+Keywords of four or more letters match as token prefixes ("reference"
+matches "references"); shorter ones such as "ai" must match a whole token,
+so words like "said" or "maintain" no longer count as AI content.
+
+The resulting DocumentAnalysis is small and picklable, so it can be built in
+a worker process and reused by every formatter.
+"""
+import heapq
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+
+NUMBER_PATTERN = re.compile(r'\d+(?:\.\d+)?%?')
+STRIP_CHARS = '.,;:!?()[]{}<>"\'`“”‘’*_-/\\|'
+
+# Minimum keyword length for prefix matching; shorter keywords match whole tokens
+PREFIX_MATCH_MIN_LENGTH = 4
+
+# Ordered: the first matching document type wins
+DOCUMENT_TYPES = [
+    ('research document', ['research', 'study', 'methodology', 'results']),
+    ('instructional guide', ['tutorial', 'guide', 'how to', 'steps']),
+    ('analytical report', ['report', 'analysis', 'findings', 'conclusion']),
+]
+
+THEMES = [
+    ('technology and artificial intelligence', ['technology', 'ai', 'machine learning']),
+    ('business strategy and market analysis', ['business', 'market', 'strategy']),
+    ('data analysis and insights', ['data', 'analysis']),
+    ('healthcare and medical research', ['health', 'medical']),
+]
+
+TOPICS = [
+    ('Artificial Intelligence', ['ai', 'artificial intelligence', 'machine learning', 'neural network', 'deep learning']),
+    ('Data Science', ['data science', 'analytics', 'statistics', 'big data', 'data analysis']),
+    ('Technology', ['technology', 'software', 'hardware', 'innovation', 'digital']),
+    ('Business', ['business', 'strategy', 'market', 'revenue', 'profit', 'management']),
+    ('Research', ['research', 'study', 'methodology', 'findings', 'analysis']),
+    ('Healthcare', ['health', 'medical', 'patient', 'treatment', 'clinical']),
+    ('Education', ['education', 'learning', 'teaching', 'training', 'knowledge']),
+    ('Finance', ['finance', 'financial', 'investment', 'banking', 'economic']),
+]
+
+INSIGHTS = [
+    ('technical', ['algorithm', 'method', 'process', 'system']),
+    ('references', ['reference', 'citation', 'bibliography', 'source']),
+    ('actionable', ['recommend', 'suggest', 'should', 'action', 'implement']),
+]
+
+KEYWORD_GROUPS = (
+    [(f'type:{name}', keywords) for name, keywords in DOCUMENT_TYPES] +
+    [(f'theme:{name}', keywords) for name, keywords in THEMES] +
+    [(f'topic:{name}', keywords) for name, keywords in TOPICS] +
+    [(f'insight:{name}', keywords) for name, keywords in INSIGHTS]
+)
+
+
+class KeywordMatcher:
+    """Match many keyword groups against a tokenized document at once"""
+
+    def __init__(self, groups):
+        self.words = []
+        self._word_ids = {}
+        self._trie = {}
+        self._single_word_groups = {}
+        self._phrases = []
+
+        for group, keywords in groups:
+            for keyword in keywords:
+                parts = keyword.lower().split()
+                ids = tuple(self._add_word(part) for part in parts)
+                if len(ids) == 1:
+                    self._single_word_groups.setdefault(ids[0], set()).add(group)
+                else:
+                    self._phrases.append((ids, group))
+
+    def _add_word(self, word):
+        if word not in self._word_ids:
+            self._word_ids[word] = len(self.words)
+            self.words.append(word)
+            node = self._trie
+            for char in word:
+                node = node.setdefault(char, {})
+            node[None] = self._word_ids[word]
+        return self._word_ids[word]
+
+    def _words_in_token(self, token):
+        """Walk the trie along token, collecting keyword words it satisfies"""
+        found = set()
+        node = self._trie
+        for depth, char in enumerate(token, start=1):
+            node = node.get(char)
+            if node is None:
+                break
+            word_id = node.get(None)
+            if word_id is not None and (depth == len(token) or depth >= PREFIX_MATCH_MIN_LENGTH):
+                found.add(word_id)
+        return found
+
+    def match(self, tokens, vocabulary):
+        """Return the set of group names with at least one keyword present
+
+        tokens is the whitespace-split document and vocabulary its distinct
+        entries; punctuation around each entry is ignored.
+        """
+        token_words = {}
+        for token in vocabulary:
+            found = self._words_in_token(token.strip(STRIP_CHARS))
+            if found:
+                token_words[token] = found
+
+        matched = set()
+        for found in token_words.values():
+            for word_id in found:
+                matched.update(self._single_word_groups.get(word_id, ()))
+
+        pending = [(ids, group) for ids, group in self._phrases if group not in matched]
+        if not pending:
+            return matched
+
+        empty = set()
+        for ids, group in pending:
+            if group in matched:
+                continue
+            starters = [token for token, found in token_words.items() if ids[0] in found]
+            for starter in starters:
+                if self._phrase_follows(tokens, starter, ids[1:], token_words, empty):
+                    matched.add(group)
+                    break
+
+        return matched
+
+
+    @staticmethod
+    def _phrase_follows(tokens, starter, rest, token_words, empty):
+        """Check whether any occurrence of starter is followed by rest"""
+        position = -1
+        while True:
+            try:
+                position = tokens.index(starter, position + 1)
+            except ValueError:
+                return False
+            following = tokens[position + 1:position + 1 + len(rest)]
+            if len(following) == len(rest) and all(
+                word_id in token_words.get(token, empty)
+                for word_id, token in zip(rest, following)
+            ):
+                return True
+
+
+_MATCHER = KeywordMatcher(KEYWORD_GROUPS)
+
+
+@dataclass
+class DocumentAnalysis:
+    char_count: int
+    word_count: int
+    number_count: int
+    paragraph_breaks: int
+    section_count: int
+    matched_groups: frozenset = field(default_factory=frozenset)
+    frequent_words: list = field(default_factory=list)
+
+    def has(self, group):
+        return group in self.matched_groups
+
+    @property
+    def document_type(self):
+        for name, _ in DOCUMENT_TYPES:
+            if self.has(f'type:{name}'):
+                return name
+        return 'document'
+
+    @property
+    def themes(self):
+        return [name for name, _ in THEMES if self.has(f'theme:{name}')]
+
+    @property
+    def topics(self):
+        """Up to five key topics, falling back to frequent words"""
+        found = [name for name, _ in TOPICS if self.has(f'topic:{name}')]
+        if not found:
+            found = [word.title() for word in self.frequent_words]
+        return found[:5]
+
+    def to_dict(self):
+        return {
+            'char_count': self.char_count,
+            'word_count': self.word_count,
+            'number_count': self.number_count,
+            'paragraph_breaks': self.paragraph_breaks,
+            'section_count': self.section_count,
+            'document_type': self.document_type,
+            'themes': self.themes,
+            'topics': self.topics,
+            'matched_groups': sorted(self.matched_groups)
+        }
+
+
+def analyze_text(content):
+    """Tokenize content once and derive everything the formatters need"""
+    tokens = content.lower().split()
+    counts = Counter(tokens)
+
+    matched = _MATCHER.match(tokens, counts)
+
+    number_count = sum(
+        len(NUMBER_PATTERN.findall(token)) * count
+        for token, count in counts.items()
+        if any(char.isdigit() for char in token)
+    )
+
+    # Top three meaningful words, used when no predefined topic matches
+    candidates = ((word, count) for word, count in counts.items()
+                  if count > 2 and len(word) > 4 and word.isalpha())
+    frequent_words = [word for word, _ in heapq.nlargest(3, candidates, key=lambda item: item[1])]
+
+    return DocumentAnalysis(
+        char_count=len(content),
+        word_count=len(tokens),
+        number_count=number_count,
+        paragraph_breaks=content.count('\n\n'),
+        section_count=min(5, content.count('. ') + 1),
+        matched_groups=frozenset(matched),
+        frequent_words=frequent_words
+    )
@@ -0,0 +1,32 @@
+"""
+JSON encoding for API responses.
+
+Uses orjson when it is installed, which serializes several times faster
+than the standard library and returns bytes ready to write to the socket,
+and falls back to json otherwise. Values neither encoder understands are
+converted with str(), matching what the HTML responses show.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(data):
+    """Serialize data to UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, default=str, ensure_ascii=False).encode('utf-8')
+
+
+def dumps_line(data):
+    """Serialize data as one newline-terminated NDJSON record"""
+    return dumps(data) + b'\n'
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
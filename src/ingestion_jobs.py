@@ -0,0 +1,140 @@
+"""
+Background document ingestion queue for the Smart Doc Analysis web interface.
+
+Uploads are handed to IngestionJobQueue, which runs extraction and analysis
+on a bounded pool of worker threads and keeps a short history of jobs so the
+browser can poll for progress instead of holding the upload request open.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+
+
+@dataclass
+class IngestionJob:
+    job_id: str
+    filename: str
+    status: str = JOB_QUEUED
+    progress: int = 0
+    stage: str = 'Waiting for a free worker'
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    started_at: str = None
+    finished_at: str = None
+    duration_seconds: float = None
+    error: str = None
+    result: dict = field(default_factory=dict)
+    result_html: str = None
+    owner: str = None            # who submitted it; only they can see it
+
+    def update(self, progress, stage):
+        """Record progress from inside a running job"""
+        self.progress = max(0, min(100, int(progress)))
+        self.stage = stage
+
+    @property
+    def finished(self):
+        return self.status in (JOB_COMPLETED, JOB_FAILED)
+
+    def to_dict(self, include_result=True):
+        data = {
+            'job_id': self.job_id,
+            'filename': self.filename,
+            'status': self.status,
+            'progress': self.progress,
+            'stage': self.stage,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'duration_seconds': self.duration_seconds,
+            'error': self.error
+        }
+        if include_result:
+            data['result'] = self.result
+            data['result_html'] = self.result_html
+        return data
+
+
+class IngestionJobQueue:
+    """Run ingestion jobs on a bounded thread pool and track their status"""
+
+    def __init__(self, max_workers=5, max_history=200):
+        self.max_workers = max(1, int(max_workers))
+        self.max_history = max_history
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ingest')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, filename, func, *args, owner=None, **kwargs):
+        """Queue func(job, *args, **kwargs) on behalf of owner and return the new job
+
+        The function should return the result HTML, or a (result_html,
+        result_dict) tuple, and may call job.update() to report progress.
+        """
+        job = IngestionJob(job_id=uuid.uuid4().hex[:12], filename=filename, owner=owner)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._evict_finished()
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def _run(self, job, func, args, kwargs):
+        started = time.time()
+        job.status = JOB_RUNNING
+        job.started_at = datetime.now().isoformat()
+        job.update(5, 'Starting')
+        try:
+            outcome = func(job, *args, **kwargs)
+            if isinstance(outcome, tuple):
+                job.result_html, job.result = outcome
+            else:
+                job.result_html = outcome
+            job.status = JOB_COMPLETED
+            job.update(100, 'Complete')
+        except Exception as e:
+            print(f"Ingestion job {job.job_id} failed: {e}")
+            job.status = JOB_FAILED
+            job.error = str(e)
+            job.stage = 'Failed'
+        finally:
+            job.finished_at = datetime.now().isoformat()
+            job.duration_seconds = round(time.time() - started, 3)
+
+    def _evict_finished(self):
+        # Drop the oldest finished jobs once history exceeds its cap
+        excess = len(self._jobs) - self.max_history
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished][:excess]:
+            del self._jobs[job_id]
+
+    def get(self, job_id, owner=None):
+        """The job, or None if it is unknown or belongs to someone other than owner"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job if job is not None and job.owner == owner else None
+
+    def list_jobs(self, owner=None):
+        """Return summaries of owner's jobs, newest first"""
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if job.owner == owner]
+        return [job.to_dict(include_result=False) for job in reversed(jobs)]
+
+    def get_stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {JOB_QUEUED: 0, JOB_RUNNING: 0, JOB_COMPLETED: 0, JOB_FAILED: 0}
+        for job in jobs:
+            counts[job.status] += 1
+        return {'max_workers': self.max_workers, 'jobs': counts}
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,194 @@
+"""
+In-memory inverted index over Pathway live data sources.
+
+PathwayIntegration.search_live_data() scans every stored source for each
+keyword. LiveDataIndex keeps postings for source titles, tags and content so
+a multi-keyword lookup is answered in one call, ranked with BM25 and blended
+with each source's own relevance_score. Sources are added incrementally:
+sync_from_store() follows the append-only LiveSourceStore with a cursor, so
+each sync only decodes records written since the previous one.
+"""
+import math
+import re
+import threading
+from collections import Counter
+
+TERM_PATTERN = re.compile(r'[a-z0-9]+')
+
+# Matches in titles and tags say more about a source than body text
+FIELD_WEIGHTS = {'title': 2.0, 'tags': 1.5, 'content': 1.0}
+
+
+def tokenize(text, stop_words=()):
+    return [term for term in TERM_PATTERN.findall(text.lower())
+            if len(term) > 1 and term not in stop_words]
+
+
+class LiveDataIndex:
+    """BM25 inverted index over live sources keyed by source_id"""
+
+    def __init__(self, stop_words=(), relevance_weight=0.3,
+                 context_length=100, k1=1.2, b=0.75):
+        self.stop_words = frozenset(stop_words)
+        self.relevance_weight = relevance_weight
+        self.context_length = context_length
+        self.k1 = k1
+        self.b = b
+
+        self._postings = {}      # term -> {source_id: weighted term frequency}
+        self._sources = {}       # source_id -> source dict
+        self._doc_terms = {}     # source_id -> Counter of weighted terms
+        self._doc_lengths = {}
+        self._total_length = 0.0
+        self._store_cursor = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._sources)
+
+    def _weighted_terms(self, source):
+        terms = Counter()
+        for term in tokenize(source.get('title', ''), self.stop_words):
+            terms[term] += FIELD_WEIGHTS['title']
+        for tag in source.get('tags', []) or []:
+            for term in tokenize(tag.replace('_', ' '), self.stop_words):
+                terms[term] += FIELD_WEIGHTS['tags']
+        for term in tokenize(source.get('content', ''), self.stop_words):
+            terms[term] += FIELD_WEIGHTS['content']
+        return terms
+
+    def add_source(self, source):
+        """Index a source, replacing any older version; returns True if indexed"""
+        source_id = source.get('source_id')
+        if not source_id:
+            return False
+
+        with self._lock:
+            existing = self._sources.get(source_id)
+            if existing is not None:
+                if existing.get('content_hash') and existing.get('content_hash') == source.get('content_hash'):
+                    return False
+                self.remove_source(source_id)
+
+            terms = self._weighted_terms(source)
+            for term, weight in terms.items():
+                self._postings.setdefault(term, {})[source_id] = weight
+
+            length = sum(terms.values())
+            self._sources[source_id] = source
+            self._doc_terms[source_id] = terms
+            self._doc_lengths[source_id] = length
+            self._total_length += length
+            return True
+
+    def remove_source(self, source_id):
+        with self._lock:
+            terms = self._doc_terms.pop(source_id, None)
+            if terms is None:
+                return
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(source_id, None)
+                    if not postings:
+                        del self._postings[term]
+            self._total_length -= self._doc_lengths.pop(source_id, 0.0)
+            del self._sources[source_id]
+
+    def sync_from_store(self, store):
+        """Index sources appended to the live store since the last sync
+
+        Returns the number of sources indexed or dropped. After a compaction
+        the store replays every live source, and sources missing from it are
+        dropped.
+        """
+        with self._lock:
+            records, cursor, complete = store.read_sources_since(self._store_cursor)
+            changed = 0
+            for source in records:
+                if self.add_source(source):
+                    changed += 1
+            if complete:
+                seen = {source.get('source_id') for source in records}
+                for source_id in set(self._sources) - seen:
+                    self.remove_source(source_id)
+                    changed += 1
+            self._store_cursor = cursor
+        return changed
+
+    def search(self, keywords, limit=5):
+        """Rank sources for one or more keywords in a single lookup
+
+        keywords may be a string or a list of strings. Each result is a copy
+        of the source with a 'context' snippet and the blended 'match_score'.
+        """
+        if isinstance(keywords, str):
+            keywords = [keywords]
+        query_terms = set()
+        for keyword in keywords:
+            query_terms.update(tokenize(keyword, self.stop_words))
+        if not query_terms:
+            return []
+
+        with self._lock:
+            total_docs = len(self._sources)
+            if not total_docs:
+                return []
+            avg_length = self._total_length / total_docs or 1.0
+
+            scores = {}
+            for term in query_terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for source_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[source_id] / avg_length)
+                    scores[source_id] = scores.get(source_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+            if not scores:
+                return []
+
+            best = max(scores.values())
+            ranked = []
+            for source_id, score in scores.items():
+                source = self._sources[source_id]
+                relevance = float(source.get('relevance_score', 0.0) or 0.0)
+                blended = (1 - self.relevance_weight) * score / best + self.relevance_weight * relevance
+                ranked.append((blended, source_id))
+            ranked.sort(key=lambda item: (-item[0], item[1]))
+
+            results = []
+            for blended, source_id in ranked[:limit]:
+                result = dict(self._sources[source_id])
+                result['match_score'] = round(blended, 4)
+                result['context'] = self._context(result.get('content', ''), query_terms)
+                results.append(result)
+            return results
+
+    def _context(self, content, query_terms):
+        """Return a snippet of content around the first query term"""
+        lowered = content.lower()
+        first = -1
+        for term in query_terms:
+            index = lowered.find(term)
+            if index >= 0 and (first < 0 or index < first):
+                first = index
+        if first < 0:
+            return content[:self.context_length * 2]
+
+        start = max(0, first - self.context_length)
+        end = min(len(content), first + self.context_length)
+        snippet = content[start:end].strip()
+        if start > 0:
+            snippet = '...' + snippet
+        if end < len(content):
+            snippet += '...'
+        return snippet
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'indexed_sources': len(self._sources),
+                'indexed_terms': len(self._postings)
+            }
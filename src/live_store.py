@@ -0,0 +1,524 @@
+"""
+Append-only, segment-based storage for Pathway live data.
+
+live_data_sources.json (one large dict) and pathway_updates.json (a growing
+array) have to be rewritten and re-parsed in full on every ingest. This
+module stores the same records as JSON Lines instead:
+
+- every write is an append to the active segment, which rolls over to a new
+  file once it reaches segment_max_bytes;
+- sealed segments get an offset index (.idx) mapping each key to its byte
+  offset and length, so opening the store never parses sealed segments;
+- reads go through a memory map and decode only the records they need;
+- keyed logs are compacted when superseded records outnumber live ones,
+  and unkeyed logs keep a bounded number of segments.
+
+Readers that follow the log (such as the live data index) hold a cursor and
+only read records appended after it.
+"""
+import glob
+import hashlib
+import json
+import mmap
+import os
+import threading
+
+DEFAULT_SEGMENT_MAX_BYTES = 4 * 1024 * 1024
+TAIL_CHECK_BYTES = 64
+
+_decoder = json.JSONDecoder()
+
+
+def _read_mapped(path, start=0, end=None):
+    """Return bytes of path[start:end] through a read-only memory map"""
+    size = os.path.getsize(path)
+    end = size if end is None else min(end, size)
+    if end <= start:
+        return b''
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return mapped[start:end]
+
+
+def _skip_whitespace(text, pos):
+    while pos < len(text) and text[pos] in ' \t\r\n':
+        pos += 1
+    return pos
+
+
+def _read_appended(path, offset=None, tail=''):
+    """Decode the items of a JSON array or object file that follow a byte offset
+
+    Returns (items, offset, tail) with the offset just past the last item,
+    or None when the bytes before the offset no longer end with tail, i.e.
+    the file was rewritten rather than appended to. Object files yield
+    their values. Only the bytes after the offset are read and decoded.
+    """
+    head = _read_mapped(path, 0, 4096)
+    container = head.lstrip()[:1]
+    if container not in (b'[', b'{'):
+        raise ValueError(f'{path} is not a JSON array or object')
+    if offset is None:
+        offset = len(head) - len(head.lstrip()) + 1
+    elif offset > os.path.getsize(path) or _read_mapped(path, max(0, offset - TAIL_CHECK_BYTES), offset).hex() != tail:
+        return None
+
+    text = _read_mapped(path, offset).decode('utf-8')
+    closing = ']' if container == b'[' else '}'
+    items = []
+    pos = end = 0
+    while True:
+        pos = _skip_whitespace(text, pos)
+        if pos < len(text) and text[pos] == ',':
+            pos = _skip_whitespace(text, pos + 1)
+        if pos >= len(text):
+            raise ValueError(f'{path} ends before its closing {closing!r}')
+        if text[pos] == closing:
+            break
+        if closing == '}':
+            _, pos = _decoder.raw_decode(text, pos)
+            pos = _skip_whitespace(text, pos)
+            if text[pos:pos + 1] != ':':
+                raise ValueError(f'{path}: expected ":" at character {pos}')
+            pos = _skip_whitespace(text, pos + 1)
+        item, pos = _decoder.raw_decode(text, pos)
+        items.append(item)
+        end = pos
+
+    offset += len(text[:end].encode('utf-8'))
+    return items, offset, _read_mapped(path, max(0, offset - TAIL_CHECK_BYTES), offset).hex()
+
+
+def _fingerprint(record):
+    return hashlib.sha1(json.dumps(record, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class SegmentLog:
+    """JSON Lines log split into numbered segment files"""
+
+    def __init__(self, directory, name, key_field=None,
+                 segment_max_bytes=DEFAULT_SEGMENT_MAX_BYTES, retain_segments=None):
+        self.directory = os.path.join(directory, name)
+        self.name = name
+        self.key_field = key_field
+        self.segment_max_bytes = segment_max_bytes
+        self.retain_segments = retain_segments
+        self.generation = 0
+
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._segments = []          # segment numbers, oldest first
+        self._offsets = {}           # key -> (segment, offset, length)
+        self._segment_records = {}   # segment -> number of records
+        os.makedirs(self.directory, exist_ok=True)
+
+    @property
+    def _record_count(self):
+        return sum(self._segment_records.values())
+
+    def _segment_path(self, number, suffix='.jsonl'):
+        return os.path.join(self.directory, f"segment-{number:06d}{suffix}")
+
+    def _ensure_loaded(self):
+        """Build the offset index from .idx files plus a scan of the active segment"""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            numbers = sorted(
+                int(os.path.basename(path)[8:14])
+                for path in glob.glob(os.path.join(self.directory, 'segment-*.jsonl'))
+            )
+            self._segments = numbers or [1]
+            for number in self._segments[:-1]:
+                if not self._load_segment_index(number):
+                    self._scan_segment(number)
+            self._scan_segment(self._segments[-1], repair=True)
+            self._loaded = True
+
+    def _load_segment_index(self, number):
+        index_path = self._segment_path(number, '.idx')
+        if not os.path.exists(index_path):
+            return False
+        with open(index_path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        self._segment_records[number] = entries.get('records', 0)
+        for key, offset, length in entries.get('keys', []):
+            self._offsets[key] = (number, offset, length)
+        return True
+
+    def _scan_segment(self, number, repair=False):
+        """Index a segment by parsing it; optionally truncate a torn last line"""
+        path = self._segment_path(number)
+        if not os.path.exists(path):
+            return
+        data = _read_mapped(path)
+        offset = 0
+        while offset < len(data):
+            end = data.find(b'\n', offset)
+            if end < 0:
+                # A crash mid-append leaves a partial record without a newline
+                if repair:
+                    with open(path, 'r+b') as f:
+                        f.truncate(offset)
+                break
+            line = data[offset:end]
+            if line.strip():
+                self._segment_records[number] = self._segment_records.get(number, 0) + 1
+                if self.key_field:
+                    try:
+                        key = json.loads(line).get(self.key_field)
+                    except ValueError:
+                        key = None
+                    if key is not None:
+                        self._offsets[key] = (number, offset, end - offset)
+            offset = end + 1
+
+    def _write_segment_index(self, number):
+        keys = [[key, offset, length] for key, (segment, offset, length) in self._offsets.items()
+                if segment == number]
+        records = self._segment_records.get(number, 0)
+        tmp_path = self._segment_path(number, '.idx.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'records': records, 'keys': keys}, f)
+        os.replace(tmp_path, self._segment_path(number, '.idx'))
+
+    def append(self, records, fsync=False):
+        """Append records to the active segment, rolling it over when full"""
+        if not records:
+            return 0
+        self._ensure_loaded()
+        with self._lock:
+            number = self._segments[-1]
+            path = self._segment_path(number)
+            with open(path, 'ab') as f:
+                offset = f.tell()
+                for record in records:
+                    line = json.dumps(record, separators=(',', ':')).encode('utf-8')
+                    f.write(line + b'\n')
+                    if self.key_field and record.get(self.key_field) is not None:
+                        self._offsets[record[self.key_field]] = (number, offset, len(line))
+                    offset += len(line) + 1
+                self._segment_records[number] = self._segment_records.get(number, 0) + len(records)
+                f.flush()
+                if fsync:
+                    os.fsync(f.fileno())
+
+            if offset >= self.segment_max_bytes:
+                self._roll_segment()
+            return len(records)
+
+    def _roll_segment(self):
+        sealed = self._segments[-1]
+        self._write_segment_index(sealed)
+        self._segments.append(sealed + 1)
+        open(self._segment_path(sealed + 1), 'ab').close()
+
+        if self.retain_segments and len(self._segments) > self.retain_segments:
+            for number in self._segments[:-self.retain_segments]:
+                self._drop_segment(number)
+            self._segments = self._segments[-self.retain_segments:]
+            self.generation += 1
+
+    def _drop_segment(self, number):
+        for suffix in ('.jsonl', '.idx'):
+            try:
+                os.unlink(self._segment_path(number, suffix))
+            except OSError:
+                pass
+        self._segment_records.pop(number, None)
+        if self.key_field:
+            self._offsets = {key: entry for key, entry in self._offsets.items() if entry[0] != number}
+
+    def get(self, key):
+        """Read the latest record for key through the offset index"""
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._offsets.get(key)
+            if entry is None:
+                return None
+            number, offset, length = entry
+            # Read under the lock so compaction can't remove the segment first
+            return json.loads(_read_mapped(self._segment_path(number), offset, offset + length))
+
+    def keys(self):
+        self._ensure_loaded()
+        with self._lock:
+            return list(self._offsets)
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._offsets) if self.key_field else self._record_count
+
+    def read_since(self, cursor=None):
+        """Return (records, cursor, complete) for everything after cursor
+
+        complete is True when the records are a full replay (no cursor, or the
+        log was compacted since the cursor was taken), so the caller should
+        treat keys missing from it as deleted.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            return self._read_since_locked(cursor)
+
+    def _read_since_locked(self, cursor):
+        segments = list(self._segments)
+        generation = self.generation
+
+        complete = cursor is None or cursor[0] != generation
+        start_segment, start_offset = (segments[0], 0) if complete else (cursor[1], cursor[2])
+
+        records = []
+        end_cursor = (generation, segments[-1], 0)
+        for number in segments:
+            if number < start_segment:
+                continue
+            path = self._segment_path(number)
+            if not os.path.exists(path):
+                continue
+            offset = start_offset if number == start_segment else 0
+            data = _read_mapped(path, offset)
+            consumed = data.rfind(b'\n') + 1
+            for line in data[:consumed].split(b'\n'):
+                if line.strip():
+                    records.append(json.loads(line))
+            end_cursor = (generation, number, offset + consumed)
+        return records, end_cursor, complete
+
+    def read_latest(self, count):
+        """Return up to count most recent records, newest last"""
+        self._ensure_loaded()
+        with self._lock:
+            segments = list(self._segments)
+        records = []
+        for number in reversed(segments):
+            path = self._segment_path(number)
+            if not os.path.exists(path):
+                continue
+            lines = [line for line in _read_mapped(path).split(b'\n') if line.strip()]
+            records[:0] = [json.loads(line) for line in lines[-(count - len(records)):]]
+            if len(records) >= count:
+                break
+        return records
+
+    def compact(self, min_dead_ratio=0.5):
+        """Rewrite a keyed log keeping only the latest record per key"""
+        if not self.key_field:
+            return False
+        self._ensure_loaded()
+        with self._lock:
+            live = len(self._offsets)
+            dead = self._record_count - live
+            if self._record_count == 0 or dead / self._record_count < min_dead_ratio:
+                return False
+
+            records = [self.get(key) for key in list(self._offsets)]
+            old_segments = list(self._segments)
+            number = old_segments[-1] + 1
+            path = self._segment_path(number)
+            tmp_path = path + '.tmp'
+
+            offsets = {}
+            offset = 0
+            with open(tmp_path, 'wb') as f:
+                for record in records:
+                    line = json.dumps(record, separators=(',', ':')).encode('utf-8')
+                    f.write(line + b'\n')
+                    offsets[record[self.key_field]] = (number, offset, len(line))
+                    offset += len(line) + 1
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+
+            for old in old_segments:
+                for suffix in ('.jsonl', '.idx'):
+                    try:
+                        os.unlink(self._segment_path(old, suffix))
+                    except OSError:
+                        pass
+
+            self._segments = [number]
+            self._offsets = offsets
+            self._segment_records = {number: len(records)}
+            self.generation += 1
+            return True
+
+    def get_stats(self):
+        self._ensure_loaded()
+        with self._lock:
+            size = sum(os.path.getsize(self._segment_path(number))
+                       for number in self._segments if os.path.exists(self._segment_path(number)))
+            return {
+                'segments': len(self._segments),
+                'records': self._record_count,
+                'live_keys': len(self._offsets) if self.key_field else None,
+                'bytes': size
+            }
+
+
+class LiveSourceStore:
+    """Append-only store for live sources and Pathway update-cycle history"""
+
+    def __init__(self, directory, segment_max_bytes=DEFAULT_SEGMENT_MAX_BYTES,
+                 compact_ratio=0.5, retain_update_segments=8,
+                 legacy_sources_path=None, legacy_updates_path=None, dedup=None):
+        self.directory = directory
+        self.compact_ratio = compact_ratio
+        self.dedup = dedup
+        self.legacy_sources_path = legacy_sources_path
+        self.legacy_updates_path = legacy_updates_path
+
+        self.sources = SegmentLog(directory, 'sources', key_field='source_id',
+                                  segment_max_bytes=segment_max_bytes)
+        self.updates = SegmentLog(directory, 'updates', segment_max_bytes=segment_max_bytes,
+                                  retain_segments=retain_update_segments)
+        self._meta_path = os.path.join(directory, 'store_meta.json')
+        self._meta = None
+        # Reentrant: a refresh cycle holds it across Pathway's update and its own import
+        self.import_lock = threading.RLock()
+
+    def _load_meta(self):
+        if self._meta is None:
+            try:
+                with open(self._meta_path, 'r', encoding='utf-8') as f:
+                    self._meta = json.load(f)
+            except (OSError, ValueError):
+                self._meta = {}
+        return self._meta
+
+    def _save_meta(self):
+        tmp_path = self._meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._meta, f)
+        os.replace(tmp_path, self._meta_path)
+
+    def append_sources(self, sources):
+        """Append new or changed sources; unchanged content_hash values are skipped
+
+        With a dedup index, sources whose content was already stored under
+        another source_id (re-published articles) are skipped as well.
+        """
+        fresh = []
+        for source in sources:
+            source_id = source.get('source_id')
+            current = self.sources.get(source_id)
+            if current and current.get('content_hash') and current.get('content_hash') == source.get('content_hash'):
+                continue
+            if self.dedup is not None:
+                content = source.get('content', '')
+                digest = source.get('content_hash') or self.dedup.digest_text(content)
+                if self.dedup.lookup('live', digest, text=content, ref=source_id):
+                    continue
+                self.dedup.add('live', digest, source_id, text=content)
+            fresh.append(source)
+        self.sources.append(fresh)
+        self.sources.compact(self.compact_ratio)
+        return fresh
+
+    def append_update(self, update):
+        self.updates.append([update])
+
+    def get_source(self, source_id):
+        return self.sources.get(source_id)
+
+    def read_sources_since(self, cursor=None):
+        return self.sources.read_since(cursor)
+
+    def recent_updates(self, count=10):
+        return self.updates.read_latest(count)
+
+    def import_legacy_changes(self, wait=True):
+        """Append anything new in Pathway's JSON files since the last import
+
+        Kept for compatibility while PathwayIntegration still rewrites its
+        JSON files. A file is only looked at when its mtime or size changes,
+        and then only the bytes after the last imported item are decoded;
+        the whole file is re-read only if Pathway rewrote the part already
+        imported. Returns the number of sources appended; with wait=False,
+        0 right away if another thread holds import_lock.
+        """
+        if not self.import_lock.acquire(blocking=wait):
+            return 0
+        try:
+            return self._import_legacy_changes()
+        finally:
+            self.import_lock.release()
+
+    def _import_legacy_changes(self):
+        meta = self._load_meta()
+        imported = 0
+        changed = False
+
+        signature = self._signature(self.legacy_sources_path)
+        if signature and signature != meta.get('sources_signature'):
+            try:
+                sources, _ = self._read_legacy(meta, 'sources', self.legacy_sources_path)
+                imported = len(self.append_sources(sources))
+                meta['sources_signature'] = signature
+                changed = True
+            except (OSError, ValueError) as e:
+                print(f"Live store import skipped: {e}")
+
+        signature = self._signature(self.legacy_updates_path)
+        if signature and signature != meta.get('updates_signature'):
+            try:
+                updates, rewritten = self._read_legacy(meta, 'updates', self.legacy_updates_path)
+                if rewritten:
+                    updates = self._unseen_updates(meta, updates)
+                self.updates.append(updates)
+                if updates:
+                    meta['updates_last'] = _fingerprint(updates[-1])
+                meta.pop('updates_imported', None)
+                meta['updates_signature'] = signature
+                changed = True
+            except (OSError, ValueError) as e:
+                print(f"Live store import skipped: {e}")
+
+        if changed:
+            self._save_meta()
+        return imported
+
+    @staticmethod
+    def _read_legacy(meta, name, path):
+        """(items, rewritten): items appended to path since the last import, or all of them if it was rewritten"""
+        result = None
+        if meta.get(f'{name}_offset') is not None:
+            result = _read_appended(path, meta[f'{name}_offset'], meta.get(f'{name}_tail', ''))
+        rewritten = result is None
+        if rewritten:
+            result = _read_appended(path)
+        items, meta[f'{name}_offset'], meta[f'{name}_tail'] = result
+        return items, rewritten
+
+    @staticmethod
+    def _unseen_updates(meta, updates):
+        """Updates after the last one imported, for a rewritten (e.g. capped) history"""
+        last = meta.get('updates_last')
+        if last:
+            fingerprints = [_fingerprint(update) for update in updates]
+            if last in fingerprints:
+                return updates[len(fingerprints) - fingerprints[::-1].index(last):]
+            return updates
+        # Stores imported before offsets were tracked recorded a list index
+        return updates[meta.get('updates_imported', 0):]
+
+    def legacy_signature(self):
+        """Cheap change token for the legacy JSON files Pathway writes to"""
+        return [self._signature(self.legacy_sources_path), self._signature(self.legacy_updates_path)]
+
+    @staticmethod
+    def _signature(path):
+        if not path:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def get_stats(self):
+        return {
+            'sources': self.sources.get_stats(),
+            'updates': self.updates.get_stats()
+        }
@@ -0,0 +1,169 @@
+"""
+Local mock feed server for exercising live ingestion without the network.
+
+Serves feeds/<n>.json (JSON Feed) and feeds/<n>.rss (RSS 2.0). Each feed
+gains a new item every new_item_seconds, answers conditional requests with
+304 Not Modified when nothing changed, and fails with 503 plus Retry-After
+at error_rate, so polling intervals, conditional requests and backoff can
+all be watched against it:
+
+    python src/mock_feed_server.py --port 8765 --feeds 20 --error-rate 0.05
+
+With development.testing.use_mock_online_sources enabled, the web interface
+starts one of these in-process and points live ingestion at it.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+TOPICS = ['machine learning', 'climate research', 'renewable energy', 'public health',
+          'semiconductors', 'space exploration', 'data privacy', 'quantum computing']
+MAX_ITEMS = 20
+
+
+class MockFeedServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, server_address, feeds=10, new_item_seconds=20, error_rate=0.0):
+        super().__init__(server_address, MockFeedHandler)
+        self.feeds = feeds
+        self.new_item_seconds = new_item_seconds
+        self.error_rate = error_rate
+        self.started = time.time()
+        self.counters = {'requests': 0, 'ok': 0, 'not_modified': 0, 'errors': 0}
+        self._lock = threading.Lock()
+
+    def count(self, key):
+        with self._lock:
+            self.counters['requests'] += 1
+            self.counters[key] += 1
+
+    def feed_urls(self, extension='json'):
+        host, port = self.server_address[:2]
+        host = 'localhost' if host in ('', '0.0.0.0') else host
+        return [f'http://{host}:{port}/feeds/{number}.{extension}' for number in range(1, self.feeds + 1)]
+
+    def items(self, number):
+        """Items published so far, newest first; feeds are staggered so they change at different times"""
+        offset = (number * 7919) % max(1, int(self.new_item_seconds))
+        published = int((time.time() - self.started + offset) // self.new_item_seconds) + 1
+        items = []
+        for index in range(published, max(0, published - MAX_ITEMS), -1):
+            topic = TOPICS[(number + index) % len(TOPICS)]
+            timestamp = self.started - offset + (index - 1) * self.new_item_seconds
+            items.append({
+                'id': f'feed-{number}-item-{index}',
+                'title': f'Update {index} on {topic} from feed {number}',
+                'content': f'Feed {number} reports development {index} in {topic}. '
+                           f'Researchers describe new results on {topic} and what they mean for practitioners.',
+                'url': f'https://example.com/feeds/{number}/items/{index}',
+                'author': f'Mock Reporter {number}',
+                'timestamp': timestamp,
+                'tags': [topic.replace(' ', '_'), f'feed_{number}']
+            })
+        return items
+
+
+class MockFeedHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        name = path.rsplit('/', 1)[-1]
+        number, _, extension = name.partition('.')
+        if not path.startswith('/feeds/') or not number.isdigit() or extension not in ('json', 'rss') \
+                or not 1 <= int(number) <= self.server.feeds:
+            self.send_error(404)
+            return
+
+        if random.random() < self.server.error_rate:
+            self.server.count('errors')
+            self.send_response(503)
+            self.send_header('Retry-After', '2')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        items = self.server.items(int(number))
+        etag = f'"{number}-{items[0]["id"]}-{extension}"'
+        last_modified = formatdate(items[0]['timestamp'], usegmt=True)
+        if self.headers.get('If-None-Match') == etag:
+            self.server.count('not_modified')
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', last_modified)
+            self.end_headers()
+            return
+
+        if extension == 'json':
+            body = json.dumps({
+                'version': 'https://jsonfeed.org/version/1.1',
+                'title': f'Mock feed {number}',
+                'items': [{
+                    'id': item['id'],
+                    'title': item['title'],
+                    'content_text': item['content'],
+                    'url': item['url'],
+                    'authors': [{'name': item['author']}],
+                    'date_published': formatdate(item['timestamp'], usegmt=True),
+                    'tags': item['tags']
+                } for item in items]
+            }).encode('utf-8')
+            content_type = 'application/feed+json'
+        else:
+            entries = ''.join(
+                f"<item><guid>{item['id']}</guid><title>{escape(item['title'])}</title>"
+                f"<link>{item['url']}</link><description>{escape(item['content'])}</description>"
+                f"<author>{escape(item['author'])}</author>"
+                f"<pubDate>{formatdate(item['timestamp'], usegmt=True)}</pubDate>"
+                + ''.join(f'<category>{tag}</category>' for tag in item['tags'])
+                + '</item>'
+                for item in items
+            )
+            body = (f'<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+                    f'<title>Mock feed {number}</title>{entries}</channel></rss>').encode('utf-8')
+            content_type = 'application/rss+xml'
+
+        self.server.count('ok')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', last_modified)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_feed_server(port=0, feeds=10, new_item_seconds=20, error_rate=0.0):
+    """Serve mock feeds on a daemon thread; returns the server, whose feed_urls() lists the feeds"""
+    server = MockFeedServer(('localhost', port), feeds, new_item_seconds, error_rate)
+    threading.Thread(target=server.serve_forever, name='mock-feeds', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve mock live feeds for ingestion testing')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--feeds', type=int, default=10)
+    parser.add_argument('--new-item-seconds', type=float, default=20)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = MockFeedServer(('localhost', args.port), args.feeds, args.new_item_seconds, args.error_rate)
+    print(f"📡 Serving {args.feeds} mock feeds at http://localhost:{args.port}/feeds/<n>.json (or .rss)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n👋 Stopped ({server.counters})")
+
+
+if __name__ == '__main__':
+    main()
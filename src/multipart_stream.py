@@ -0,0 +1,242 @@
+"""
+Incremental multipart/form-data parser for document uploads.
+
+The request body is read from the socket in fixed-size chunks and file parts
+are written straight to temporary files, so peak memory per upload stays at
+roughly one chunk plus the boundary length no matter how large the file is.
+When a hash algorithm is given, each file's digest is computed on the same
+pass, so duplicate detection never has to re-read the upload.
+Boundaries are located with bytearray.find on the rolling buffer, and only
+the tail that could still hold a partial boundary is carried over between
+chunks.
+"""
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass, field
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+MAX_HEADER_SIZE = 16 * 1024
+MAX_FIELD_SIZE = 1024 * 1024
+
+
+class MultipartError(ValueError):
+    """Raised when the request body is not valid multipart/form-data"""
+
+
+class UploadTooLarge(MultipartError):
+    """Raised when an uploaded file exceeds the configured size limit"""
+
+    def __init__(self, limit_bytes):
+        self.limit_bytes = limit_bytes
+        super().__init__(f"File exceeds the maximum upload size of {limit_bytes // (1024 * 1024)} MB")
+
+
+@dataclass
+class UploadedFile:
+    field_name: str
+    filename: str
+    path: str
+    size: int = 0
+    content_type: str = 'application/octet-stream'
+    digest: str = None
+
+
+@dataclass
+class MultipartForm:
+    fields: dict = field(default_factory=dict)
+    files: list = field(default_factory=list)
+
+    def first_file(self):
+        """Return the first non-empty uploaded file, if any"""
+        for upload in self.files:
+            if upload.size > 0:
+                return upload
+        return None
+
+    def cleanup(self):
+        """Delete the temporary files backing every uploaded part"""
+        for upload in self.files:
+            try:
+                os.unlink(upload.path)
+            except OSError:
+                pass
+
+
+def get_boundary(content_type):
+    """Extract the multipart boundary from a Content-Type header"""
+    if not content_type or 'multipart/form-data' not in content_type.lower():
+        raise MultipartError("Expected a multipart/form-data request")
+
+    for param in content_type.split(';')[1:]:
+        key, _, value = param.strip().partition('=')
+        if key.lower() == 'boundary' and value:
+            return value.strip('"').encode('latin-1')
+    raise MultipartError("Multipart boundary missing from Content-Type")
+
+
+def _parse_part_headers(raw_headers):
+    headers = {}
+    for line in raw_headers.decode('utf-8', 'replace').split('\r\n'):
+        name, sep, value = line.partition(':')
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+
+    disposition = {}
+    for item in headers.get('content-disposition', '').split(';')[1:]:
+        key, _, value = item.strip().partition('=')
+        disposition[key.lower()] = value.strip().strip('"')
+    return headers, disposition
+
+
+class MultipartStreamParser:
+    """Stream a multipart body from a file-like object into temp files"""
+
+    def __init__(self, stream, content_type, content_length, max_file_size=None,
+                 chunk_size=DEFAULT_CHUNK_SIZE, upload_dir=None, hash_algorithm=None):
+        self.stream = stream
+        self.boundary = get_boundary(content_type)
+        self.remaining = int(content_length or 0)
+        self.max_file_size = max_file_size
+        self.chunk_size = chunk_size
+        self.upload_dir = upload_dir
+        self.hash_algorithm = hash_algorithm
+
+        if self.remaining <= 0:
+            raise MultipartError("Empty request body")
+
+        # The first boundary may start the body; every later one follows a CRLF
+        self._first_delimiter = b'--' + self.boundary
+        self._delimiter = b'\r\n--' + self.boundary
+        self._buffer = bytearray()
+
+    def _fill(self):
+        """Read one more chunk into the buffer, returning False at end of body"""
+        if self.remaining <= 0:
+            return False
+        data = self.stream.read(min(self.chunk_size, self.remaining))
+        if not data:
+            return False
+        self.remaining -= len(data)
+        self._buffer += data
+        return True
+
+    def _read_until(self, marker, limit):
+        """Buffer until marker is found, returning its index"""
+        start = 0
+        while True:
+            index = self._buffer.find(marker, start)
+            if index >= 0:
+                return index
+            if len(self._buffer) > limit:
+                raise MultipartError("Multipart headers too large")
+            start = max(0, len(self._buffer) - len(marker) + 1)
+            if not self._fill():
+                raise MultipartError("Unexpected end of multipart body")
+
+    def _ensure(self, size):
+        while len(self._buffer) < size:
+            if not self._fill():
+                raise MultipartError("Unexpected end of multipart body")
+
+    def _drain(self):
+        """Discard any trailing epilogue so the connection stays in sync"""
+        self._buffer.clear()
+        while self.remaining > 0 and self._fill():
+            self._buffer.clear()
+
+    def parse(self):
+        """Parse the whole body, returning a MultipartForm"""
+        form = MultipartForm()
+        try:
+            index = self._read_until(self._first_delimiter, MAX_HEADER_SIZE)
+            del self._buffer[:index + len(self._first_delimiter)]
+
+            while True:
+                self._ensure(2)
+                if self._buffer[:2] == b'--':
+                    break
+                if self._buffer[:2] != b'\r\n':
+                    raise MultipartError("Malformed multipart boundary")
+                del self._buffer[:2]
+
+                header_end = self._read_until(b'\r\n\r\n', MAX_HEADER_SIZE)
+                headers, disposition = _parse_part_headers(bytes(self._buffer[:header_end]))
+                del self._buffer[:header_end + 4]
+
+                name = disposition.get('name', '')
+                if 'filename' in disposition:
+                    upload = self._stream_file_part(name, disposition['filename'], headers)
+                    form.files.append(upload)
+                else:
+                    form.fields[name] = self._read_field_part()
+
+            self._drain()
+            return form
+        except Exception:
+            form.cleanup()
+            raise
+
+    def _stream_file_part(self, name, filename, headers):
+        filename = os.path.basename(filename.replace('\\', '/')) or 'uploaded_file'
+        suffix = os.path.splitext(filename)[1]
+        tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=self.upload_dir)
+        upload = UploadedFile(
+            field_name=name,
+            filename=filename,
+            path=tmp_file.name,
+            content_type=headers.get('content-type', 'application/octet-stream')
+        )
+        hasher = hashlib.new(self.hash_algorithm) if self.hash_algorithm else None
+        try:
+            with tmp_file:
+                for piece in self._iter_part_body():
+                    upload.size += len(piece)
+                    if self.max_file_size and upload.size > self.max_file_size:
+                        raise UploadTooLarge(self.max_file_size)
+                    tmp_file.write(piece)
+                    if hasher is not None:
+                        hasher.update(piece)
+            if hasher is not None:
+                upload.digest = hasher.hexdigest()
+        except Exception:
+            try:
+                os.unlink(upload.path)
+            except OSError:
+                pass
+            raise
+        return upload
+
+    def _read_field_part(self):
+        value = bytearray()
+        for piece in self._iter_part_body():
+            value += piece
+            if len(value) > MAX_FIELD_SIZE:
+                raise MultipartError("Form field too large")
+        return value.decode('utf-8', 'replace')
+
+    def _iter_part_body(self):
+        """Yield memoryviews over the part body up to the next boundary"""
+        delimiter = self._delimiter
+        keep = len(delimiter) - 1
+        search_from = 0
+
+        while True:
+            index = self._buffer.find(delimiter, search_from)
+            if index >= 0:
+                if index:
+                    with memoryview(self._buffer) as view, view[:index] as piece:
+                        yield piece
+                del self._buffer[:index + len(delimiter)]
+                return
+
+            # Everything except a possible partial delimiter is safe to flush
+            flushable = len(self._buffer) - keep
+            if flushable > 0:
+                with memoryview(self._buffer) as view, view[:flushable] as piece:
+                    yield piece
+                del self._buffer[:flushable]
+
+            search_from = max(0, len(self._buffer) - keep)
+            if not self._fill():
+                raise MultipartError("Unexpected end of multipart body")
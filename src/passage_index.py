@@ -0,0 +1,998 @@
+"""
+Passage-level index over uploaded documents.
+
+Searches used to hand whole documents to the research assistant, and live
+data was matched on only the first 500 characters of each upload. The
+PassageIndex splits every document into overlapping windows of
+passage_words words (consecutive windows share overlap_words) and indexes
+those passages, so a search returns the few passages that answer it, each
+with its character offsets in the document.
+
+The index is a log-structured merge tree of segments. Recently added
+documents live in a MemorySegment: one pair of typed arrays per term
+(passage numbers and term frequencies), and parallel arrays for each
+passage's document, offsets and length. Every change is first appended to
+a write-ahead log (a SegmentLog), so an upload costs only the indexing of
+its own text and is searchable immediately. Once the memory segment holds
+memory_max_passages passages it is frozen and a background thread writes
+it out as a disk_index.DiskSegment, then merges merge_factor disk segments
+of similar size into one whenever that many accumulate. Disk segments are
+memory-mapped, so a restart opens them without reading the corpus and
+replays only the logs not yet flushed. Newer segments supersede the
+copies of their documents in older ones, which stay masked out until a
+merge rewrites them.
+
+Passages are ranked with BM25 over statistics summed across segments, and
+numbered globally in segment order, oldest first. Scoring uses NumPy
+through vector_scoring.BM25Matrix when it is installed and dict loops over
+the postings otherwise; both give identical rankings. Passages scoring
+below relevance_threshold (relative to the best) are dropped.
+
+When NumPy is installed and semantic_dimensions is above zero, passages are
+also embedded with LSA (see semantic_model). Each passage is folded into
+the term space of a randomized SVD of the TF-IDF matrix as it is indexed,
+and so is each query, so cosine similarity can be blended into the BM25
+score and passages that use related words rank even without an exact term
+match. Disk segments keep their passage vectors in a memory-mapped file.
+The SVD is recomputed on the maintenance thread once the passages indexed
+since it was built exceed semantic_rebuild_ratio of those it was built
+from; until the first one is built, searches are lexical only.
+"""
+import bisect
+import heapq
+import json
+import math
+import os
+import re
+import shutil
+import threading
+from array import array
+from collections import Counter
+from datetime import datetime
+
+import vector_scoring
+from disk_index import DiskSegment, write_segment
+from live_index import tokenize
+from live_store import SegmentLog
+from semantic_model import SemanticModel, bm25_idf, load_vectors, save_vectors
+from vector_scoring import BM25Matrix, top_k
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+WORD_PATTERN = re.compile(r'\S+')
+
+# Weaker similarities are mostly noise from the low-rank approximation
+SEMANTIC_MIN_SIMILARITY = 0.3
+
+# Distinct terms whose BM25 weights are cached per segment between changes
+SCORING_CACHE_TERMS = 4096
+
+MANIFEST = 'index.json'
+# Layout of indexes written before segments existed: the document log only
+LEGACY_MANIFEST = {'segments': [], 'wals': ['documents'], 'next': 1}
+
+
+def split_passages(text, passage_words=120, overlap_words=30):
+    """(start, end) character offsets of overlapping windows of passage_words words"""
+    bounds = [(match.start(), match.end()) for match in WORD_PATTERN.finditer(text)]
+    if not bounds:
+        return []
+    step = max(1, passage_words - overlap_words)
+    spans = []
+    for first in range(0, len(bounds), step):
+        last = min(first + passage_words, len(bounds)) - 1
+        spans.append((bounds[first][0], bounds[last][1]))
+        if last == len(bounds) - 1:
+            break
+    return spans
+
+
+def top_terms(text, stop_words=(), count=10, idf=None):
+    """Most characteristic terms of text: frequency, weighted by idf(term) when given"""
+    counts = Counter(term for term in tokenize(text, stop_words) if len(term) > 3 and not term.isdigit())
+    if idf is not None:
+        scored = {term: tf * idf(term) for term, tf in counts.items()}
+    else:
+        scored = counts
+    return [term for term, _ in sorted(scored.items(), key=lambda item: (-item[1], item[0]))[:count]]
+
+
+class MemorySegment:
+    """Mutable passage segment held in typed arrays; same read interface as DiskSegment"""
+
+    name = 'memory'
+
+    def __init__(self, stop_words=(), passage_words=120, overlap_words=30, compact_ratio=0.5, wals=()):
+        self.stop_words = stop_words
+        self.passage_words = passage_words
+        self.overlap_words = overlap_words
+        self.compact_ratio = compact_ratio
+        self.wals = list(wals)            # logs holding this segment's documents
+        self.deleted = set()              # names removed while this segment was active
+        self.frozen = False               # set once queued for flushing; arrays then stay put
+        self.scoring_cache = None         # (statistics version, {term: BM25 weights}), kept by PassageIndex
+        self.semantic = None              # SemanticModel the passages are embedded with, set by PassageIndex
+        self.compactions = 0              # passages are renumbered on each
+        self.origin = self                # segment a snapshot() was copied from
+        self._reset()
+
+    def _reset(self):
+        self._term_ids = {}               # term -> term number
+        self._posting_passages = []       # term number -> array('I') of passage numbers
+        self._posting_freqs = []          # term number -> array('f') of term frequencies
+        self._df = array('I')             # term number -> live passages containing it
+
+        self._passage_doc = array('I')    # passage number -> document number
+        self._passage_start = array('I')
+        self._passage_end = array('I')
+        self._passage_length = array('f')
+        self._passage_live = bytearray()
+
+        self._doc_names = []              # document number -> name
+        self._doc_ids = {}                # name -> current document number
+        self._doc_texts = {}              # document number -> text
+        self._doc_passages = {}           # document number -> range of its passage numbers
+        self.live_passages = 0
+        self.total_length = 0.0
+        self._lengths_np = None           # float64 copies for vectorized scoring, dropped on change
+        self._live_np = None
+        self._vectors = array('f')        # passage number -> unit vector (semantic.rank floats)
+        self._vectors_np = None
+
+    @property
+    def passages(self):
+        return len(self._passage_doc)
+
+    def __len__(self):
+        return len(self._doc_ids)
+
+    def add(self, name, text):
+        """Index (or re-index) a document's passages; returns the number of passages"""
+        self.shadow(name)
+        doc_id = len(self._doc_names)
+        self._doc_names.append(name)
+        self._doc_ids[name] = doc_id
+        self._doc_texts[doc_id] = text
+
+        first = len(self._passage_doc)
+        for start, end in split_passages(text, self.passage_words, self.overlap_words):
+            terms = Counter(tokenize(text[start:end], self.stop_words))
+            passage = len(self._passage_doc)
+            for term, tf in terms.items():
+                term_id = self._term_ids.get(term)
+                if term_id is None:
+                    term_id = len(self._posting_passages)
+                    self._term_ids[term] = term_id
+                    self._posting_passages.append(array('I'))
+                    self._posting_freqs.append(array('f'))
+                    self._df.append(0)
+                self._posting_passages[term_id].append(passage)
+                self._posting_freqs[term_id].append(tf)
+                self._df[term_id] += 1
+            length = sum(terms.values())
+            if self.semantic is not None:
+                self._vectors.frombytes(self.semantic.embed(terms).tobytes())
+            self._passage_doc.append(doc_id)
+            self._passage_start.append(start)
+            self._passage_end.append(end)
+            self._passage_length.append(length)
+            self._passage_live.append(1)
+            self.live_passages += 1
+            self.total_length += length
+        self._doc_passages[doc_id] = range(first, len(self._passage_doc))
+        self._lengths_np = self._live_np = self._vectors_np = None
+        self._maybe_compact()
+        return len(self._doc_passages[self._doc_ids[name]])
+
+    def shadow(self, name, tokenize_passage=None):
+        """Drop a document's passages; returns True if it was here"""
+        doc_id = self._doc_ids.pop(name, None)
+        if doc_id is None:
+            return False
+        # Texts and ranges stay until compaction, so a flush in progress can still read them
+        text = self._doc_texts[doc_id]
+        for passage in self._doc_passages[doc_id]:
+            # Terms are re-derived from the text rather than stored per passage
+            for term in set(tokenize(text[self._passage_start[passage]:self._passage_end[passage]], self.stop_words)):
+                self._df[self._term_ids[term]] -= 1
+            self._passage_live[passage] = 0
+            self.live_passages -= 1
+            self.total_length -= self._passage_length[passage]
+        self._live_np = None
+        self._maybe_compact()
+        return True
+
+    def _maybe_compact(self):
+        """Rebuild the arrays once dead passages outnumber live ones"""
+        dead = len(self._passage_doc) - self.live_passages
+        if dead and dead >= self.compact_ratio * len(self._passage_doc) and not self.frozen:
+            documents = [(self._doc_names[doc_id], self._doc_texts[doc_id]) for doc_id in self.live_documents()]
+            self.compactions += 1
+            self._reset()
+            for name, text in documents:
+                self.add(name, text)
+
+    def set_semantic(self, model, vectors=None):
+        """Embed the passages with model; vectors, if given, holds those of the first passages already"""
+        self.semantic = model
+        self._vectors = array('f')
+        self._vectors_np = None
+        if model is None:
+            return
+        first = 0
+        if vectors is not None:
+            first = len(vectors)
+            self._vectors.frombytes(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        for passage in range(first, self.passages):
+            self._vectors.frombytes(model.embed(Counter(tokenize(self.passage_text(passage), self.stop_words))).tobytes())
+
+    def snapshot(self):
+        """Copy of the postings and live mask, which a background build can read without the index lock"""
+        copy = MemorySegment(self.stop_words, self.passage_words, self.overlap_words, self.compact_ratio)
+        copy._term_ids = dict(self._term_ids)
+        copy._posting_passages = [array('I', passages) for passages in self._posting_passages]
+        copy._posting_freqs = [array('f', freqs) for freqs in self._posting_freqs]
+        copy._passage_doc = array('I', self._passage_doc)
+        copy._passage_live = bytearray(self._passage_live)
+        copy.live_passages = self.live_passages
+        copy.frozen = True
+        copy.origin, copy.compactions = self, self.compactions
+        return copy
+
+    def df(self, term):
+        term_id = self._term_ids.get(term)
+        return self._df[term_id] if term_id is not None else 0
+
+    def terms(self):
+        return iter(self._term_ids)
+
+    def postings(self, term):
+        term_id = self._term_ids.get(term)
+        if term_id is None:
+            return None
+        return self._posting_passages[term_id], self._posting_freqs[term_id]
+
+    def postings_np(self, term):
+        term_id = self._term_ids.get(term)
+        if term_id is None:
+            return None
+        return (np.frombuffer(self._posting_passages[term_id], dtype=np.uint32),
+                np.frombuffer(self._posting_freqs[term_id], dtype=np.float32).astype(np.float64))
+
+    def passage_record(self, passage):
+        return (self._passage_doc[passage], self._passage_start[passage], self._passage_end[passage],
+                self._passage_length[passage])
+
+    def passage_length(self, passage):
+        return self._passage_length[passage]
+
+    def lengths_np(self):
+        # Copies, so no buffer export keeps the arrays from growing
+        if self._lengths_np is None:
+            self._lengths_np = np.frombuffer(self._passage_length, dtype=np.float32).astype(np.float64)
+        return self._lengths_np
+
+    def passage_text(self, passage):
+        return self._doc_texts[self._passage_doc[passage]][self._passage_start[passage]:self._passage_end[passage]]
+
+    def is_live(self, passage):
+        return self._passage_live[passage]
+
+    def live_np(self):
+        if self._live_np is None:
+            self._live_np = np.frombuffer(bytes(self._passage_live), dtype=np.uint8).astype(bool)
+        return self._live_np
+
+    def vectors_np(self):
+        if self.semantic is None:
+            return None
+        if self._vectors_np is None:
+            self._vectors_np = np.frombuffer(self._vectors, dtype=np.float32).reshape(-1, self.semantic.rank).copy()
+        return self._vectors_np
+
+    def doc_name(self, doc):
+        return self._doc_names[doc]
+
+    def doc_text(self, doc):
+        return self._doc_texts[doc]
+
+    def find_document(self, name):
+        return self._doc_ids.get(name)
+
+    def doc_passages(self, doc):
+        return self._doc_passages[doc]
+
+    def document_text(self, name):
+        doc_id = self._doc_ids.get(name)
+        return None if doc_id is None else self._doc_texts[doc_id]
+
+    def live_documents(self):
+        return sorted(self._doc_ids.values())
+
+    def get_stats(self):
+        return {
+            'segment': self.name,
+            'documents': len(self._doc_ids),
+            'passages': self.live_passages,
+            'dead_passages': len(self._passage_doc) - self.live_passages,
+            'terms': len(self._term_ids),
+            'postings': sum(len(postings) for postings in self._posting_passages)
+        }
+
+
+class PassageIndex:
+    """BM25 passage index over uploaded documents, with optional LSA embeddings"""
+
+    def __init__(self, directory=None, stop_words=(), passage_words=120, overlap_words=30,
+                 k1=1.2, b=0.75, semantic_dimensions=0, semantic_weight=0.3, compact_ratio=0.5,
+                 relevance_threshold=0.0, max_results=50, vectorized=True, memory_max_passages=5000,
+                 merge_factor=4, semantic_rebuild_ratio=0.5):
+        self.directory = directory
+        self.stop_words = frozenset(stop_words)
+        self.passage_words = passage_words
+        self.overlap_words = min(overlap_words, passage_words - 1)
+        self.k1 = k1
+        self.b = b
+        self.semantic_dimensions = semantic_dimensions if np is not None else 0
+        self.semantic_weight = semantic_weight
+        self.semantic_rebuild_ratio = semantic_rebuild_ratio
+        self.compact_ratio = compact_ratio
+        self.relevance_threshold = relevance_threshold
+        self.max_results = max_results
+        self.vectorized = vectorized and vector_scoring.available()
+        self.memory_max_passages = memory_max_passages
+        self.merge_factor = max(2, merge_factor)
+        self.log = None                   # write-ahead log of the memory segment, opened with the segments
+
+        self._lock = threading.RLock()
+        self._maintenance = threading.Condition(self._lock)
+        self._maintaining = False         # background flush/merge thread running
+        self._job_shadowed = None         # names superseded while a flush or merge is being written
+        self._loaded = directory is None
+        self._next = 1                    # number of the next segment or log
+        self._segments = []               # DiskSegments, oldest first
+        self._frozen = []                 # full memory segments waiting to be flushed, oldest first
+        self._semantic = None             # SemanticModel, once one has been built
+        self._semantic_attempted = None   # statistics version of the last build started
+        self._statistics = 0              # bumped whenever BM25 statistics change; versions scoring caches
+        self._memory = self._new_memory()
+
+    def __len__(self):
+        return sum(len(segment) for segment in self._all_segments())
+
+    def _new_memory(self, wals=()):
+        memory = MemorySegment(self.stop_words, self.passage_words, self.overlap_words, self.compact_ratio, wals)
+        memory.set_semantic(self._semantic)
+        return memory
+
+    def _passage_terms(self, text):
+        return tokenize(text, self.stop_words)
+
+    def _ensure_loaded(self):
+        """Open the disk segments and replay the logs the first time the index is used"""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            try:
+                with open(os.path.join(self.directory, MANIFEST), 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                manifest = LEGACY_MANIFEST
+            self._next = manifest['next']
+            self._remove_orphans(manifest)
+            self._segments = [DiskSegment(os.path.join(self.directory, name)) for name in manifest['segments']]
+            for index, segment in enumerate(self._segments):
+                for name in segment.superseded_names():
+                    for older in self._segments[:index]:
+                        older.shadow(name, self._passage_terms)
+            self._semantic = self._load_semantic(manifest.get('semantic'))
+
+            # Logs not yet flushed, including those of segments frozen before a restart, replay in order
+            self._memory = self._new_memory(manifest['wals'])
+            replayed = 0
+            for wal in manifest['wals']:
+                self.log = SegmentLog(self.directory, wal, key_field='document')
+                records, _, _ = self.log.read_since(None)
+                latest = {record['document']: record for record in records}
+                for record in latest.values():
+                    self._apply(record)
+                replayed += len(latest)
+            if self._semantic is not None:
+                self._semantic.folded = max(0, self._live_passages() - self._semantic.built_passages)
+            self._loaded = True
+            if self._segments or replayed:
+                print(f"📑 Passage index opened: {len(self._segments)} disk segments, "
+                      f"{replayed} documents replayed from the log, {self._live_passages()} passages")
+            if self._memory.passages >= self.memory_max_passages:
+                self.flush()
+            else:
+                self._schedule()
+
+    def _remove_orphans(self, manifest):
+        """Delete segments, logs and semantic models left behind by a job that did not finish"""
+        keep = set(manifest['segments']) | set(manifest['wals']) | {f"{manifest.get('semantic')}.npz"}
+        for name in os.listdir(self.directory):
+            if (name.startswith('seg-') or name.startswith('wal-')) and name not in keep:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+            elif name.startswith('lsa-') and name not in keep:
+                os.remove(os.path.join(self.directory, name))
+
+    def _load_semantic(self, model_id):
+        """Open the saved semantic model and the segment vectors made with it, dropping any others"""
+        model = None
+        if model_id and self.semantic_dimensions:
+            try:
+                model = SemanticModel.load(os.path.join(self.directory, model_id + '.npz'), model_id)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️ Passage index semantic model not loaded: {e}")
+        for segment in self._segments:
+            for name in os.listdir(segment.directory):
+                path = os.path.join(segment.directory, name)
+                if model is not None and name == model_id + '.npy':
+                    segment.semantic, segment.vectors = model, load_vectors(path)
+                elif name.endswith('.npy') or name.endswith('.npy.tmp'):
+                    os.remove(path)
+        # Segments without vectors are embedded by the maintenance thread
+        return model
+
+    def _write_manifest(self):
+        """Record the current segments and logs; replacing the file makes each change atomic"""
+        manifest = {
+            'segments': [segment.name for segment in self._segments],
+            'wals': [wal for memory in self._frozen + [self._memory] for wal in memory.wals],
+            'next': self._next,
+            'semantic': self._semantic.model_id if self._semantic is not None else None
+        }
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(path + '.tmp', path)
+
+    def _new_name(self, prefix):
+        name = f'{prefix}-{self._next:06d}'
+        self._next += 1
+        return name
+
+    def _apply(self, record):
+        """Make record, a log entry, the current version of its document"""
+        name = record['document']
+        for segment in self._segments + self._frozen:
+            segment.shadow(name, self._passage_terms)
+        self._memory.shadow(name)
+        if self._job_shadowed is not None:
+            self._job_shadowed.add(name)
+        self._statistics += 1
+        if record.get('deleted'):
+            self._memory.deleted.add(name)
+            return 0
+        count = self._memory.add(name, record.get('text', ''))
+        if self._semantic is not None:
+            self._semantic.folded += count
+        if self._loaded and self._semantic_due():
+            self._schedule()
+        return count
+
+    def _append(self, record):
+        if self.log is not None:
+            self.log.append([record])
+            self.log.compact(self.compact_ratio)
+        count = self._apply(record)
+        if self.log is not None and self._memory.passages >= self.memory_max_passages:
+            self.flush()
+        return count
+
+    def add_document(self, name, text):
+        """Index (or re-index) a document's passages; returns the number of passages
+
+        The cost is that of indexing this document: it goes to the memory
+        segment and its log, and flushing and merging happen in the background.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            return self._append({'document': name, 'text': text, 'indexed_at': datetime.now().isoformat()})
+
+    def remove_document(self, name):
+        self._ensure_loaded()
+        with self._lock:
+            self._append({'document': name, 'deleted': True, 'indexed_at': datetime.now().isoformat()})
+
+    # Log-structured maintenance
+
+    def flush(self):
+        """Freeze the memory segment and write it to disk in the background
+
+        The frozen segment stays searchable until its disk segment replaces
+        it; new documents go to a fresh memory segment and log meanwhile.
+        """
+        if self.directory is None:
+            return
+        self._ensure_loaded()
+        with self._lock:
+            if not self._memory.passages and not self._memory.deleted:
+                return
+            self._memory.frozen = True
+            self._frozen.append(self._memory)
+            wal = self._new_name('wal')
+            self.log = SegmentLog(self.directory, wal, key_field='document')
+            self._memory = self._new_memory([wal])
+            self._write_manifest()
+            self._schedule()
+
+    def wait_for_maintenance(self, timeout=None):
+        """Block until background flushes and merges are done; False on timeout"""
+        with self._maintenance:
+            return self._maintenance.wait_for(lambda: not self._maintaining, timeout)
+
+    def _schedule(self):
+        if self.directory is None or self._maintaining:
+            return
+        if self._frozen or self._merge_run() is not None or self._semantic_due() or self._unembedded():
+            self._maintaining = True
+            threading.Thread(target=self._maintain, name='passage-index-merge', daemon=True).start()
+
+    def _tier(self, segment):
+        """Size tier: segments within a factor of merge_factor of each other share one"""
+        size = max(1.0, segment.live_passages / max(1, self.memory_max_passages))
+        return int(math.log(size, self.merge_factor))
+
+    def _merge_run(self):
+        """Oldest merge_factor adjacent disk segments of the same tier, or None
+
+        Flushed segments start in tier 0, and merging merge_factor of a tier
+        yields one segment of the next, so each passage is rewritten about
+        log(corpus / memory_max_passages) times over the life of the index.
+        """
+        run_start = 0
+        for index in range(1, len(self._segments) + 1):
+            if index == len(self._segments) or self._tier(self._segments[index]) != self._tier(self._segments[run_start]):
+                if index - run_start >= self.merge_factor:
+                    return run_start, run_start + self.merge_factor
+                run_start = index
+        return None
+
+    def _next_job(self):
+        """(sources, documents to keep, deleted names, kind) of the next flush, merge or semantic job, or None
+
+        Semantic jobs come last: building the model ('semantic') and
+        embedding disk segments that have no vectors for it ('embed').
+        """
+        if self._frozen:
+            memory = self._frozen[0]
+            return [memory], [memory.live_documents()], memory.deleted, 'flush'
+        run = self._merge_run()
+        if run is not None:
+            sources = self._segments[run[0]:run[1]]
+            # Deletions only matter while older segments may hold the deleted documents
+            deleted = set().union(*(segment.deleted for segment in sources)) if run[0] else set()
+            return sources, [segment.live_documents() for segment in sources], deleted, 'merge'
+        if self._semantic_due():
+            self._semantic_attempted = self._statistics
+            # The memory segment keeps changing, so the build reads a copy of it
+            return self._segments + self._frozen + [self._memory.snapshot()], None, None, 'semantic'
+        if self._unembedded():
+            return self._unembedded(), None, None, 'embed'
+        return None
+
+    def _maintain(self):
+        """Flush frozen memory segments, merge disk segments, then update the semantic model, until nothing is due"""
+        while True:
+            with self._lock:
+                job = self._next_job()
+                if job is None:
+                    self._maintaining = False
+                    self._maintenance.notify_all()
+                    return
+                sources, documents, deleted, kind = job
+                model = self._semantic
+                if kind in ('flush', 'merge'):
+                    path = os.path.join(self.directory, self._new_name('seg'))
+                    self._job_shadowed = set()
+            try:
+                # Written without the lock: uploads and searches continue meanwhile
+                if kind == 'semantic':
+                    self._rebuild_semantic(sources)
+                    continue
+                if kind == 'embed':
+                    self._embed_segments(sources, model)
+                    continue
+                meta = write_segment(path, sources, documents, deleted)
+                vectors = self._embed_written(path, meta, model)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Passage index {kind} failed: {e}")
+                with self._lock:
+                    self._job_shadowed = None
+                    self._maintaining = False
+                    self._maintenance.notify_all()
+                return
+            with self._lock:
+                self._install(sources, kind, path, meta, model, vectors)
+
+    def _install(self, sources, kind, path, meta, model=None, vectors=None):
+        """Swap a written segment in for its sources"""
+        segment = None
+        if meta['documents'] or meta['deleted']:
+            segment = DiskSegment(path)
+            for name in self._job_shadowed:
+                segment.shadow(name, self._passage_terms)
+            if vectors is not None and model is self._semantic:
+                segment.semantic, segment.vectors = model, vectors
+        self._job_shadowed = None
+        if kind == 'flush':
+            memory = self._frozen.pop(0)
+            if segment is not None:
+                self._segments.append(segment)
+        else:
+            start = self._segments.index(sources[0])
+            self._segments[start:start + len(sources)] = [segment] if segment is not None else []
+        self._write_manifest()
+        self._statistics += 1
+
+        if segment is None:
+            shutil.rmtree(path, ignore_errors=True)
+        if kind == 'flush':
+            for wal in memory.wals:
+                shutil.rmtree(os.path.join(self.directory, wal), ignore_errors=True)
+        else:
+            for old in sources:
+                old.close()
+                shutil.rmtree(old.directory, ignore_errors=True)
+        print(f"💾 Passage index {kind} into {os.path.basename(path)}: {meta['documents']} documents, "
+              f"{meta['passages']} passages ({len(self._segments)} disk segments)")
+
+    # Semantic model
+
+    def _semantic_due(self):
+        """Whether a semantic model should be built: there is none, or it no longer fits the corpus"""
+        if not self.semantic_dimensions or self._semantic_attempted == self._statistics:
+            return False
+        model = self._semantic
+        if model is None:
+            return self._live_passages() > 2
+        return (model.dimensions != self.semantic_dimensions
+                or model.folded > self.semantic_rebuild_ratio * model.built_passages)
+
+    def _unembedded(self):
+        """Disk segments without passage vectors for the current semantic model"""
+        if self._semantic is None:
+            return []
+        return [segment for segment in self._segments if segment.semantic is not self._semantic]
+
+    def _embed_written(self, path, meta, model):
+        """Passage vectors of a segment just written by a flush or merge, saved beside it"""
+        if model is None or not meta['passages']:
+            return None
+        segment = DiskSegment(path)
+        try:
+            return save_vectors(os.path.join(path, model.model_id + '.npy'), model.embed_segment(segment))
+        finally:
+            segment.close()
+
+    def _embed_segments(self, segments, model):
+        for segment in segments:
+            vectors = save_vectors(os.path.join(segment.directory, model.model_id + '.npy'),
+                                   model.embed_segment(segment))
+            with self._lock:
+                if self._semantic is model:
+                    segment.semantic, segment.vectors = model, vectors
+
+    def _rebuild_semantic(self, sources):
+        """Build a semantic model from sources, embed every segment with it and swap it in
+
+        Runs on the maintenance thread. Only the passages added to the
+        memory segment since its snapshot are embedded under the lock.
+        """
+        with self._lock:
+            model_id = self._new_name('lsa')
+        model = SemanticModel.build(model_id, sources, self.semantic_dimensions)
+        if model is None:
+            return
+        model.save(os.path.join(self.directory, model_id + '.npz'))
+        disk = [source for source in sources if isinstance(source, DiskSegment)]
+        disk_vectors = [save_vectors(os.path.join(segment.directory, model_id + '.npy'), model.embed_segment(segment))
+                        for segment in disk]
+        memory_vectors = {source.origin: (source.compactions, model.embed_segment(source))
+                          for source in sources if isinstance(source, MemorySegment)}
+
+        with self._lock:
+            previous = self._semantic
+            self._semantic = model
+            for segment, vectors in zip(disk, disk_vectors):
+                segment.semantic, segment.vectors = model, vectors
+            for memory in self._frozen + [self._memory]:
+                compactions, vectors = memory_vectors.get(memory, (None, None))
+                memory.set_semantic(model, vectors if compactions == memory.compactions else None)
+            model.folded = max(0, self._live_passages() - model.built_passages)
+            self._write_manifest()
+        if previous is not None:
+            for path in [os.path.join(self.directory, previous.model_id + '.npz')] + \
+                    [os.path.join(segment.directory, previous.model_id + '.npy') for segment in self._segments]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        print(f"🧭 Passage index semantic model {model_id}: {model.rank} dimensions, "
+              f"{len(model.terms)} terms, {model.built_passages} passages")
+
+    def _rebuild_semantic_here(self):
+        """Build the semantic model in place, for an index without a directory and so without a maintenance thread"""
+        self._semantic_attempted = self._statistics
+        model = SemanticModel.build(self._new_name('lsa'), self._all_segments(), self.semantic_dimensions)
+        if model is not None:
+            self._semantic = model
+            for memory in self._frozen + [self._memory]:
+                memory.set_semantic(model, model.embed_segment(memory))
+
+    # Corpus-wide statistics
+
+    def _all_segments(self):
+        return self._segments + self._frozen + [self._memory]
+
+    def _layout(self):
+        """(segments, global number of each segment's first passage, total passages)"""
+        segments = self._all_segments()
+        offsets = []
+        total = 0
+        for segment in segments:
+            offsets.append(total)
+            total += segment.passages
+        return segments, offsets, total
+
+    def _live_passages(self):
+        return sum(segment.live_passages for segment in self._all_segments())
+
+    def _avg_length(self):
+        live = self._live_passages()
+        return (sum(segment.total_length for segment in self._all_segments()) / live if live else 0.0) or 1.0
+
+    def _df_of(self, term):
+        return sum(segment.df(term) for segment in self._all_segments())
+
+    def _idf(self, df):
+        return bm25_idf(df, self._live_passages())
+
+    def _find_document(self, name):
+        """(segment, document number, global passage range) of the current version of name, or None"""
+        segments, offsets, _ = self._layout()
+        for segment, offset in reversed(list(zip(segments, offsets))):
+            doc = segment.find_document(name)
+            if doc is not None:
+                passages = segment.doc_passages(doc)
+                return segment, doc, range(offset + passages.start, offset + passages.stop)
+        return None
+
+    # Search
+
+    def search(self, query, limit=5, document=None):
+        """Best passages for query, as dicts with document, start, end, text and score
+
+        query may be a string or a list of strings; coverage is the share
+        of query terms found in the passage. With document, only that
+        document's passages are ranked. Overlapping passages of the same
+        document are collapsed into the better one.
+        """
+        return self.search_many([query], limit, [document])[0]
+
+    def search_many(self, queries, limit=5, documents=None):
+        """Results of search() for several queries, scored together
+
+        documents, when given, holds the document to restrict each query
+        to (or None).
+        """
+        self._ensure_loaded()
+        documents = documents or [None] * len(queries)
+        limit = min(limit, self.max_results)
+        with self._lock:
+            if not self._live_passages():
+                return [[] for _ in queries]
+            query_terms = [self._query_terms(query) for query in queries]
+            dfs = {term: self._df_of(term) for term in set().union(*query_terms)}
+            scored_terms = [sorted(term for term in terms if dfs[term]) for terms in query_terms]
+            lexical = self._score_vector(scored_terms, dfs) if self.vectorized else [None] * len(queries)
+
+            results = []
+            for terms, scored, scores, document in zip(query_terms, scored_terms, lexical, documents):
+                found = self._find_document(document) if document is not None else None
+                only = found[2] if found is not None else None
+                if not terms or (document is not None and only is None):
+                    results.append([])
+                elif self.vectorized:
+                    results.append(self._rank_vector(scores, terms, dfs, only, limit))
+                else:
+                    results.append(self._rank_python(scored, terms, dfs, only, limit))
+            return results
+
+    def _query_terms(self, query):
+        if isinstance(query, str):
+            query = [query]
+        terms = set()
+        for part in query:
+            terms.update(tokenize(part, self.stop_words))
+        return terms
+
+    def _score_vector(self, scored_terms, dfs):
+        """BM25 scores of every passage for each query, as a queries x passages array
+
+        Each segment keeps the weight rows of the terms searched since the
+        index last changed, so repeated terms cost no decoding or weighting.
+        """
+        segments, _, total = self._layout()
+        vocabulary = sorted(set().union(*scored_terms))
+        if not vocabulary:
+            return np.zeros((len(scored_terms), total))
+        columns = {term: column for column, term in enumerate(vocabulary)}
+        rows = [[columns[term] for term in terms] for terms in scored_terms]
+        idf = [self._idf(dfs[term]) for term in vocabulary]
+        avg_length = self._avg_length()
+        parts = []
+        for segment in segments:
+            if segment.scoring_cache is None or segment.scoring_cache[0] != self._statistics \
+                    or len(segment.scoring_cache[1]) > SCORING_CACHE_TERMS:
+                segment.scoring_cache = (self._statistics, {})
+            cache = segment.scoring_cache[1]
+            weights = []
+            for term, term_idf in zip(vocabulary, idf):
+                if term not in cache:
+                    cache[term] = BM25Matrix.term_weights(segment.postings_np(term), segment.lengths_np(),
+                                                          segment.live_np(), term_idf, self.k1, self.b, avg_length)
+                weights.append(cache[term])
+            parts.append(BM25Matrix.from_rows(weights, segment.passages).score_batch(rows))
+        return np.hstack(parts)
+
+    def _rank_python(self, scored_terms, query_terms, dfs, only, limit):
+        """Score and rank passages with dict loops over the postings"""
+        segments, offsets, _ = self._layout()
+        avg_length = self._avg_length()
+        scores = {}
+        # Terms in sorted order, matching the vectorized path's summation order
+        for term in scored_terms:
+            idf = self._idf(dfs[term])
+            for segment, offset in zip(segments, offsets):
+                postings = segment.postings(term)
+                if postings is None:
+                    continue
+                for passage, tf in zip(*postings):
+                    if not segment.is_live(passage) or (only is not None and offset + passage not in only):
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * segment.passage_length(passage) / avg_length)
+                    scores[offset + passage] = scores.get(offset + passage, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        if scores:
+            best = max(scores.values())
+            scores = {passage: score / best for passage, score in scores.items()}
+        similarities = self._semantic_scores(query_terms, only, limit)
+        if similarities:
+            weight = self.semantic_weight
+            for passage in set(scores) | set(similarities):
+                scores[passage] = (1 - weight) * scores.get(passage, 0.0) + weight * similarities.get(passage, 0.0)
+        ranked = heapq.nlargest(
+            limit * 4,
+            ((passage, score) for passage, score in scores.items() if score >= self.relevance_threshold),
+            key=lambda item: (item[1], -item[0])
+        )
+        return self._results(ranked, query_terms, limit)
+
+    def _rank_vector(self, scores, query_terms, dfs, only, limit):
+        """Rank passages from a row of BM25Matrix scores"""
+        if only is not None:
+            scores = scores.copy()
+            scores[:only.start] = 0.0
+            scores[only.stop:] = 0.0
+        best = scores.max()
+        if best > 0:
+            scores = scores / best
+        similarities = self._semantic_scores(query_terms, only, limit)
+        if similarities:
+            weight = self.semantic_weight
+            semantic = np.zeros(len(scores))
+            semantic[list(similarities)] = list(similarities.values())
+            scores = (1 - weight) * scores + weight * semantic
+        scores[scores < self.relevance_threshold] = 0.0
+        return self._results(top_k(scores, limit * 4), query_terms, limit)
+
+    def _results(self, ranked, query_terms, limit):
+        """Result dicts for ranked (passage, score) pairs, skipping overlapping passages"""
+        segments, offsets, _ = self._layout()
+        results = []
+        taken = {}   # (segment, document number) -> chosen (start, end) spans
+        for passage, score in ranked:
+            index = bisect.bisect_right(offsets, passage) - 1
+            segment, local = segments[index], passage - offsets[index]
+            doc, start, end = segment.passage_record(local)[:3]
+            spans = taken.setdefault((index, doc), [])
+            if any(start < other_end and other_start < end for other_start, other_end in spans):
+                continue
+            spans.append((start, end))
+            text = segment.passage_text(local)
+            matched = sorted(query_terms.intersection(tokenize(text, self.stop_words)))
+            results.append({
+                'document': segment.doc_name(doc),
+                'start': start,
+                'end': end,
+                'text': text,
+                'score': round(score, 4),
+                'matched_terms': matched,
+                'coverage': round(len(matched) / len(query_terms), 2)
+            })
+            if len(results) >= limit:
+                break
+        return results
+
+    def _semantic_scores(self, query_terms, only, limit):
+        """Cosine similarity of the query to the closest passages in LSA space"""
+        if not self.semantic_dimensions:
+            return {}
+        if self.directory is None and self._semantic_due():
+            self._rebuild_semantic_here()
+        model = self._semantic
+        if model is None:
+            return {}
+        query_vector = model.embed(dict.fromkeys(query_terms, 1))
+        if not query_vector.any():
+            return {}
+        segments, offsets, passages = self._layout()
+        if not passages:
+            return {}
+        similarities = np.zeros(passages, dtype=np.float32)
+        for segment, offset in zip(segments, offsets):
+            # Segments not yet embedded with the model only rank lexically
+            vectors = segment.vectors_np() if segment.semantic is model else None
+            if vectors is None or not len(vectors):
+                continue
+            part = vectors @ query_vector
+            live = segment.live_np()
+            if live is not None:
+                part[~live] = 0.0
+            similarities[offset:offset + segment.passages] = part
+        if only is not None:
+            candidates = np.arange(only.start, only.stop)
+        else:
+            count = min(len(similarities), limit * 4)
+            candidates = np.argpartition(-similarities, count - 1)[:count]
+        return {int(passage): float(similarities[passage]) for passage in candidates
+                if similarities[passage] >= SEMANTIC_MIN_SIMILARITY}
+
+    def document_keywords(self, name, count=10):
+        """Terms that best characterise a document against the rest of the corpus"""
+        self._ensure_loaded()
+        with self._lock:
+            found = self._find_document(name)
+            if found is None:
+                return []
+            segment, doc, _ = found
+
+            def idf(term):
+                df = self._df_of(term)
+                return self._idf(df) if df else 0.0
+
+            return top_terms(segment.document_text(name), self.stop_words, count, idf)
+
+    def document_passages(self, name):
+        self._ensure_loaded()
+        with self._lock:
+            found = self._find_document(name)
+            return len(found[2]) if found is not None else 0
+
+    def get_stats(self):
+        with self._lock:
+            segments = self._all_segments()
+            live = self._live_passages()
+            return {
+                'documents': len(self),
+                'passages': live,
+                'dead_passages': sum(segment.passages for segment in segments) - live,
+                'segments': [segment.get_stats() for segment in segments],
+                'frozen_segments': len(self._frozen),
+                'maintenance_running': self._maintaining,
+                'wal': self.log.get_stats() if self.log is not None else None,
+                'semantic_dimensions': self.semantic_dimensions,
+                'semantic_model_built': self._semantic is not None,
+                'semantic_model': self._semantic.model_id if self._semantic is not None else None,
+                'semantic_folded_passages': self._semantic.folded if self._semantic is not None else 0,
+                'vectorized': self.vectorized
+            }
@@ -0,0 +1,234 @@
+"""
+Bounded worker-pool HTTP server for the Smart Doc Analysis web interface.
+
+The standard library offers either a single-threaded HTTPServer or a
+ThreadingHTTPServer that spawns one thread per connection. PooledHTTPServer
+sits between the two: a fixed number of worker threads drain a bounded
+queue of accepted connections, and connections arriving while the queue is
+full are answered immediately with 503 instead of piling up.
+
+Long-lived connections such as server-sent event streams can be detached
+from the pool once their headers are written, handing the socket to another
+owner so the worker thread is free for the next request.
+"""
+import json
+import queue
+import threading
+from contextlib import contextmanager
+from http.server import HTTPServer
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that dispatches requests to a fixed pool of worker threads"""
+
+    def __init__(self, server_address, handler_class, workers=4, queue_depth=64):
+        super().__init__(server_address, handler_class)
+        self.workers = max(1, int(workers))
+        self.queue_depth = max(1, int(queue_depth))
+        self.rejected_requests = 0
+        self._pending = queue.Queue(maxsize=self.queue_depth)
+        self._threads = []
+        self._detached = set()
+        self._detached_lock = threading.Lock()
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"http-worker-{i}")
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def process_request(self, request, client_address):
+        """Queue an accepted connection, rejecting it if the pool is saturated"""
+        try:
+            self._pending.put_nowait((request, client_address))
+        except queue.Full:
+            self.rejected_requests += 1
+            self._reject_overloaded(request)
+            self.shutdown_request(request)
+
+    def _worker_loop(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                break
+
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                if not self._take_detached(request):
+                    self.shutdown_request(request)
+
+    def detach_request(self, request):
+        """Keep a connection open after its handler returns; the caller now owns it"""
+        with self._detached_lock:
+            self._detached.add(request)
+
+    def _take_detached(self, request):
+        with self._detached_lock:
+            if request in self._detached:
+                self._detached.discard(request)
+                return True
+            return False
+
+    def _reject_overloaded(self, request):
+        body = json.dumps({
+            'status': 'overloaded',
+            'message': 'Server is busy, please retry shortly'
+        }).encode()
+        response = (
+            b"HTTP/1.0 503 Service Unavailable\r\n"
+            b"Content-Type: application/json\r\n"
+            b"Retry-After: 1\r\n"
+            b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+            b"Connection: close\r\n\r\n" + body
+        )
+        try:
+            request.sendall(response)
+        except OSError:
+            pass
+
+    def get_pool_stats(self):
+        """Report worker pool utilisation"""
+        return {
+            'workers': self.workers,
+            'queue_depth': self.queue_depth,
+            'queued_requests': self._pending.qsize(),
+            'rejected_requests': self.rejected_requests
+        }
+
+    def server_close(self):
+        super().server_close()
+        for _ in self._threads:
+            self._pending.put(None)
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+
+class ReadWriteLock:
+    """Lock shared by any number of readers or held by one writer
+
+    Waiting writers block new readers, so a steady stream of searches cannot
+    starve an upload. The writer side is reentrant; the reader side is not
+    upgradable to a writer.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writer_depth = 0
+        self._writers_waiting = 0
+
+    def acquire_read(self):
+        with self._condition:
+            if self._writer == threading.get_ident():
+                self._writer_depth += 1
+                return
+            while self._writer is not None or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._condition:
+            if self._writer == threading.get_ident():
+                self._writer_depth -= 1
+                return
+            self._readers -= 1
+            if not self._readers:
+                self._condition.notify_all()
+
+    def acquire(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            self._writers_waiting += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release(self):
+        with self._condition:
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer = None
+                self._condition.notify_all()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    @contextmanager
+    def reading(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+
+class SynchronizedProxy:
+    """Serialize method calls into a shared object that is not thread-safe
+
+    SmartResearchAssistant, FlexpriceIntegration and PathwayIntegration keep
+    in-memory state and write their JSON stores without any locking of their
+    own, so every request thread goes through one proxy per instance.
+
+    Methods named in read_methods only read that state; they share a
+    ReadWriteLock and run concurrently, while every other call is exclusive.
+    Given a factory instead of a target, the proxy creates the target on
+    first use, so its imports are paid only if it is needed.
+    """
+
+    def __init__(self, target=None, lock=None, read_methods=(), factory=None):
+        if lock is None:
+            lock = ReadWriteLock() if read_methods else threading.RLock()
+        object.__setattr__(self, '_target', target)
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_lock', lock)
+        object.__setattr__(self, '_read_methods', frozenset(read_methods))
+
+    @property
+    def lock(self):
+        return self._lock
+
+    def _resolve(self):
+        if self._target is None and self._factory is not None:
+            with self._lock:
+                if self._target is None:
+                    object.__setattr__(self, '_target', self._factory())
+        return self._target
+
+    def __getattr__(self, name):
+        attr = getattr(self._resolve(), name)
+        if not callable(attr):
+            return attr
+
+        lock = self._lock
+        shared = name in self._read_methods
+
+        def locked_call(*args, **kwargs):
+            with lock.reading() if shared else lock:
+                return attr(*args, **kwargs)
+
+        locked_call.__name__ = getattr(attr, '__name__', name)
+        return locked_call
+
+    def __setattr__(self, name, value):
+        target = self._resolve()
+        with self._lock:
+            setattr(target, name, value)
+
+    def __bool__(self):
+        return self._target is not None or self._factory is not None
@@ -0,0 +1,76 @@
+"""
+Token-bucket rate limiting for the web interface.
+
+A TokenBucket holds up to capacity tokens and refills at rate tokens per
+second; each admitted request takes one. KeyedTokenBuckets keeps one bucket
+per key (a user or a client address) so a heavy tenant drains only its own
+bucket, and forgets the least recently seen keys beyond max_keys.
+
+take() never blocks: it returns 0.0 when the request is admitted, otherwise
+the number of seconds until a token will be available, which is what the
+caller sends back as Retry-After.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucket:
+    """Refilling token bucket"""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, tokens=1):
+        """Take tokens if available; returns 0.0 on success or the seconds to wait"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            if self.rate <= 0:
+                return float('inf')
+            return (tokens - self.tokens) / self.rate
+
+
+class KeyedTokenBuckets:
+    """One token bucket per key, bounded to the max_keys most recently used"""
+
+    def __init__(self, rate, capacity, max_keys=10000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'admitted': 0, 'limited': 0}
+
+    @classmethod
+    def per_minute(cls, requests_per_minute, burst=None, max_keys=10000):
+        """Buckets allowing requests_per_minute on average and burst requests at once"""
+        return cls(requests_per_minute / 60.0, burst or requests_per_minute, max_keys)
+
+    def take(self, key, tokens=1):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.capacity)
+                self._buckets[key] = bucket
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+        wait = bucket.take(tokens)
+        with self._lock:
+            self._counters['limited' if wait else 'admitted'] += 1
+        return wait
+
+    def get_stats(self):
+        return dict(self._counters, keys=len(self._buckets),
+                    rate_per_minute=round(self.rate * 60, 2), burst=self.capacity)
@@ -0,0 +1,101 @@
+"""
+Single-flight Pathway refresh cycles.
+
+/refresh-pathway used to run PathwayIntegration's update cycle inside the
+request, so several users clicking refresh together ran several cycles at
+once against the same JSON files. RefreshCoordinator runs at most one cycle
+at a time on a background thread: a request that arrives while a cycle is in
+flight joins it and gets the same cycle id back, and callers poll the cycle's
+status to learn when it finished and how many new sources it ingested.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+
+CYCLE_RUNNING = 'running'
+CYCLE_COMPLETED = 'completed'
+CYCLE_FAILED = 'failed'
+
+
+@dataclass
+class RefreshCycle:
+    cycle_id: str
+    status: str = CYCLE_RUNNING
+    started_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    finished_at: str = None
+    duration_seconds: float = None
+    requests_joined: int = 0
+    error: str = None
+    result: dict = field(default_factory=dict)
+
+    @property
+    def finished(self):
+        return self.status in (CYCLE_COMPLETED, CYCLE_FAILED)
+
+    def to_dict(self):
+        return {
+            'cycle_id': self.cycle_id,
+            'status': self.status,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'duration_seconds': self.duration_seconds,
+            'requests_joined': self.requests_joined,
+            'error': self.error,
+            'result': self.result
+        }
+
+
+class RefreshCoordinator:
+    """Run refresh cycles one at a time, letting concurrent requests join the current one"""
+
+    def __init__(self, max_history=50):
+        self.max_history = max_history
+        self._cycles = OrderedDict()
+        self._current = None
+        self._lock = threading.Lock()
+
+    def start(self, func):
+        """Start func(cycle) in the background unless a cycle is already running
+
+        Returns (cycle, joined); joined is True when the caller was attached
+        to a cycle that was already in flight and func was not called.
+        """
+        with self._lock:
+            if self._current is not None:
+                self._current.requests_joined += 1
+                return self._current, True
+            cycle = RefreshCycle(cycle_id=uuid.uuid4().hex[:12])
+            self._current = cycle
+            self._cycles[cycle.cycle_id] = cycle
+            while len(self._cycles) > self.max_history:
+                self._cycles.popitem(last=False)
+
+        thread = threading.Thread(target=self._run, args=(cycle, func), name=f'refresh-{cycle.cycle_id}', daemon=True)
+        thread.start()
+        return cycle, False
+
+    def _run(self, cycle, func):
+        started = time.time()
+        try:
+            cycle.result = func(cycle) or {}
+            cycle.status = CYCLE_COMPLETED
+        except Exception as e:
+            print(f"Refresh cycle {cycle.cycle_id} failed: {e}")
+            cycle.status = CYCLE_FAILED
+            cycle.error = str(e)
+        finally:
+            cycle.finished_at = datetime.now().isoformat()
+            cycle.duration_seconds = round(time.time() - started, 3)
+            with self._lock:
+                self._current = None
+
+    def get(self, cycle_id):
+        with self._lock:
+            return self._cycles.get(cycle_id)
+
+    def latest(self):
+        with self._lock:
+            return next(reversed(self._cycles.values()), None)
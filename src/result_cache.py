@@ -0,0 +1,94 @@
+"""
+In-memory result cache for the web interface.
+
+ResultCache is an LRU cache bounded by the approximate size of its values,
+with a time-to-live per entry. Keys are tagged with a corpus version: when
+an upload or a Pathway update changes what a search could return, the
+owner calls bump_version(), which drops every cached entry, and results
+computed against the old corpus are refused when they are stored late.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_query(query):
+    """Case- and whitespace-insensitive form of a search query"""
+    return ' '.join(query.lower().split())
+
+
+class ResultCache:
+    """Size-bounded LRU cache with per-entry expiry and a version counter"""
+
+    def __init__(self, max_bytes, ttl_seconds=None):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.version = 0
+
+        self._entries = OrderedDict()   # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def key(self, query):
+        return (self.version, normalize_query(query))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                self._remove(key)
+                self._counters['expirations'] += 1
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return value
+
+    def put(self, key, value, size=None):
+        """Store value unless its key predates the current version or it can never fit"""
+        if size is None:
+            size = len(value) if isinstance(value, (str, bytes)) else sys.getsizeof(value)
+        with self._lock:
+            if key[0] != self.version or size > self.max_bytes:
+                return False
+            if key in self._entries:
+                self._remove(key)
+            expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._counters['evictions'] += 1
+            return True
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def bump_version(self):
+        """Invalidate every cached result after the corpus changed"""
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._counters['invalidations'] += 1
+            return self.version
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return dict(
+                self._counters,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                max_bytes=self.max_bytes,
+                version=self.version,
+                hit_rate=round(self._counters['hits'] / lookups, 4) if lookups else 0.0
+            )
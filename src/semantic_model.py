@@ -0,0 +1,166 @@
+"""
+LSA term space for the passage index.
+
+The passage index used to compute a randomized SVD over every passage of
+every segment on the first search after each upload, in memory and under
+the index lock, so an upload's cost grew with the corpus. SemanticModel
+keeps only the term side of the decomposition: a vector and an idf per
+term. A passage is embedded by folding it into that space, as the sum of
+its terms' vectors weighted by (1 + log tf) * idf, the same projection a
+query gets. New passages are folded in as they are indexed, at a cost
+proportional to their own text; the decomposition is recomputed only after
+enough passages were folded in, on the index's maintenance thread.
+
+Models are saved as <model_id>.npz in the index directory, and each disk
+segment stores its passage vectors as <model_id>.npy, memory-mapped like
+the rest of the segment.
+"""
+import math
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Fixed so embeddings, and therefore rankings, are the same on every rebuild
+SEED = 20240922
+OVERSAMPLING = 10
+
+
+def bm25_idf(df, passages):
+    """Same idf as the BM25 scorer"""
+    return math.log(1 + (passages - df + 0.5) / (df + 0.5))
+
+
+def _term_columns(sources, masks):
+    """(term, passage rows, TF-IDF weights) over the live passages of sources, in term order
+
+    Passage rows are numbered across sources in order.
+    """
+    offsets = []
+    total = 0
+    for source in sources:
+        offsets.append(total)
+        total += source.passages
+    live_passages = sum(int(mask.sum()) for mask in masks)
+    for term in sorted(set().union(*(source.terms() for source in sources))):
+        rows, freqs = [], []
+        for source, offset, mask in zip(sources, offsets, masks):
+            posting = source.postings_np(term)
+            if posting is not None:
+                keep = mask[posting[0]]
+                rows.append(posting[0][keep].astype(np.int64) + offset)
+                freqs.append(posting[1][keep])
+        rows, freqs = np.concatenate(rows), np.concatenate(freqs)
+        if len(rows):
+            idf = bm25_idf(len(rows), live_passages)
+            yield term, rows, idf, ((1 + np.log(freqs)) * idf).astype(np.float32)
+
+
+class SemanticModel:
+    """Term vectors and idf of an LSA decomposition, and how far the corpus has drifted from it"""
+
+    def __init__(self, model_id, terms, idf, term_vectors, dimensions, built_passages, folded=0):
+        self.model_id = model_id
+        self.terms = list(terms)
+        self.columns = {term: column for column, term in enumerate(self.terms)}
+        self.idf = idf                      # float32 per term, from the corpus the model was built on
+        self.term_vectors = term_vectors    # terms x rank, float32
+        self.dimensions = dimensions        # requested; the rank may be lower for a small corpus
+        self.built_passages = built_passages
+        self.folded = folded                # passages indexed since the build
+
+    @property
+    def rank(self):
+        return self.term_vectors.shape[1]
+
+    @classmethod
+    def build(cls, model_id, sources, dimensions):
+        """Randomized SVD of the TF-IDF matrix of the live passages of sources, or None if too small
+
+        Sources provide passages, terms(), postings_np() and live_np(), and
+        must not change during the build. The postings are read twice rather
+        than held, so memory stays at passages x (dimensions + OVERSAMPLING).
+        """
+        masks = [source.live_np() if source.live_np() is not None else np.ones(source.passages, dtype=bool)
+                 for source in sources]
+        passages = sum(source.passages for source in sources)
+        live_passages = sum(int(mask.sum()) for mask in masks)
+        terms = sum(1 for _ in _term_columns(sources, masks))
+        rank = min(dimensions, live_passages - 1, terms - 1)
+        if rank < 2:
+            return None
+        width = rank + OVERSAMPLING
+        rng = np.random.default_rng(SEED)
+        omega = rng.standard_normal((terms, width)).astype(np.float32)
+
+        # Range finder: project the passages x terms matrix onto width random directions
+        projected = np.zeros((passages, width), dtype=np.float32)
+        for column, (_, rows, _, weights) in enumerate(_term_columns(sources, masks)):
+            projected[rows] += weights[:, None] * omega[column]
+        basis, _ = np.linalg.qr(projected)
+        del projected
+
+        # The matrix seen from that basis is small enough for an exact SVD
+        small = np.zeros((basis.shape[1], terms), dtype=np.float32)
+        names, idf = [], np.zeros(terms, dtype=np.float32)
+        for column, (term, rows, term_idf, weights) in enumerate(_term_columns(sources, masks)):
+            small[:, column] = weights @ basis[rows]
+            names.append(term)
+            idf[column] = term_idf
+        _, _, right = np.linalg.svd(small, full_matrices=False)
+        return cls(model_id, names, idf, right[:rank].T.copy(), dimensions, live_passages)
+
+    def embed(self, counts):
+        """Unit vector of a passage or query from its term counts; zeros if no term is known"""
+        vector = np.zeros(self.rank, dtype=np.float32)
+        for term, tf in counts.items():
+            column = self.columns.get(term)
+            if column is not None:
+                vector += (1 + math.log(tf)) * self.idf[column] * self.term_vectors[column]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_segment(self, segment):
+        """Unit vectors of every passage of a segment, as a passages x rank array"""
+        vectors = np.zeros((segment.passages, self.rank), dtype=np.float32)
+        for term in segment.terms():
+            column = self.columns.get(term)
+            if column is None:
+                continue
+            rows, freqs = segment.postings_np(term)
+            weights = (1 + np.log(freqs)) * self.idf[column]
+            vectors[rows] += weights[:, None].astype(np.float32) * self.term_vectors[column]
+        norms = np.linalg.norm(vectors, axis=1)
+        norms[norms == 0] = 1.0
+        return vectors / norms[:, None]
+
+    def save(self, path):
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, terms=np.array(self.terms, dtype=str), idf=self.idf, term_vectors=self.term_vectors,
+                     info=np.array([self.dimensions, self.built_passages], dtype=np.int64))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path, model_id):
+        with np.load(path) as data:
+            dimensions, built_passages = (int(value) for value in data['info'])
+            return cls(model_id, data['terms'].tolist(), data['idf'], data['term_vectors'],
+                       dimensions, built_passages)
+
+
+def save_vectors(path, vectors):
+    """Write passage vectors for memory-mapping; returns the mapped array"""
+    with open(path + '.tmp', 'wb') as f:
+        np.save(f, vectors)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+    return load_vectors(path)
+
+
+def load_vectors(path):
+    return np.load(path, mmap_mode='r')
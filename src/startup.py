@@ -0,0 +1,74 @@
+"""
+Startup phases of the web interface.
+
+run_web_server used to import every subsystem, load all persisted state and
+start live ingestion before binding its port, so connections were refused
+and health checks failed for the whole startup. The server now listens
+first and initializes in the background. StartupTracker records each phase
+with its timing, so /health can report progress, and requests that need
+the subsystems are answered with 503 and Retry-After until it is ready.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupTracker:
+    """Named startup phases with their timings, and a readiness flag"""
+
+    def __init__(self):
+        self.started = time.time()
+        self._clock = time.perf_counter()
+        self._lock = threading.Lock()
+        self._phases = []            # dicts of name, status, seconds (and error), in order
+        self._ready = threading.Event()
+        self.ready_after = None
+        self.error = None
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    @property
+    def status(self):
+        if self.error is not None:
+            return 'failed'
+        return 'running' if self.ready else 'starting'
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block as a phase; an exception marks startup as failed"""
+        entry = {'name': name, 'status': 'running', 'seconds': None}
+        with self._lock:
+            self._phases.append(entry)
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            with self._lock:
+                entry.update(status='failed', seconds=round(time.perf_counter() - started, 3), error=str(e))
+                self.error = f'{name}: {e}'
+            raise
+        with self._lock:
+            entry.update(status='done', seconds=round(time.perf_counter() - started, 3))
+
+    def mark_ready(self):
+        self.ready_after = round(time.perf_counter() - self._clock, 3)
+        self._ready.set()
+
+    def wait(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def get_stats(self):
+        with self._lock:
+            phases = [dict(entry) for entry in self._phases]
+        running = [entry['name'] for entry in phases if entry['status'] == 'running']
+        return {
+            'status': self.status,
+            'ready': self.ready,
+            'phase': running[-1] if running else None,
+            'elapsed_seconds': round(time.perf_counter() - self._clock, 3),
+            'ready_after_seconds': self.ready_after,
+            'error': self.error,
+            'phases': phases
+        }
@@ -0,0 +1,157 @@
+"""
+Startup-time benchmark for the web interface.
+
+Measures, over several cold starts of simple_web.py in fresh interpreters:
+
+- import: seconds to import simple_web, and the slowest modules it pulls
+  in (from a separate run under python -X importtime)
+- listen: seconds from process start until the port accepts connections
+- ready: seconds until /health reports the server running, with the time
+  spent in each startup phase
+
+Run from the project root against its real data, so state loading is
+measured too; results can be appended to a JSON Lines file to track them
+across changes:
+
+    python src/startup_benchmark.py --runs 5 --output startup_times.jsonl
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+IMPORT_CODE = "import sys; sys.path.append('src'); import simple_web"
+
+
+def measure_import(python=sys.executable):
+    """Seconds to import simple_web in a fresh interpreter"""
+    code = ("import time; started = time.perf_counter(); "
+            f"{IMPORT_CODE}; print(time.perf_counter() - started)")
+    result = subprocess.run([python, '-c', code], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(python=sys.executable, top=8):
+    """[(module, cumulative seconds)] of the slowest modules simple_web imports, from -X importtime"""
+    result = subprocess.run([python, '-X', 'importtime', '-c', IMPORT_CODE], cwd=PROJECT_ROOT,
+                            capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = line.split('|')
+        if len(parts) == 3 and parts[1].strip().isdigit() and parts[2].strip() != 'simple_web':
+            modules.append((parts[2].strip(), int(parts[1]) / 1e6))
+    slowest = sorted(modules, key=lambda item: -item[1])
+    return [(name, round(seconds, 4)) for name, seconds in slowest[:top]]
+
+
+def free_port():
+    """A port nothing listens on, chosen by the OS"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+def port_open(port):
+    try:
+        with socket.create_connection(('localhost', port), timeout=0.2):
+            return True
+    except OSError:
+        return False
+
+
+def health(port):
+    """Parsed /health response; it answers 503 while starting, with the same body"""
+    try:
+        with urllib.request.urlopen(f'http://localhost:{port}/health', timeout=2) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as e:
+        return json.load(e)
+
+
+def measure_start(port, python=sys.executable, timeout=120, poll_interval=0.01):
+    """Start simple_web.py once; returns listen and ready times and the startup phases"""
+    if port_open(port):
+        raise RuntimeError(f'port {port} is already in use; stop the running server or pass --port')
+    started = time.perf_counter()
+    process = subprocess.Popen([python, 'simple_web.py', '--port', str(port), '--no-browser'], cwd=PROJECT_ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        listen = None
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f'server exited with status {process.returncode}')
+            if listen is None:
+                if port_open(port):
+                    listen = time.perf_counter() - started
+                continue
+            status = health(port)
+            if status.get('status') == 'failed':
+                raise RuntimeError(f"startup failed: {status['startup']['error']}")
+            if status.get('status') == 'running':
+                ready = time.perf_counter() - started
+                phases = {phase['name']: phase['seconds'] for phase in status.get('startup', {}).get('phases', [])}
+                return {'listen_seconds': round(listen, 4), 'ready_seconds': round(ready, 4), 'phases': phases}
+            time.sleep(poll_interval)
+        raise RuntimeError(f'server not ready after {timeout}s')
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def run_benchmark(runs=3, port=None, python=sys.executable):
+    """Median timings over runs cold starts, on port or else a free port per start"""
+    imports = [measure_import(python) for _ in range(runs)]
+    starts = [measure_start(port or free_port(), python) for _ in range(runs)]
+    phase_names = list(starts[0]['phases'])
+    return {
+        'measured_at': datetime.now().isoformat(),
+        'runs': runs,
+        'import_seconds': round(statistics.median(imports), 4),
+        'slowest_imports': slowest_imports(python),
+        'listen_seconds': round(statistics.median(start['listen_seconds'] for start in starts), 4),
+        'ready_seconds': round(statistics.median(start['ready_seconds'] for start in starts), 4),
+        'phases': {name: round(statistics.median(start['phases'].get(name) or 0.0 for start in starts), 4)
+                   for name in phase_names}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure import and startup time of the web interface')
+    parser.add_argument('--runs', type=int, default=3, help='cold starts to take the median of')
+    parser.add_argument('--port', type=int, help='port for the benchmarked server (default: a free one)')
+    parser.add_argument('--output', help='append the result as one JSON line to this file')
+    args = parser.parse_args()
+
+    result = run_benchmark(args.runs, args.port)
+    print(f"⏱️  Startup benchmark (median of {result['runs']} runs)")
+    print(f"   import simple_web   {result['import_seconds']:.3f}s")
+    print(f"   port listening      {result['listen_seconds']:.3f}s")
+    print(f"   ready (/health)     {result['ready_seconds']:.3f}s")
+    for name, seconds in result['phases'].items():
+        print(f"     {name:<18}{seconds:.3f}s")
+    print("   slowest imports:")
+    for name, seconds in result['slowest_imports']:
+        print(f"     {name:<30}{seconds:.3f}s")
+    if args.output:
+        with open(args.output, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(result) + '\n')
+        print(f"📝 Appended to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Pre-rendered static responses and response compression.
+
+Pages that never change while the server runs (the homepage with its inline
+CSS and JavaScript) are rendered and encoded once at startup. Each
+StaticAsset keeps its identity bytes next to gzip and, when the optional
+brotli package is installed, brotli variants, plus a strong ETag, so a
+request costs a header lookup and one write, and a browser revalidating its
+copy gets an empty 304.
+
+Dynamic HTML and JSON responses are compressed on the fly with a fast gzip
+level once they are large enough for it to pay off.
+"""
+import gzip
+import hashlib
+from dataclasses import dataclass, field
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Smaller bodies fit in a packet or two; compressing them costs more than it saves
+MIN_COMPRESS_BYTES = 1024
+DYNAMIC_GZIP_LEVEL = 5
+
+
+@dataclass
+class StaticAsset:
+    body: bytes
+    content_type: str
+    etag: str
+    cache_control: str = 'no-cache'
+    encoded: dict = field(default_factory=dict)   # content-coding -> bytes
+
+    def select(self, accept_encoding):
+        """Return (content_encoding, body) for the client's Accept-Encoding header"""
+        accepted = parse_accept_encoding(accept_encoding)
+        for coding in ('br', 'gzip'):
+            if coding in accepted and coding in self.encoded:
+                return coding, self.encoded[coding]
+        return None, self.body
+
+    def matches(self, if_none_match):
+        """True when an If-None-Match header names this asset's ETag"""
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        # Compressed variants share the ETag, so accept the weak form too
+        return '*' in tags or self.etag in tags or f"W/{self.etag}" in tags
+
+
+def parse_accept_encoding(header):
+    """Return the set of content-codings the client accepts"""
+    accepted = set()
+    for item in (header or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        if coding:
+            accepted.add(coding.lower())
+    return accepted
+
+
+def build_asset(text, content_type, cache_control='no-cache'):
+    """Encode text once and precompress it for every supported content-coding"""
+    body = text.encode('utf-8')
+    asset = StaticAsset(
+        body=body,
+        content_type=content_type,
+        etag='"' + hashlib.sha1(body).hexdigest()[:20] + '"',
+        cache_control=cache_control
+    )
+    if len(body) >= MIN_COMPRESS_BYTES:
+        asset.encoded['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+        if brotli is not None:
+            asset.encoded['br'] = brotli.compress(body, quality=11)
+    return asset
+
+
+def compress_dynamic(body, accept_encoding):
+    """Gzip a dynamic response body when the client accepts it and it is large enough
+
+    Returns (content_encoding, body).
+    """
+    if len(body) < MIN_COMPRESS_BYTES or 'gzip' not in parse_accept_encoding(accept_encoding):
+        return None, body
+    return 'gzip', gzip.compress(body, compresslevel=DYNAMIC_GZIP_LEVEL, mtime=0)
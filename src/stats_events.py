@@ -0,0 +1,343 @@
+"""
+Server-sent events for dashboard statistics.
+
+Every open dashboard tab used to poll /billing-stats and /pathway-stats on a
+timer, recomputing both summaries whether or not anything had changed.
+StatsBroadcaster inverts that: request handlers call notify() when they
+change billing or live data, optional probes (cheap checks such as a file
+stat) catch changes made outside the web layer, and one background thread
+recomputes a topic only after a change, coalescing bursts of notifications
+into a single update. Identical payloads are never re-sent.
+
+Topics may be per user, named 'billing:<user_id>'. They are created on
+first use through topic_factory, which may refuse a name, and each
+connection only receives the topics it subscribed to, sent under the part
+of the name before the colon. A created topic and its last payload are
+dropped once nobody has listened to it for TOPIC_IDLE_SECONDS, so memory
+follows the users with open dashboards rather than every user ever seen.
+
+Event-stream and long-poll connections are handed over by the HTTP server
+once their headers are written, so an idle dashboard holds a socket, not a
+worker thread. Request threads only queue the new connection; topics are
+computed and sockets written on the broadcaster thread, outside the lock,
+so a slow topic or a stalled client never blocks notify() or a request.
+"""
+import json
+import selectors
+import socket
+import threading
+import time
+import traceback
+
+SEND_TIMEOUT_SECONDS = 2.0
+# Long-poll clients reconnect between answers, so topics outlive a short gap
+TOPIC_IDLE_SECONDS = 60.0
+
+
+class StatsBroadcaster:
+    """Push topic payloads to SSE streams and long-poll waiters when they change"""
+
+    def __init__(self, topics, probes=None, coalesce_seconds=0.5, heartbeat_seconds=15,
+                 poll_timeout_seconds=25, probe_interval_seconds=5, topic_factory=None):
+        self.topics = dict(topics)            # name -> callable returning a JSON-able payload
+        self.topic_factory = topic_factory    # name -> callable, for topics such as 'billing:<user>'
+        self.probes = probes or {}            # name -> callable returning a change token
+        self.coalesce_seconds = coalesce_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.poll_timeout_seconds = poll_timeout_seconds
+        self.probe_interval_seconds = probe_interval_seconds
+        self.version = 0
+
+        # Owned by the broadcaster thread
+        self._payloads = {}                   # name -> encoded JSON last computed
+        self._probe_tokens = {}
+        self._created = {}                    # name -> when it was last listened to, for factory topics
+        self._streams = []                    # (socket, subscribed topic names)
+        self._waiters = []                    # (socket, subscribed topic names, deadline)
+
+        # Shared with request threads, guarded by _condition
+        self._dirty = set(topics)
+        self._dirty_since = None
+        self._joining = []                    # (socket, requested topics, since or None for streams)
+        self._counters = {'notifications': 0, 'recomputes': 0, 'pushes': 0, 'suppressed': 0}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='stats-events', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def notify(self, topic):
+        """Mark a topic as changed; the update is sent after the coalescing window"""
+        with self._condition:
+            self._counters['notifications'] += 1
+            self._dirty.add(topic)
+            if self._dirty_since is None:
+                self._dirty_since = time.monotonic()
+                self._condition.notify()
+
+    def add_stream(self, sock, topics=None):
+        """Take over an event-stream connection whose headers are already sent
+
+        The broadcaster thread sends the current payloads and then keeps the
+        stream up to date.
+        """
+        with self._condition:
+            self._joining.append((sock, topics, None))
+            self._condition.notify()
+
+    def add_waiter(self, sock, since=0, topics=None):
+        """Take over a long-poll connection
+
+        It is answered right away when the client's version differs (it is
+        behind, or the server restarted), otherwise on the next change or
+        after poll_timeout_seconds.
+        """
+        with self._condition:
+            self._joining.append((sock, topics, since))
+            self._condition.notify()
+
+    def _subscribe(self, topics):
+        """Resolve a subscription, marking topics without a payload for computation"""
+        topics = frozenset(topics or self.topics)
+        for name in topics:
+            if name not in self.topics and self.topic_factory:
+                compute = self.topic_factory(name)
+                if compute:
+                    self.topics[name] = compute
+                    self._created[name] = time.monotonic()
+        topics = frozenset(name for name in topics if name in self.topics)
+        missing = [name for name in topics if name not in self._payloads]
+        if missing:
+            with self._condition:
+                self._dirty.update(missing)
+        return topics
+
+    def _run(self):
+        last_heartbeat = last_probe = time.monotonic()
+        while True:
+            with self._condition:
+                if self._running and not self._joining:
+                    now = time.monotonic()
+                    wakeups = [now + self.heartbeat_seconds]
+                    if self._dirty_since is not None:
+                        wakeups.append(self._dirty_since + self.coalesce_seconds)
+                    if self.probes and self._has_listeners():
+                        wakeups.append(last_probe + self.probe_interval_seconds)
+                    wakeups.extend(deadline for _, _, deadline in self._waiters)
+                    self._condition.wait(max(0.0, min(wakeups) - now))
+                if not self._running:
+                    break
+                joining, self._joining = self._joining, []
+
+            now = time.monotonic()
+            try:
+                if self.probes and self._has_listeners() and now - last_probe >= self.probe_interval_seconds:
+                    last_probe = now
+                    self._run_probes()
+                self._update(joining, now)
+                if now - last_heartbeat >= self.heartbeat_seconds:
+                    last_heartbeat = now
+                    # SSE comment lines keep proxies from timing out and reveal closed tabs
+                    self._streams = [(sock, topics) for sock, topics in self._streams
+                                     if self._send(sock, b': ping\n\n')]
+                self._expire_waiters(now)
+                self._drop_closed_streams()
+                self._evict_topics(now)
+            except Exception as e:
+                print(f"Stats broadcaster error: {e}")
+                traceback.print_exc()
+
+        for sock, _ in self._streams:
+            self._close(sock)
+        for sock, _, _ in self._waiters + self._joining:
+            self._close(sock)
+
+    def _update(self, joining, now):
+        """Push due topic changes to current listeners, then take on new ones"""
+        subscriptions = [(sock, self._subscribe(topics), since) for sock, topics, since in joining]
+        with self._condition:
+            due = self._dirty_since is not None and now - self._dirty_since >= self.coalesce_seconds
+            if not (joining or (due and self._has_listeners())):
+                if due:
+                    # Nobody is watching; recompute when the next listener connects
+                    self._dirty_since = None
+                dirty = set()
+            else:
+                # Like a notification, a new listener flushes every pending topic
+                dirty, self._dirty, self._dirty_since = self._dirty, set(), None
+        self._publish(self._refresh(dirty))
+
+        for sock, topics, since in subscriptions:
+            if since is None:
+                messages = [self._event(name, self._payloads[name]) for name in topics if name in self._payloads]
+                if self._send(sock, b''.join(messages)):
+                    self._streams.append((sock, topics))
+            elif self.version != since:
+                self._answer_waiter(sock, topics)
+            else:
+                self._waiters.append((sock, topics, now + self.poll_timeout_seconds))
+
+    def _has_listeners(self):
+        return bool(self._streams or self._waiters)
+
+    def _run_probes(self):
+        for topic, probe in self.probes.items():
+            try:
+                token = probe()
+            except Exception as e:
+                print(f"Stats probe '{topic}' failed: {e}")
+                continue
+            if topic in self._probe_tokens and token != self._probe_tokens[topic]:
+                with self._condition:
+                    self._dirty.add(topic)
+                    if self._dirty_since is None:
+                        self._dirty_since = time.monotonic()
+            self._probe_tokens[topic] = token
+
+    def _refresh(self, topics):
+        """Recompute the given topics, returning the names whose payload changed
+
+        Topics that fail to compute are marked dirty again.
+        """
+        changed = []
+        failed = []
+        for name in topics:
+            if name not in self.topics:
+                continue   # a per-user topic nobody has subscribed to yet
+            try:
+                payload = json.dumps(self.topics[name](), sort_keys=True, default=str).encode()
+            except Exception as e:
+                print(f"Stats topic '{name}' failed: {e}")
+                failed.append(name)
+                continue
+            self._counters['recomputes'] += 1
+            if payload == self._payloads.get(name):
+                self._counters['suppressed'] += 1
+                continue
+            self._payloads[name] = payload
+            changed.append(name)
+        if failed:
+            with self._condition:
+                self._dirty.update(failed)
+        if changed:
+            self.version += 1
+        return changed
+
+    def _publish(self, changed):
+        if not changed or not self._has_listeners():
+            return
+        streams = []
+        for sock, topics in self._streams:
+            message = b''.join(self._event(name, self._payloads[name]) for name in changed if name in topics)
+            if not message or self._send(sock, message):
+                streams.append((sock, topics))
+        self._streams = streams
+        self._counters['pushes'] += 1
+
+        waiters = []
+        for sock, topics, deadline in self._waiters:
+            if topics.intersection(changed):
+                self._answer_waiter(sock, topics)
+            else:
+                waiters.append((sock, topics, deadline))
+        self._waiters = waiters
+
+    def _expire_waiters(self, now):
+        expired = [(sock, topics) for sock, topics, deadline in self._waiters if deadline <= now]
+        if expired:
+            self._waiters = [waiter for waiter in self._waiters if waiter[2] > now]
+            for sock, topics in expired:
+                self._answer_waiter(sock, topics)
+
+    def _answer_waiter(self, sock, topics):
+        data = {'version': self.version}
+        for name in topics:
+            if name in self._payloads:
+                data[self._event_name(name)] = json.loads(self._payloads[name])
+        body = json.dumps(data).encode()
+        self._send(sock, b"HTTP/1.0 200 OK\r\n"
+                         b"Content-Type: application/json\r\n"
+                         b"Cache-Control: no-store\r\n"
+                         b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+                         b"Connection: close\r\n\r\n" + body)
+        self._close(sock)
+
+    def _drop_closed_streams(self):
+        """Forget streams whose browser tab has gone away"""
+        if not self._streams:
+            return
+        # select.select() fails for descriptors >= FD_SETSIZE; selectors has no such limit
+        with selectors.DefaultSelector() as selector:
+            for sock, _ in self._streams:
+                selector.register(sock, selectors.EVENT_READ)
+            readable = [key.fileobj for key, _ in selector.select(0)]
+        for sock in readable:
+            try:
+                closed = not sock.recv(1024, socket.MSG_PEEK)
+            except OSError:
+                closed = True
+            if closed:
+                self._streams = [stream for stream in self._streams if stream[0] is not sock]
+                self._close(sock)
+
+    def _evict_topics(self, now):
+        """Forget factory-made topics, and their payloads, once idle for TOPIC_IDLE_SECONDS"""
+        if not self._created:
+            return
+        watched = set()
+        for _, topics in self._streams:
+            watched.update(topics)
+        for _, topics, _ in self._waiters:
+            watched.update(topics)
+        idle = []
+        for name in self._created:
+            if name in watched:
+                self._created[name] = now
+            elif now - self._created[name] >= TOPIC_IDLE_SECONDS:
+                idle.append(name)
+        for name in idle:
+            del self._created[name]
+            del self.topics[name]
+            self._payloads.pop(name, None)
+        with self._condition:
+            # Notifications for topics nobody subscribed to are not kept either
+            self._dirty = {name for name in self._dirty if name in self.topics}
+
+    @staticmethod
+    def _event_name(name):
+        return name.split(':', 1)[0]
+
+    def _event(self, name, payload):
+        return b'event: ' + self._event_name(name).encode() + b'\ndata: ' + payload + b'\n\n'
+
+    def _send(self, sock, data):
+        try:
+            sock.settimeout(SEND_TIMEOUT_SECONDS)
+            sock.sendall(data)
+            return True
+        except OSError:
+            self._close(sock)
+            return False
+
+    @staticmethod
+    def _close(sock):
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+
+    def get_stats(self):
+        with self._condition:
+            return dict(self._counters, streams=len(self._streams), waiters=len(self._waiters),
+                        joining=len(self._joining), topics=len(self.topics), version=self.version)
@@ -0,0 +1,339 @@
+"""
+Incrementally maintained usage rollups for billing events.
+
+Usage summaries and statistics used to be recomputed from the billing
+history on every dashboard refresh, which gets slower as history grows.
+UsageRollups updates a handful of counters on each billing event instead:
+
+- a summary per user (balance, spend, questions and reports): the billing
+  system's own, plus the estimated effect of events it has not applied yet
+- per-day buckets with per-hour counts, kept for the statistics period
+  (usage_tracking.statistics.default_period_days), plus running totals over
+  that window for peak hours
+- event counts per type
+- the most common query terms, tracked with a Space-Saving heavy-hitters
+  sketch of fixed capacity
+
+Each user's rollups have their own lock, so tenants never wait on each
+other. Reads cost the same no matter how much history exists.
+
+The billing system remains the source of truth for totals. Events recorded
+with a key stay pending until the ledger reports them applied(), and after
+each flush the ledger has the summaries of the users it charged reloaded
+(reconcile()), so the estimate from assumed prices never drifts from the
+real balance for longer than one flush.
+
+The statistics are saved to an append-only JSON Lines file, one line per
+user changed since the previous save, so a save costs the same however many
+users exist. The last line of a user wins on load, and the file is
+rewritten once it holds COMPACT_RATIO lines per user.
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Fallback prices when the billing summary carries no pricing
+DEFAULT_PRICES = {'bill_question': 0.10, 'bill_report': 0.25}
+PRICE_KEYS = {'bill_question': 'price_per_question', 'bill_report': 'price_per_report'}
+COUNTER_KEYS = {'bill_question': 'questions_asked', 'bill_report': 'reports_generated'}
+
+TERM_PATTERN = re.compile(r'[a-z][a-z0-9]+')
+COMPACT_RATIO = 4
+
+
+class SpaceSaving:
+    """Space-Saving heavy-hitters sketch with O(1) updates
+
+    Keeps at most capacity items. Counts are upper bounds; an item's count
+    minus its error is a lower bound on how often it was really seen.
+    """
+
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self._buckets = {}     # count -> ordered set of items with that count
+        self._min_count = 0
+
+    def offer(self, item):
+        count = self.counts.get(item)
+        if count is not None:
+            self._move(item, count, count + 1)
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[item] = 1
+            self.errors[item] = 0
+            self._buckets.setdefault(1, OrderedDict())[item] = None
+            self._min_count = 1
+            return
+        # Replace the oldest of the least counted items, inheriting its count as error
+        bucket = self._buckets[self._min_count]
+        evicted, _ = bucket.popitem(last=False)
+        count = self.counts.pop(evicted)
+        self.errors.pop(evicted)
+        if not bucket:
+            del self._buckets[count]
+        self.counts[item] = count + 1
+        self.errors[item] = count
+        self._buckets.setdefault(count + 1, OrderedDict())[item] = None
+        if count not in self._buckets:
+            self._min_count = count + 1
+
+    def _move(self, item, count, new_count):
+        bucket = self._buckets[count]
+        del bucket[item]
+        if not bucket:
+            del self._buckets[count]
+            if self._min_count == count:
+                self._min_count = new_count
+        self._buckets.setdefault(new_count, OrderedDict())[item] = None
+        self.counts[item] = new_count
+
+    def top(self, n):
+        ranked = sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))[:n]
+        return [{'term': item, 'count': count, 'error': self.errors[item]} for item, count in ranked]
+
+    def to_dict(self):
+        return {'capacity': self.capacity, 'counts': self.counts, 'errors': self.errors}
+
+    @classmethod
+    def from_dict(cls, data, capacity=None):
+        sketch = cls(capacity or data.get('capacity', 100))
+        ranked = sorted(data.get('counts', {}).items(), key=lambda item: item[1])
+        for item, count in ranked[-sketch.capacity:]:
+            sketch.counts[item] = count
+            sketch.errors[item] = data.get('errors', {}).get(item, 0)
+            sketch._buckets.setdefault(count, OrderedDict())[item] = None
+        sketch._min_count = min(sketch._buckets) if sketch._buckets else 0
+        return sketch
+
+
+class UsageRollups:
+    """Per-user usage counters updated on every billing event"""
+
+    def __init__(self, load_summary, period_days=30, terms_capacity=100, stop_words=None):
+        self.load_summary = load_summary      # user_id -> billing system's usage summary
+        self.period_days = period_days
+        self.terms_capacity = terms_capacity
+        self.stop_words = set(stop_words or [])
+
+        self._summaries = {}   # user_id -> billing system's summary, plus applied events since it was read
+        self._pending = {}     # user_id -> {key: summary delta} of events not applied yet
+        self._users = {}       # user_id -> statistics rollup
+        self._locks = {}       # user_id -> lock over that user's summary and rollup
+        self._locks_lock = threading.Lock()
+        self._dirty = set()    # users whose statistics changed since the last save
+        self._saved_lines = 0  # lines in the saved file
+        self._rewrite = False  # the saved file must be rewritten rather than appended to
+
+    def record(self, user_id, op, args, ts=None, key=None):
+        """Fold one billing event into the user's rollups
+
+        With a key, its effect on the summary stays pending until applied()
+        or reverse() is called with that key.
+        """
+        ts = ts or time.time()
+        with self._user_lock(user_id):
+            delta = self._delta(user_id, op, args)
+            if key is None:
+                self._add(self._summary(user_id), delta, 1)
+            else:
+                self._pending.setdefault(user_id, {})[key] = delta
+            self._count(user_id, op, ts, delta.get('total_spent', 0.0), 1)
+            if op == 'bill_question':
+                rollup = self._rollup(user_id)
+                for term in TERM_PATTERN.findall(str(args[0]).lower()):
+                    if term not in self.stop_words:
+                        rollup['terms'].offer(term)
+
+    def applied(self, user_id, key):
+        """The billing system has applied the event recorded under key"""
+        with self._user_lock(user_id):
+            delta = self._pending.get(user_id, {}).pop(key, None)
+            if delta is not None:
+                # Counted in the summary until reconcile() reloads it
+                self._add(self._summary(user_id), delta, 1)
+
+    def reverse(self, user_id, op, args, ts, key=None):
+        """Take back an event recorded earlier that never reached the billing system
+
+        Its query terms stay in the heavy-hitters sketch, which cannot
+        forget an item.
+        """
+        with self._user_lock(user_id):
+            delta = self._pending.get(user_id, {}).pop(key, None)
+            if delta is None:
+                delta = self._delta(user_id, op, args)
+                self._add(self._summary(user_id), delta, -1)
+            self._count(user_id, op, ts, delta.get('total_spent', 0.0), -1)
+
+    def reconcile(self, user_id):
+        """Replace the user's summary with the billing system's current one"""
+        summary = dict(self.load_summary(user_id))
+        with self._user_lock(user_id):
+            self._summaries[user_id] = summary
+
+    def _delta(self, user_id, op, args):
+        """An event's effect on the summary, at the prices the summary carries"""
+        if op == 'add_credits':
+            return {'credits_balance': args[0]}
+        if op not in COUNTER_KEYS:
+            return {}
+        pricing = self._summary(user_id).get('pricing') or {}
+        amount = pricing.get(PRICE_KEYS[op], DEFAULT_PRICES[op])
+        return {COUNTER_KEYS[op]: 1, 'credits_balance': -amount, 'total_spent': amount}
+
+    @staticmethod
+    def _add(summary, delta, sign):
+        for field, value in delta.items():
+            summary[field] = summary.get(field, 0) + sign * value
+
+    def _count(self, user_id, op, ts, amount, sign):
+        """Add (sign 1) or remove (sign -1) an event from the statistics counters"""
+        rollup = self._rollup(user_id)
+        with self._locks_lock:
+            self._dirty.add(user_id)
+        rollup['events'][op] = rollup['events'].get(op, 0) + sign
+        self._expire(rollup, time.time())
+        local = time.localtime(ts)
+        key = time.strftime('%Y-%m-%d', local)
+        if sign < 0 and key not in rollup['days']:
+            return   # its day has already left the statistics period
+        day = self._day(rollup, key)
+        day['events'][op] = day['events'].get(op, 0) + sign
+        day['spent'] += sign * amount
+        day['hours'][local.tm_hour] += sign
+        rollup['window_hours'][local.tm_hour] += sign
+
+    def _user_lock(self, user_id):
+        lock = self._locks.get(user_id)
+        if lock is None:
+            with self._locks_lock:
+                lock = self._locks.setdefault(user_id, threading.Lock())
+        return lock
+
+    def _summary(self, user_id):
+        summary = self._summaries.get(user_id)
+        if summary is None:
+            # Read again by reconcile() whenever the billing system charged the user
+            summary = dict(self.load_summary(user_id))
+            self._summaries[user_id] = summary
+        return summary
+
+    def _rollup(self, user_id):
+        rollup = self._users.get(user_id)
+        if rollup is None:
+            rollup = {
+                'events': {},
+                'days': OrderedDict(),        # 'YYYY-MM-DD' -> bucket, oldest first
+                'window_hours': [0] * 24,     # hour-of-day totals over the kept days
+                'terms': SpaceSaving(self.terms_capacity)
+            }
+            self._users[user_id] = rollup
+        return rollup
+
+    def _day(self, rollup, key):
+        bucket = rollup['days'].get(key)
+        if bucket is None:
+            bucket = {'events': {}, 'spent': 0.0, 'hours': [0] * 24}
+            rollup['days'][key] = bucket
+        return bucket
+
+    def _expire(self, rollup, now):
+        """Drop day buckets that have left the statistics period, oldest first"""
+        cutoff = time.strftime('%Y-%m-%d', time.localtime(now - (self.period_days - 1) * 86400))
+        days = rollup['days']
+        while days and next(iter(days)) < cutoff:
+            _, expired = days.popitem(last=False)
+            for hour, count in enumerate(expired['hours']):
+                rollup['window_hours'][hour] -= count
+
+    def summary(self, user_id):
+        with self._user_lock(user_id):
+            summary = dict(self._summary(user_id))
+            for delta in self._pending.get(user_id, {}).values():
+                self._add(summary, delta, 1)
+            return summary
+
+    def stats(self, user_id, peak_hours_count=3, common_terms_count=5):
+        """Usage statistics over the last period_days days"""
+        with self._user_lock(user_id):
+            rollup = self._rollup(user_id)
+            self._expire(rollup, time.time())
+            hours = rollup['window_hours']
+            peak_hours = sorted(range(24), key=lambda hour: -hours[hour])[:peak_hours_count]
+            return {
+                'user_id': user_id,
+                'period_days': self.period_days,
+                'events': dict(rollup['events']),
+                'daily': [
+                    {'date': key, 'events': dict(bucket['events']), 'spent': round(bucket['spent'], 4)}
+                    for key, bucket in rollup['days'].items()
+                ],
+                'peak_hours': [{'hour': hour, 'events': hours[hour]} for hour in peak_hours if hours[hour]],
+                'common_terms': rollup['terms'].top(common_terms_count)
+            }
+
+    def save(self, path):
+        """Append the statistics of users changed since the last save, compacting when mostly stale"""
+        with self._locks_lock:
+            dirty, self._dirty = self._dirty, set()
+        compact = self._rewrite or self._saved_lines + len(dirty) > COMPACT_RATIO * max(len(self._users), 1)
+        users = list(self._users) if compact else sorted(dirty)
+        if not users:
+            return
+        lines = []
+        for user_id in users:
+            with self._user_lock(user_id):
+                # Encoded under the user's lock so a concurrent event can't change it mid-dump
+                rollup = self._users[user_id]
+                lines.append(json.dumps({
+                    'user_id': user_id,
+                    'events': rollup['events'],
+                    'days': rollup['days'],
+                    'terms': rollup['terms'].to_dict()
+                }, separators=(',', ':')) + '\n')
+        if compact:
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(''.join(lines))
+            os.replace(tmp_path, path)
+            self._saved_lines = len(lines)
+            self._rewrite = False
+        else:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(''.join(lines))
+            self._saved_lines += len(lines)
+
+    def load(self, path):
+        """Restore saved statistics; also reads the single JSON object older versions wrote"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except OSError:
+            return
+        saved = {}
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A torn write at the end; appending after it would damage the next line too
+                self._rewrite = True
+                continue
+            if 'user_id' in record:
+                saved[record.pop('user_id')] = record
+            else:
+                saved.update(record)
+                self._rewrite = True
+        self._saved_lines = len(lines)
+        for user_id, record in saved.items():
+            with self._user_lock(user_id):
+                rollup = self._rollup(user_id)
+                rollup['events'] = record.get('events', {})
+                rollup['terms'] = SpaceSaving.from_dict(record.get('terms', {}), self.terms_capacity)
+                days = sorted(record.get('days', {}).items())[-self.period_days:]
+                rollup['days'] = OrderedDict(days)
+                rollup['window_hours'] = [sum(bucket['hours'][hour] for _, bucket in days) for hour in range(24)]
@@ -0,0 +1,134 @@
+"""
+Vectorized BM25 scoring for the passage index.
+
+Scoring a query in pure Python walks every posting of every query term in a
+dict loop, which dominates /search once the corpus holds many passages.
+BM25Matrix holds the BM25 weights of the query terms' (term, passage) pairs
+as a sparse term x passage matrix in CSR form (indptr, indices, data), so
+queries are scored with array operations:
+
+- one query: the rows of its terms are gathered and summed per passage
+  with np.bincount, costing only the query terms' postings
+- several queries: a sparse query x term matrix times the weight matrix,
+  using SciPy when it is installed
+
+Weights are computed in float64 with the same operations in the same order
+as the pure-Python path, and each passage's term contributions are summed
+in ascending term order on both paths, so scores are bit-for-bit equal.
+top_k() breaks ties by passage number, so rankings are identical as well.
+
+A matrix is assembled per index segment for each search from per-term
+weight rows (term_weights()), since segments come and go and BM25 weights
+depend on corpus-wide statistics. The passage index caches those rows on
+each segment and reuses them until the corpus changes.
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_sparse = None
+
+
+def available():
+    return np is not None
+
+
+def sparse_module():
+    """scipy.sparse, imported on first use since it is slow to import; None without SciPy"""
+    global _sparse
+    if _sparse is None:
+        try:
+            from scipy import sparse
+        except ImportError:
+            sparse = False
+        _sparse = sparse
+    return _sparse or None
+
+
+class BM25Matrix:
+    """BM25 weights of live passages for a set of terms, as a CSR term x passage matrix"""
+
+    def __init__(self, indptr, indices, data, passages):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.passages = passages
+        self._csr = None
+
+    @classmethod
+    def build(cls, postings, lengths, live, idf, k1, b, avg_length):
+        """Build from per-term (passage numbers, term frequencies) arrays, or None for absent terms
+
+        lengths holds every passage's length as float64, live is a boolean
+        mask of live passages (None when all are), and idf the per-term idf.
+        """
+        rows = [cls.term_weights(posting, lengths, live, term_idf, k1, b, avg_length)
+                for posting, term_idf in zip(postings, idf)]
+        return cls.from_rows(rows, len(lengths))
+
+    @staticmethod
+    def term_weights(posting, lengths, live, idf, k1, b, avg_length):
+        """(live passage numbers, BM25 weights) of one term's (passage numbers, term frequencies) or None"""
+        if posting is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+        indices, tf = posting
+        if live is not None:
+            keep = live[indices]
+            indices, tf = indices[keep], tf[keep]
+        indices = indices.astype(np.int64)
+        tf = tf.astype(np.float64)
+        # Same expression, evaluated in the same order, as the pure-Python scorer
+        norm = k1 * (1 - b + b * lengths[indices] / avg_length)
+        return indices, idf * tf * (k1 + 1) / (tf + norm)
+
+    @classmethod
+    def from_rows(cls, rows, passages):
+        """Stack per-term (passage numbers, weights) rows into a matrix"""
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(indices) for indices, _ in rows], out=indptr[1:])
+        if indptr[-1]:
+            indices = np.concatenate([indices for indices, _ in rows])
+            data = np.concatenate([data for _, data in rows])
+        else:
+            indices = np.zeros(0, dtype=np.int64)
+            data = np.zeros(0, dtype=np.float64)
+        return cls(indptr, indices, data, passages)
+
+    def score(self, term_ids):
+        """BM25 score of every passage for one query, as a float64 array"""
+        term_ids = sorted(term_ids)
+        if not term_ids:
+            return np.zeros(self.passages)
+        spans = [np.arange(self.indptr[term_id], self.indptr[term_id + 1]) for term_id in term_ids]
+        positions = np.concatenate(spans)
+        # bincount adds weights in array order, so each passage sums its terms in ascending term order
+        return np.bincount(self.indices[positions], weights=self.data[positions], minlength=self.passages)
+
+    def score_batch(self, term_id_lists):
+        """Scores of several queries at once, as a queries x passages array"""
+        sparse = sparse_module() if len(term_id_lists) > 1 else None
+        if sparse is None:
+            return np.vstack([self.score(term_ids) for term_ids in term_id_lists])
+        if self._csr is None:
+            self._csr = sparse.csr_matrix((self.data, self.indices, self.indptr),
+                                          shape=(len(self.indptr) - 1, self.passages))
+        rows, columns = [], []
+        for query, term_ids in enumerate(term_id_lists):
+            rows.extend([query] * len(term_ids))
+            columns.extend(sorted(term_ids))
+        queries = sparse.csr_matrix((np.ones(len(rows)), (rows, columns)),
+                                    shape=(len(term_id_lists), self._csr.shape[0]))
+        return (queries @ self._csr).toarray()
+
+
+def top_k(scores, k):
+    """(passage, score) pairs of the k best positive scores, ties broken by passage number"""
+    candidates = np.flatnonzero(scores > 0)
+    if len(candidates) > k:
+        values = scores[candidates]
+        # Everything tied with the k-th best stays in, so tie-breaking below decides
+        kth = values[np.argpartition(-values, k - 1)[k - 1]]
+        candidates = candidates[values >= kth]
+    order = np.lexsort((candidates, -scores[candidates]))
+    return [(int(passage), float(scores[passage])) for passage in candidates[order][:k]]
@@ -0,0 +1,41 @@
+"""Same-named uploads are indexed as separate documents"""
+import hashlib
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from passage_index import PassageIndex
+from simple_web import passage_display_name, passage_document_id
+
+
+def _upload(index, filename, text):
+    document_id = passage_document_id(filename, hashlib.sha256(text.encode()).hexdigest())
+    index.add_document(document_id, text)
+    return document_id
+
+
+def test_same_named_uploads_keep_their_own_passages():
+    index = PassageIndex(None)
+    first = _upload(index, 'report.pdf', 'Quarterly revenue grew across the northern warehouses.')
+    second = _upload(index, 'report.pdf', 'The glacier survey measured meltwater in the fjords.')
+
+    assert first != second
+    assert [hit['document'] for hit in index.search('warehouses revenue')] == [first]
+    assert [hit['document'] for hit in index.search('glacier meltwater')] == [second]
+    assert index.search('warehouses', document=first)
+    assert not index.search('warehouses', document=second)
+    assert passage_display_name(first) == passage_display_name(second) == 'report.pdf'
+
+
+def test_reupload_of_same_content_replaces_its_passages():
+    index = PassageIndex(None)
+    text = 'Quarterly revenue grew across the northern warehouses.'
+    assert _upload(index, 'report.pdf', text) == _upload(index, 'report.pdf', text)
+    assert len(index.search('warehouses')) == 1
+
+
+def test_documents_indexed_by_name_display_as_themselves():
+    assert passage_display_name('report.pdf') == 'report.pdf'